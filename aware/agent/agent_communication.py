@@ -83,12 +83,15 @@ class AgentCommunication:
         action_clients: Dict[str, ActionClient],
         request_clients: Dict[str, RequestClient],
         input_protocol: InputProtocol,
+        prompt_kwargs: Optional[Dict[str, str]] = None,
     ):
         self.topic_publishers = topic_publishers
         self.topic_subscribers = topic_subscribers
         self.action_clients = action_clients
         self.request_clients = request_clients
         self.input_protocol = input_protocol
+        # Taken from the communication snapshot or computed once on first use.
+        self.prompt_kwargs = prompt_kwargs
 
     def get_tools(self) -> List[Tool]:
         tools: List[Tool] = []
@@ -117,6 +120,8 @@ class AgentCommunication:
 
     def to_prompt_kwargs(self) -> Dict[str, str]:
         """Show permanent info on the prompt. Don't show event as it will be part of conversation."""
+        if self.prompt_kwargs is not None:
+            return self.prompt_kwargs
         prompt_kwargs: Dict[str, str] = {}
 
         # Add the input
@@ -136,4 +141,5 @@ class AgentCommunication:
             ]
         )
         prompt_kwargs.update({"topics": "\n".join(topic_updates)})
+        self.prompt_kwargs = prompt_kwargs
         return prompt_kwargs
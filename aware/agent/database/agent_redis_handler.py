@@ -31,6 +31,8 @@ class AgentRedisHandler:
             f"agent:{agent_data.id}",
             agent_data.to_json(),
         )
+        # Invalidate the processes of this agent cached by the workers.
+        self.client.incr(f"agent:{agent_data.id}:version")
 
     def set_agent_process_id(self, agent_id: str, process_name: str, process_id: str):
         self.client.set(
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence
 from openai.types.chat import ChatCompletionMessageToolCall
 
 
@@ -15,14 +15,20 @@ class CallInfo:
         process_ids: ProcessIds,
         system_message: str,
         tools_openai: List[ChatCompletionMessageToolCall],
+        stream: bool = False,
+        stream_tool_argument: Optional[Sequence[str]] = None,
     ):
         self.call_id = call_id
         self.name = name
         self.process_ids = process_ids
         self.system_message = system_message
         self.tools_openai = tools_openai
+        self.stream = stream
+        # (tool name, argument), a list once loaded from JSON.
+        self.stream_tool_argument = stream_tool_argument
 
         self.conversation = None
+        self.messages: Optional[List[Dict[str, Any]]] = None
         self.api_key = None
 
     @classmethod
@@ -38,18 +44,49 @@ class CallInfo:
             "process_ids": self.process_ids.to_dict(),
             "system_message": self.system_message,
             "tools_openai": self.tools_openai,
+            "stream": self.stream,
+            "stream_tool_argument": self.stream_tool_argument,
         }
 
     def to_json(self):
         return json.dumps(self.to_dict())
 
-    def get_conversation_messages(self) -> Dict[str, Any]:
-        openai_messages = [SystemMessage(self.system_message).to_openai_dict()]
-        openai_messages += [message.to_openai_dict() for message in self.conversation]
-        return openai_messages
+    @classmethod
+    def from_payload_json(cls, payload_str: str) -> "CallInfo":
+        """Load the call info together with its messages, ready to be sent to the model."""
+        data = json.loads(payload_str)
+        messages = data.pop("messages", None)
+        if messages is None:
+            # Legacy payload, the conversation has to be loaded separately.
+            return cls.from_json(payload_str)
+        data["process_ids"] = ProcessIds(**data["process_ids"])
+        data["system_message"] = messages[0]["content"]
+        call_info = cls(**data)
+        call_info.messages = messages
+        return call_info
+
+    def to_payload_json(self) -> str:
+        """Serialize the call info with the OpenAI messages, the system message is only stored as the first one."""
+        payload = self.to_dict()
+        del payload["system_message"]
+        payload["messages"] = self.get_conversation_messages()
+        return json.dumps(payload)
+
+    def get_conversation_messages(self) -> List[Dict[str, Any]]:
+        if self.messages is None:
+            openai_messages = [SystemMessage(self.system_message).to_openai_dict()]
+            openai_messages += [
+                message.to_openai_dict() for message in self.conversation
+            ]
+            self.messages = openai_messages
+        return self.messages
+
+    def has_messages(self) -> bool:
+        return self.messages is not None
 
     def set_conversation(self, conversation: List[JSONMessage]):
         self.conversation = conversation
+        self.messages = None
 
     def get_api_key(self) -> str:
         return self.api_key
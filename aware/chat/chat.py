@@ -1,4 +1,5 @@
-from typing import Any, Dict, List, Tuple
+import random
+from typing import Any, Dict, List, Optional, Tuple
 import uuid
 from openai.types.chat import ChatCompletionMessageToolCall
 
@@ -6,10 +7,11 @@ from aware.chat.call_info import CallInfo
 from aware.chat.conversation import Conversation
 from aware.chat.conversation_schemas import SystemMessage
 from aware.chat.database.chat_database_handler import ChatDatabaseHandler
+from aware.config.config import Config
 from aware.prompts.load import load_prompt_from_args
 from aware.process.process_ids import ProcessIds
-from aware.utils.helpers import get_current_date
 from aware.utils.logger.process_logger import ProcessLogger
+from aware.utils.timestamps import get_current_date
 
 
 class Chat:
@@ -48,13 +50,23 @@ class Chat:
         self,
         prompt_kwargs: Dict[str, str],
     ):
-        args = {
-            "date": get_current_date(),
-        }
-        args.update(prompt_kwargs)
-        return load_prompt_from_args("meta", args=args)
+        # Only the date changes between calls with the same kwargs.
+        return load_prompt_from_args(
+            "meta",
+            args=prompt_kwargs,
+            dynamic_args={"date": get_current_date()},
+        )
 
-    def request_response(self, tools_openai: List[ChatCompletionMessageToolCall]):
+    def request_response(
+        self,
+        tools_openai: List[ChatCompletionMessageToolCall],
+        stream: bool = False,
+        stream_tool_argument: Optional[Tuple[str, str]] = None,
+    ):
+        """Request a new response, if stream is set the content is delivered to the user while it is generated.
+
+        stream_tool_argument is the (tool name, argument) also delivered while generated when stream is set.
+        """
         self.conversation.trim_conversation()
 
         call_info = CallInfo(
@@ -63,6 +75,12 @@ class Chat:
             process_ids=self.process_ids,
             system_message=self.system_message,
             tools_openai=tools_openai,
+            stream=stream,
+            stream_tool_argument=stream_tool_argument,
+        )
+        # The conversation is already loaded, send it with the call so the dispatcher doesn't need to reload it.
+        call_info.set_conversation(
+            [chat_message.message for chat_message in self.conversation.messages]
         )
         self.chat_database_handler.add_call_info(call_info)
         self.log_conversation()
@@ -70,6 +88,8 @@ class Chat:
     # TODO: SHOULD BE USED TO STORE ALL TRACES!!
     def log_conversation(self):
         """Log the conversation."""
+        if random.random() >= Config().conversation_log_sample_rate:
+            return
         system_message_str = SystemMessage(self.system_message).to_string()
         conversation = f"{system_message_str}\n{self.conversation.to_string()}"
         self.logger.info(
@@ -1,10 +1,12 @@
+from typing import List
+
 from aware.chat.database.chat_database_handler import ChatDatabaseHandler
 from aware.config.config import Config
 from aware.data.data_saver import DataSaver  # TODO: Refactor it to save traces.
-from aware.utils.helpers import count_message_tokens
 
 from aware.chat.conversation_schemas import (
     ChatMessage,
+    count_chat_messages_tokens,
     ToolCalls,
     ToolResponseMessage,
 )
@@ -21,22 +23,25 @@ class Conversation:
 
         self.model_name = Config().openai_model  # TODO: Enable more models.
         self.chat_database_handler = ChatDatabaseHandler(process_logger)
-        self.messages = self.chat_database_handler.get_conversation(process_id)
+        self.messages: List[ChatMessage] = self.chat_database_handler.get_conversation(
+            process_id
+        )
+        # Running sum of the tokens, updated on each delete so we never re-tokenize the full conversation.
+        self.current_tokens = count_chat_messages_tokens(
+            self.messages, self.model_name
+        )
 
     def delete_oldest_message(self) -> ChatMessage:
         removed_message = self.messages.pop(0)
         message_id = removed_message.message_id
+        self.current_tokens -= removed_message.get_tokens(self.model_name)
 
         self.chat_database_handler.delete_message(self.process_id, message_id)
         return removed_message
 
     def get_current_tokens(self):
         """Get the current number of tokens in the conversation, excluding the system message."""
-
-        return count_message_tokens(
-            messages=self.to_string(),
-            model_name=self.model_name,
-        )
+        return self.current_tokens
 
     def get_remaining_tokens(self):
         return Config().max_conversation_tokens - self.get_current_tokens()
@@ -58,30 +63,13 @@ class Conversation:
         return conversation_string
 
     def trim_conversation(self):
-        current_message_tokens = self.get_current_tokens()
-        while (current_message_tokens) > Config().max_conversation_tokens:
-            # Check if the next message is a 'tool' message and the current one is 'assistant' with 'tool_calls'.
-            if len(self.messages) > 2 and isinstance(self.messages[0] == ToolCalls):
-                removed_message = (
-                    self.delete_oldest_message()
-                )  # Delete 'tool_calls' message.
-
-                current_message_tokens -= count_message_tokens(
-                    removed_message.to_string(), self.model_name
-                )
-                # Delete all the 'tool_response' messages.
-                while len(self.messages) > 1 and isinstance(
-                    self.messages[1], ToolResponseMessage
+        while self.messages and (
+            self.get_current_tokens() > Config().max_conversation_tokens
+        ):
+            removed_message = self.delete_oldest_message()
+            # When removing a 'tool_calls' message delete also all the 'tool_response' messages.
+            if isinstance(removed_message.message, ToolCalls):
+                while self.messages and isinstance(
+                    self.messages[0].message, ToolResponseMessage
                 ):
-                    removed_tool_message = self.delete_oldest_message()
-                    current_message_tokens -= count_message_tokens(
-                        removed_tool_message.to_string(),
-                        self.model_name,
-                    )
-            else:
-                # Delete the oldest message if the above condition is not met.
-                removed_message = self.delete_oldest_message()
-
-                current_message_tokens -= count_message_tokens(
-                    removed_message.to_string(), self.model_name
-                )
+                    self.delete_oldest_message()
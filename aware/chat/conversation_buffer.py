@@ -3,10 +3,10 @@ from typing import List
 from aware.config.config import Config
 from aware.chat.database.chat_database_handler import ChatDatabaseHandler
 from aware.data.data_saver import DataSaver
-from aware.utils.helpers import count_message_tokens
 
 from aware.chat.conversation_schemas import (
     ChatMessage,
+    count_chat_messages_tokens,
 )
 from aware.utils.logger.process_logger import ProcessLogger
 
@@ -27,26 +27,30 @@ class ConversationBuffer:
         self.messages: List[ChatMessage] = (
             self.chat_database_handler.get_conversation_buffer(process_id=process_id)
         )
+        self.current_tokens = count_chat_messages_tokens(
+            self.messages, self.model_name
+        )
 
     def get_current_tokens(self):
         """Get the current number of tokens in the conversation, excluding the system message."""
-
-        return count_message_tokens(
-            messages=self.to_string(),
-            model_name=self.model_name,
-        )
+        return self.current_tokens
 
     def get_remaining_tokens(self):
         return Config().max_conversation_tokens - self.get_current_tokens()
 
     def reset(self):
         self.chat_database_handler.clear_conversation_buffer(process_id=self.process_id)
+        self.messages = []
+        self.current_tokens = 0
 
     def should_trigger_warning(self):
-        warning_tokens = (
+        return self.get_current_tokens() >= self.get_warning_tokens()
+
+    @staticmethod
+    def get_warning_tokens() -> int:
+        return int(
             Config().max_conversation_tokens * Config().conversation_warning_threshold
         )
-        return self.get_current_tokens() >= int(warning_tokens)
 
     def to_string(self):
         conversation_string = "\n".join(
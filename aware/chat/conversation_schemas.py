@@ -1,13 +1,20 @@
 import json
 import abc
+import timeit
 from openai.types.chat import ChatCompletionMessageToolCall
 from openai.types.chat.chat_completion_message_tool_call import (
     Function as OpenAIFunction,
 )
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from aware.utils.helpers import count_message_tokens, count_messages_tokens
 
 
 def to_json_message(message_type: str, message_json_str: str):
+    return dict_to_json_message(message_type, json.loads(message_json_str))
+
+
+def dict_to_json_message(message_type: str, data: Dict[str, Any]):
     message_class: JSONMessage = {
         "UserMessage": UserMessage,
         "AssistantMessage": AssistantMessage,
@@ -17,7 +24,7 @@ def to_json_message(message_type: str, message_json_str: str):
     }.get(message_type)
 
     if message_class:
-        return message_class.from_json(message_json_str)
+        return message_class.from_dict(data)
     else:
         raise ValueError(f"Unknown message type: {message_type}")
 
@@ -28,7 +35,10 @@ class JSONMessage(abc.ABC):
 
     @classmethod
     def from_json(cls, json_str):
-        data = json.loads(json_str)
+        return cls.from_dict(json.loads(json_str))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
         return cls(**data)
 
     def to_dict(self):
@@ -142,8 +152,7 @@ class ToolCall(JSONMessage):
         self.function = function
 
     @classmethod
-    def from_json(cls, json_str):
-        data = json.loads(json_str)
+    def from_dict(cls, data: Dict[str, Any]):
         data["function"] = Function(**data["function"])
         return cls(**data)
 
@@ -203,19 +212,27 @@ class ToolCalls(JSONMessage):
         return ToolCalls(name=assistant_name, tool_calls=new_tool_calls)
 
     @classmethod
-    def from_json(cls, json_str):
-        data = json.loads(json_str)
-        data["tool_calls"] = [
-            ToolCall.from_json(json.dumps(tc)) for tc in data["tool_calls"]
-        ]
+    def from_dict(cls, data: Dict[str, Any]):
+        data["tool_calls"] = [ToolCall.from_dict(tc) for tc in data["tool_calls"]]
         return cls(**data)
 
 
 class ChatMessage(JSONMessage):
-    def __init__(self, message_id: str, timestamp: str, message: JSONMessage):
+    def __init__(
+        self,
+        message_id: str,
+        timestamp: str,
+        message: JSONMessage,
+        tokens: Optional[int] = None,
+    ):
         self.message_id = message_id
         self.timestamp = timestamp
         self.message = message
+        self.tokens = tokens
+
+    def get_tokens(self, model_name: str) -> int:
+        """Get the number of tokens of the message, counting them only the first time."""
+        return count_chat_messages_tokens([self], model_name)
 
     def to_string(self):
         return self.message.to_string()
@@ -235,3 +252,79 @@ class ChatMessage(JSONMessage):
         return {
             "message": self.message.to_openai_dict(),
         }
+
+    def to_compact_json(self) -> str:
+        """The form stored on Redis, once per message: [type, timestamp, tokens, message]."""
+        return json.dumps(
+            [
+                type(self.message).__name__,
+                self.timestamp,
+                self.tokens,
+                self.message.to_dict(),
+            ],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_compact_json(cls, message_id: str, json_str) -> "ChatMessage":
+        message_type, timestamp, tokens, message = json.loads(json_str)
+        return cls(
+            message_id=message_id,
+            timestamp=timestamp,
+            message=dict_to_json_message(message_type, message),
+            tokens=tokens,
+        )
+
+
+def count_chat_messages_tokens(
+    chat_messages: List[ChatMessage], model_name: str
+) -> int:
+    """Count in a single batch the tokens of the messages that don't have them cached yet and return the total."""
+    pending_messages = [
+        chat_message for chat_message in chat_messages if chat_message.tokens is None
+    ]
+    pending_tokens = count_messages_tokens(
+        [chat_message.to_string() for chat_message in pending_messages], model_name
+    )
+    for chat_message, tokens in zip(pending_messages, pending_tokens):
+        chat_message.tokens = tokens
+    return sum(chat_message.tokens for chat_message in chat_messages)
+
+
+def benchmark(num_messages: int = 200, model_name: str = "gpt-4"):
+    """Compare counting the tokens of a conversation by tokenizing it whole on each call and by caching them per message."""
+    contents = [
+        f"Message {index}: " + "Lorem ipsum dolor sit amet. " * 8
+        for index in range(num_messages)
+    ]
+
+    def new_chat_messages() -> List[ChatMessage]:
+        return [
+            ChatMessage(
+                message_id=str(index),
+                timestamp="2024-03-01T10:00:00+00:00",
+                message=UserMessage(name="benchmark", content=content),
+            )
+            for index, content in enumerate(contents)
+        ]
+
+    chat_messages = new_chat_messages()
+    count_chat_messages_tokens(chat_messages, model_name)
+    results = {
+        "previous": lambda: count_message_tokens(
+            "\n".join(chat_message.to_string() for chat_message in chat_messages),
+            model_name,
+        ),
+        "first count": lambda: count_chat_messages_tokens(
+            new_chat_messages(), model_name
+        ),
+        "cached": lambda: count_chat_messages_tokens(chat_messages, model_name),
+    }
+    for name, run in results.items():
+        elapsed = min(timeit.repeat(run, number=10, repeat=5)) / 10
+        print(f"{name}: {elapsed * 1e3:.3f} ms/count")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,61 +1,146 @@
+import json
+import time
 from redis.asyncio import Redis
-from typing import List, Optional, Tuple
+from redis.exceptions import ResponseError
+from typing import Any, Dict, List, Optional, Tuple
 
-from aware.chat.conversation_schemas import (
-    JSONMessage,
-)
+from aware.chat.conversation_schemas import ChatMessage, JSONMessage
 from aware.chat.call_info import CallInfo
 from aware.user.database.user_database_handler import UserDatabaseHandler
 
 
 class ChatAsyncRedisHandler:
+    api_key_ttl_sec = 60
+
     def __init__(self, client: Redis):
         self.client = client
+        self.api_keys: Dict[str, Tuple[Optional[str], float]] = {}
 
     # TODO: Check if conversation exists, return None otherwise.
     async def get_conversation(self, process_id: str) -> List[JSONMessage]:
         conversation_key = f"conversation:{process_id}"
 
-        # Retrieve all message keys from the sorted set, ordered by timestamp
-        message_keys = await self.client.zrange(conversation_key, 0, -1)
-
-        messages = []
-        for message_key in message_keys:
-            message_data = await self.client.hget(message_key, "data")
-            if message_data:
-                message_data_str = message_data
-                message = self.reconstruct_message(message_data_str)
-                messages.append(message)
-
-        return messages
-
-    # def get_message(self, conversation_id: str, message_id: str):
-    #     key = f"conversation:{conversation_id}:message:{message_id}"
-    #     message_data = self.client.hgetall(key)
-    #     if not message_data:
-    #         return None
-
-    #     message_type = message_data[b"type"].decode()
-    #     message_json = message_data[b"data"].decode()
-
-    #     return self.reconstruct_message(message_type, message_json)
-
-    # def reconstruct_message(self, message_data_str: str) -> JSONMessage:
-    #     message_data_json = json.loads(message_data_str)
-    #     message_type = message_data_json["type"]
-    #     message_json_str = message_data_json["data"]
-
-    #     return to_json_message(message_type, message_json_str)
-
-    async def get_call_info(self, process_id: str) -> CallInfo:
-        data = CallInfo.from_json(await self.client.get(f"call_info:{process_id}"))
-        data.set_conversation(await self.get_conversation(data.process_ids.process_id))
-
-        data.set_api_key(await UserDatabaseHandler().get_api_key(data.process_ids.user_id))
-        return data
-
-    async def get_pending_call(self) -> Optional[Tuple[str, str]]:
-        return await self.client.brpop("pending_call", timeout=10)
+        # Retrieve all message ids from the sorted set, ordered by timestamp
+        message_ids = await self.client.zrange(conversation_key, 0, -1)
+        if not message_ids:
+            return []
+
+        # Fetch all the messages in a single round-trip.
+        messages_data = await self.client.mget(
+            [f"message:{message_id}" for message_id in message_ids]
+        )
+        return [
+            ChatMessage.from_compact_json(message_id, message_data).message
+            for message_id, message_data in zip(message_ids, messages_data)
+            if message_data
+        ]
+
+    async def get_call_info(self, call_id: str) -> CallInfo:
+        call_info = CallInfo.from_payload_json(
+            await self.client.get(f"call_info:{call_id}")
+        )
+        # Calls queued before the messages were stored with the call info.
+        if not call_info.has_messages():
+            call_info.set_conversation(
+                await self.get_conversation(call_info.process_ids.process_id)
+            )
+
+        call_info.set_api_key(await self._get_api_key(call_info.process_ids.user_id))
+        return call_info
+
+    async def _get_api_key(self, user_id: str) -> Optional[str]:
+        """Get the API key of the user, cached for a short time as it is needed on every call."""
+        now = time.monotonic()
+        cached_api_key = self.api_keys.get(user_id)
+        if cached_api_key is not None and cached_api_key[1] > now:
+            return cached_api_key[0]
+        api_key = await UserDatabaseHandler().get_api_key(user_id)
+        self.api_keys[user_id] = (api_key, now + self.api_key_ttl_sec)
+        return api_key
+
+    async def ack_pending_call(self, group_name: str, entry_id: str):
+        await self.client.xack("pending_calls", group_name, entry_id)
+
+    async def touch_pending_calls(
+        self, group_name: str, consumer_name: str, entry_ids: List[str]
+    ):
+        """Reset the idle time of the calls held by this consumer, so they are not reclaimed while running."""
+        await self.client.xclaim(
+            "pending_calls",
+            group_name,
+            consumer_name,
+            min_idle_time=0,
+            message_ids=entry_ids,
+            justid=True,
+        )
+
+    async def create_pending_calls_group(self, group_name: str):
+        try:
+            await self.client.xgroup_create(
+                "pending_calls", group_name, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            # The group was already created by another dispatcher.
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def get_pending_calls(
+        self, group_name: str, consumer_name: str, count: int, block_ms: int
+    ) -> List[Tuple[str, str]]:
+        """Get new pending calls for this consumer as (entry_id, call_id), waiting up to block_ms."""
+        response = await self.client.xreadgroup(
+            group_name,
+            consumer_name,
+            {"pending_calls": ">"},
+            count=count,
+            block=block_ms,
+        )
+        if not response:
+            return []
+        _, entries = response[0]
+        return [(entry_id, fields["call_id"]) for entry_id, fields in entries]
+
+    async def reclaim_pending_calls(
+        self, group_name: str, consumer_name: str, min_idle_ms: int, count: int
+    ) -> List[Tuple[str, str]]:
+        """Claim the calls that were delivered to a consumer but not acknowledged after min_idle_ms."""
+        _, entries, *_ = await self.client.xautoclaim(
+            "pending_calls",
+            group_name,
+            consumer_name,
+            min_idle_time=min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        return [
+            (entry_id, fields["call_id"]) for entry_id, fields in entries if fields
+        ]
+
+    async def add_response_delta(self, call_id: str, delta: Dict[str, str]):
+        await self.client.xadd(f"response_stream:{call_id}", delta)
+
+    async def close_response_stream(
+        self, call_id: str, expire_sec: int, error: Optional[str] = None
+    ):
+        """Mark the stream as done, or as failed with the error, and expire it."""
+        response_stream_key = f"response_stream:{call_id}"
+        end_entry = (
+            {"type": "done"} if error is None else {"type": "error", "error": error}
+        )
+        async with self.client.pipeline() as pipeline:
+            pipeline.xadd(response_stream_key, end_entry)
+            pipeline.expire(response_stream_key, expire_sec)
+            await pipeline.execute()
+
+    async def set_dispatcher_metrics(
+        self, consumer_name: str, metrics: Dict[str, Any], expire_sec: int
+    ):
+        """Publish the metrics of a dispatcher, expiring them if it stops reporting."""
+        metrics_key = f"dispatcher_metrics:{consumer_name}"
+        await self.client.set(metrics_key, json.dumps(metrics), ex=expire_sec)
+
+    async def has_response(self, call_id: str) -> bool:
+        return bool(await self.client.exists(f"response:{call_id}"))
 
     async def store_response(self, call_id: str, response: str):
         await self.client.set(f"response:{call_id}", response)
@@ -1,7 +1,12 @@
 from typing import List, Tuple
+import uuid
 
 from aware.chat.call_info import CallInfo
-from aware.chat.conversation_schemas import ChatMessage, JSONMessage
+from aware.chat.conversation_schemas import (
+    ChatMessage,
+    JSONMessage,
+    count_chat_messages_tokens,
+)
 from aware.chat.database.chat_redis_handler import (
     ChatRedisHandler,
 )
@@ -9,12 +14,15 @@ from aware.chat.database.chat_async_redis_handler import ChatAsyncRedisHandler
 from aware.chat.database.chat_supabase_handler import (
     ChatSupabaseHandler,
 )
+from aware.config.config import Config
 from aware.process.process_ids import ProcessIds
 from aware.database.client_handlers import ClientHandlers
 
 # TODO: is this the right place to save UserData?
 from aware.user.user_data import UserData
+from aware.utils.helpers import count_message_tokens
 from aware.utils.logger.process_logger import ProcessLogger  # TODO: use agent logger?
+from aware.utils.timestamps import get_current_date_iso8601
 
 
 class ChatDatabaseHandler:
@@ -23,9 +31,12 @@ class ChatDatabaseHandler:
             client=ClientHandlers().get_redis_client()
         )
         self.supabase_handler = ChatSupabaseHandler(
-            client=ClientHandlers().get_supabase_client(), process_logger=process_logger
+            client=ClientHandlers().get_supabase_client(),
+            logger=process_logger.get_logger("chat_supabase_handler"),
         )
         self.logger = process_logger.get_logger("chat_database_handler")
+        # Supabase is written by the message flusher instead of on the agent step.
+        self.write_behind = Config().chat_write_behind
 
     def add_call_info(self, call_info: CallInfo):
         self.redis_handler.add_call_info(call_info)
@@ -35,59 +46,113 @@ class ChatDatabaseHandler:
         process_ids: ProcessIds,
         json_message: JSONMessage,
     ) -> ChatMessage:
+        if self.write_behind:
+            return self._add_message_write_behind(process_ids, json_message)
+
         self.logger.info("Adding to supa")
         chat_message = self.supabase_handler.add_message(
             process_id=process_ids.process_id,
             user_id=process_ids.user_id,
             json_message=json_message,
         )
+        # Count the tokens only once, they are stored with the message.
+        chat_message.get_tokens(Config().openai_model)
         self.logger.info("Adding to redis")
         self.redis_handler.add_message(
             process_id=process_ids.process_id, chat_message=chat_message
         )
         return chat_message
 
+    def _add_message_write_behind(
+        self,
+        process_ids: ProcessIds,
+        json_message: JSONMessage,
+    ) -> ChatMessage:
+        """Create the message locally and store it on Redis with its outbox entry, in a single transaction."""
+        chat_message = ChatMessage(
+            message_id=str(uuid.uuid4()),
+            timestamp=get_current_date_iso8601(),
+            message=json_message,
+        )
+        chat_message.get_tokens(Config().openai_model)
+        message_row = self.supabase_handler.get_message_row(
+            user_id=process_ids.user_id,
+            process_id=process_ids.process_id,
+            chat_message=chat_message,
+        )
+        self.redis_handler.add_message(
+            process_id=process_ids.process_id,
+            chat_message=chat_message,
+            outbox_data=message_row,
+        )
+        return chat_message
+
     def clear_conversation_buffer(self, process_id: str):
-        self.supabase_handler.clear_conversation_buffer(process_id)
+        self._clear_supabase_conversation_buffer(process_id)
         self.redis_handler.clear_conversation_buffer(process_id)
 
+    def _clear_supabase_conversation_buffer(self, process_id: str):
+        if self.write_behind:
+            # Through the outbox, so it is applied after the messages pending to be added.
+            self.redis_handler.add_to_outbox(
+                "clear_conversation_buffer", {"process_id": process_id}
+            )
+        else:
+            self.supabase_handler.clear_conversation_buffer(process_id)
+
+    def trigger_buffer_warning(self, process_id: str, warning_tokens: int) -> bool:
+        """Clear the buffer when its tokens reach warning_tokens, only one caller gets True for each time they are reached."""
+        # The tokens of the buffer stored on Supabase must be counted too.
+        self._load_conversation_buffer(process_id)
+        triggered = self.redis_handler.trigger_buffer_warning(
+            process_id, warning_tokens
+        )
+        if triggered:
+            self._clear_supabase_conversation_buffer(process_id)
+        return triggered
+
     def delete_message(self, process_id: str, message_id: str):
-        self.supabase_handler.delete_message(message_id)
+        if self.write_behind:
+            self.redis_handler.add_to_outbox(
+                "delete_message", {"message_id": message_id}
+            )
+        else:
+            self.supabase_handler.delete_message(message_id)
         self.redis_handler.delete_message(process_id, message_id)
 
     @staticmethod
     def get_async_redis_handler() -> ChatAsyncRedisHandler:
         return ChatAsyncRedisHandler(client=ClientHandlers().get_async_redis_client())
 
-    # TODO: Clarify: Redis returns JsonMessage but Supabase ChatMessage...
     def get_conversation(self, process_id: str) -> List[ChatMessage]:
         conversation_messages = self.redis_handler.get_conversation(process_id)
         for index, message in enumerate(conversation_messages):
             self.logger.info(f"REDIS MESSAGE {index}: {message.to_string()}")
         if not conversation_messages:
             conversation_messages = self.supabase_handler.get_conversation(process_id)
-            for message in conversation_messages:
-                self.redis_handler.add_message(
-                    process_id=process_id, chat_message=message
-                )
+            count_chat_messages_tokens(conversation_messages, Config().openai_model)
+            self.redis_handler.add_messages(process_id, conversation_messages)
         return conversation_messages
 
-    # TODO: Clarify: Redis returns JsonMessage but Supabase ChatMessage...
     def get_conversation_buffer(self, process_id: str) -> List[ChatMessage]:
+        self._load_conversation_buffer(process_id)
         conversation_messages = self.redis_handler.get_conversation_buffer(process_id)
         for index, message in enumerate(conversation_messages):
             self.logger.info(f"BUFFERED REDIS MESSAGE {index}: {message.to_string()}")
-        if not conversation_messages:
-            # If there are no buffered messages, get the buffered messages from supabase.
-            conversation_messages = self.supabase_handler.get_conversation_buffer(
-                process_id
-            )
-            for message in conversation_messages:
-                self.redis_handler.add_message_to_buffer(
-                    process_id=process_id, chat_message=message
-                )
         return conversation_messages
 
+    def _load_conversation_buffer(self, process_id: str):
+        """Load the buffer from Supabase the first time it is used on Redis, or after Redis lost it."""
+        if self.redis_handler.is_buffer_loaded(process_id):
+            return
+        conversation_messages = self.supabase_handler.get_conversation_buffer(
+            process_id
+        )
+        count_chat_messages_tokens(conversation_messages, Config().openai_model)
+        # Merged by id with the messages added to Redis meanwhile, each one counted once.
+        self.redis_handler.add_messages_to_buffer(process_id, conversation_messages)
+        self.redis_handler.set_buffer_loaded(process_id)
+
     def get_conversation_with_keys(
         self, process_id: str
     ) -> List[Tuple[str, JSONMessage]]:
@@ -114,6 +179,11 @@ class ChatDatabaseHandler:
     def set_user_data(self, user_data: UserData):
         self.redis_handler.set_user_data(user_data)
 
-    def update_message(self, message_key: str, message: JSONMessage):
+    def update_message(self, process_id: str, message_key: str, message: JSONMessage):
         # self.supabase_handler.update_message(process_id, message_id, message) # TODO: Implement me! refactor this function properly..
-        self.redis_handler.update_message(message_key, message)
+        self.redis_handler.update_message(
+            process_id,
+            message_key,
+            message,
+            tokens=count_message_tokens(message.to_string(), Config().openai_model),
+        )
@@ -1,150 +1,626 @@
 import json
-from typing import List, Tuple
+import sys
+import timeit
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
 from redis import Redis
+from redis.client import Pipeline
+from redis.exceptions import ResponseError
 
 from aware.chat.call_info import CallInfo
 from aware.chat.conversation_schemas import (
     AssistantMessage,
     ChatMessage,
     JSONMessage,
-    SystemMessage,
-    ToolResponseMessage,
-    ToolCalls,
     UserMessage,
+    to_json_message,
 )
 
-from aware.utils.helpers import convert_timestamp_to_epoch
+from aware.utils.timestamps import convert_timestamps_to_epoch
+
+# Writes pending to be persisted on Supabase, in the order they were done.
+CHAT_OUTBOX_KEY = "chat_outbox"
+# Each message is stored once as message:{id}, the conversation and its buffer are sorted sets of ids.
+# A message is deleted when it is no longer on any of them.
+CLEAR_BUFFER_FUNCTION = """
+local function clear_buffer(conversation_key, buffer_key, tokens_key, loaded_key)
+    for _, message_id in ipairs(redis.call("ZRANGE", buffer_key, 0, -1)) do
+        if not redis.call("ZSCORE", conversation_key, message_id) then
+            redis.call("DEL", "message:" .. message_id)
+        end
+    end
+    redis.call("DEL", buffer_key)
+    redis.call("SET", tokens_key, 0)
+    -- Supabase keeps the buffer until the outbox is flushed, it is not loaded again.
+    redis.call("SET", loaded_key, 1)
+end
+"""
+# Count the tokens of a buffer stored before they were counted, from the tokens of its messages.
+INIT_BUFFER_TOKENS_FUNCTION = """
+local function init_buffer_tokens(buffer_key, tokens_key)
+    if redis.call("EXISTS", tokens_key) == 1 then
+        return
+    end
+    local tokens = 0
+    for _, message_id in ipairs(redis.call("ZRANGE", buffer_key, 0, -1)) do
+        local data = redis.call("GET", "message:" .. message_id)
+        if data then
+            tokens = tokens + (tonumber(cjson.decode(data)[3]) or 0)
+        end
+    end
+    redis.call("SET", tokens_key, tokens)
+end
+"""
+CLEAR_BUFFER_SCRIPT = (
+    CLEAR_BUFFER_FUNCTION
+    + """
+clear_buffer(KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+"""
+)
+# ARGV: score, message id and tokens of each message, only the messages new to the buffer add their tokens.
+ADD_TO_BUFFER_SCRIPT = (
+    INIT_BUFFER_TOKENS_FUNCTION
+    + """
+init_buffer_tokens(KEYS[1], KEYS[2])
+local tokens = 0
+for i = 1, #ARGV, 3 do
+    if redis.call("ZADD", KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        tokens = tokens + tonumber(ARGV[i + 2])
+    end
+end
+redis.call("INCRBY", KEYS[2], tokens)
+"""
+)
+# Clear the buffer once its tokens reach the warning, so a single caller triggers each crossing.
+TRIGGER_BUFFER_WARNING_SCRIPT = (
+    CLEAR_BUFFER_FUNCTION
+    + INIT_BUFFER_TOKENS_FUNCTION
+    + """
+init_buffer_tokens(KEYS[2], KEYS[3])
+if tonumber(redis.call("GET", KEYS[3])) < tonumber(ARGV[1]) then
+    return 0
+end
+clear_buffer(KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+return 1
+"""
+)
+DELETE_MESSAGE_SCRIPT = """
+redis.call("ZREM", KEYS[1], ARGV[1])
+if not redis.call("ZSCORE", KEYS[2], ARGV[1]) then
+    redis.call("DEL", "message:" .. ARGV[1])
+end
+"""
+# Replace the message keeping its timestamp, the buffer tokens are adjusted when the buffer has it.
+UPDATE_MESSAGE_SCRIPT = """
+local data = redis.call("GET", KEYS[1])
+if not data then
+    return 0
+end
+local _, timestamp, tokens = unpack(cjson.decode(data))
+redis.call(
+    "SET",
+    KEYS[1],
+    "[" .. cjson.encode(ARGV[2]) .. "," .. cjson.encode(timestamp) .. ","
+        .. ARGV[3] .. "," .. ARGV[4] .. "]"
+)
+if redis.call("ZSCORE", KEYS[2], ARGV[1]) and redis.call("EXISTS", KEYS[3]) == 1 then
+    redis.call("INCRBY", KEYS[3], tonumber(ARGV[3]) - (tonumber(tokens) or 0))
+end
+return 1
+"""
 
 
 class ChatRedisHandler:
     def __init__(self, client: Redis):
         self.client = client
+        self.clear_buffer_script = client.register_script(CLEAR_BUFFER_SCRIPT)
+        self.add_to_buffer_script = client.register_script(ADD_TO_BUFFER_SCRIPT)
+        self.trigger_buffer_warning_script = client.register_script(
+            TRIGGER_BUFFER_WARNING_SCRIPT
+        )
+        self.delete_message_script = client.register_script(DELETE_MESSAGE_SCRIPT)
+        self.update_message_script = client.register_script(UPDATE_MESSAGE_SCRIPT)
 
     def add_call_info(self, call_info: CallInfo):
         self.client.set(
             f"call_info:{call_info.call_id}",
-            call_info.to_json(),
+            call_info.to_payload_json(),
         )
-        self.client.lpush("pending_call", call_info.call_id)
+        self.client.xadd("pending_calls", {"call_id": call_info.call_id})
 
     def add_message(
         self,
         process_id: str,
         chat_message: ChatMessage,
+        outbox_data: Optional[Dict[str, Any]] = None,
     ):
-        message = chat_message.message
-        key = f"conversation:{process_id}:message:{chat_message.message_id}"
-        message_data = json.dumps(
-            {"type": type(message).__name__, "data": message.to_json()}
+        """Add the message to the conversation and its buffer, together with the outbox entry that persists it if given."""
+        pipeline = self.client.pipeline()
+        self._add_messages(
+            pipeline,
+            ["conversation", "conversation_buffer"],
+            process_id,
+            [chat_message],
         )
-        self.client.hmset(key, {"data": message_data})
-
-        # Add the key to the sorted set with timestamp as the score
-        conversation_key = f"conversation:{process_id}"
-        self.client.zadd(
-            conversation_key, {key: convert_timestamp_to_epoch(chat_message.timestamp)}
-        )
-        self.add_message_to_buffer(process_id, chat_message)
+        if outbox_data is not None:
+            self._add_to_outbox(pipeline, "add_message", outbox_data)
+        pipeline.execute()
 
     def add_message_to_buffer(
         self,
         process_id: str,
         chat_message: ChatMessage,
     ):
-        message = chat_message.message
-        key = f"conversation_buffer:{process_id}:message:{chat_message.message_id}"
-        message_data = json.dumps(
-            {"type": type(message).__name__, "data": message.to_json()}
+        self.add_messages_to_buffer(process_id, [chat_message])
+
+    def add_messages(self, process_id: str, chat_messages: List[ChatMessage]):
+        """Add a full conversation, as add_message does for each message, in a single round-trip."""
+        pipeline = self.client.pipeline(transaction=False)
+        self._add_messages(
+            pipeline, ["conversation", "conversation_buffer"], process_id, chat_messages
         )
-        self.client.hmset(key, {"data": message_data})
-        conversation_buffer_key = f"conversation_buffer:{process_id}"
-        self.client.zadd(
-            conversation_buffer_key,
-            {key: convert_timestamp_to_epoch(chat_message.timestamp)},
+        pipeline.execute()
+
+    def add_messages_to_buffer(
+        self, process_id: str, chat_messages: List[ChatMessage]
+    ):
+        pipeline = self.client.pipeline(transaction=False)
+        self._add_messages(pipeline, ["conversation_buffer"], process_id, chat_messages)
+        pipeline.execute()
+
+    def _add_messages(
+        self,
+        pipeline: Pipeline,
+        prefixes: List[str],
+        process_id: str,
+        chat_messages: List[ChatMessage],
+    ):
+        if not chat_messages:
+            return
+        epochs = convert_timestamps_to_epoch(
+            [chat_message.timestamp for chat_message in chat_messages]
         )
+        scores = {}
+        for chat_message, epoch in zip(chat_messages, epochs):
+            pipeline.set(
+                f"message:{chat_message.message_id}", chat_message.to_compact_json()
+            )
+            scores[chat_message.message_id] = epoch
+        if "conversation" in prefixes:
+            pipeline.zadd(f"conversation:{process_id}", scores)
+        if "conversation_buffer" in prefixes:
+            # Counts the tokens with the buffer, so they are known without loading it.
+            buffer_args = []
+            for chat_message, epoch in zip(chat_messages, epochs):
+                buffer_args.extend(
+                    [epoch, chat_message.message_id, chat_message.tokens or 0]
+                )
+            self.add_to_buffer_script(
+                keys=self._get_buffer_script_keys(process_id)[1:3],
+                args=buffer_args,
+                client=pipeline,
+            )
 
-    def clear_conversation_buffer(self, process_id: str):
-        self.client.delete(f"conversation_buffer:{process_id}")
+    def add_to_outbox(self, entry_type: str, data: Dict[str, Any]):
+        pipeline = self.client.pipeline()
+        self._add_to_outbox(pipeline, entry_type, data)
+        pipeline.execute()
 
-    def delete_message(self, process_id: str, message_id: str):
-        # The key for the specific message
-        message_key = f"conversation:{process_id}:message:{message_id}"
+    def _add_to_outbox(self, pipeline: Pipeline, entry_type: str, data: Dict[str, Any]):
+        pipeline.xadd(CHAT_OUTBOX_KEY, {"type": entry_type, "data": json.dumps(data)})
 
-        # Remove the hash storing the message details
-        self.client.delete(message_key)
+    def ack_outbox_entries(self, group_name: str, entry_ids: List[str]):
+        self.client.xack(CHAT_OUTBOX_KEY, group_name, *entry_ids)
 
-        # Remove the message reference from the sorted set
-        conversation_key = f"conversation:{process_id}"
-        self.client.zrem(conversation_key, message_key)
+    def add_to_outbox_dead_letters(
+        self, entry_type: str, data: Dict[str, Any], error: str
+    ):
+        """Keep the entries rejected by Supabase, to inspect them and replay them once the cause is fixed."""
+        self.client.xadd(
+            f"{CHAT_OUTBOX_KEY}:dead_letters",
+            {"type": entry_type, "data": json.dumps(data), "error": error},
+        )
 
-    def get_conversation(self, process_id: str) -> List[JSONMessage]:
-        conversation_key = f"conversation:{process_id}"
+    def replay_outbox_dead_letters(self) -> int:
+        """Move the dead letters back to the end of the outbox, returns the number replayed."""
+        dead_letters_key = f"{CHAT_OUTBOX_KEY}:dead_letters"
+        num_replayed = 0
+        for entry_id, fields in self.client.xrange(dead_letters_key):
+            pipeline = self.client.pipeline()
+            pipeline.xadd(
+                CHAT_OUTBOX_KEY, {"type": fields[b"type"], "data": fields[b"data"]}
+            )
+            pipeline.xdel(dead_letters_key, entry_id)
+            pipeline.execute()
+            num_replayed += 1
+        return num_replayed
 
-        # Retrieve all message keys from the sorted set, ordered by timestamp
-        message_keys = self.client.zrange(conversation_key, 0, -1)
+    def touch_outbox_entries(
+        self, group_name: str, consumer_name: str, entry_ids: List[str]
+    ):
+        """Reset the idle time of the entries held by this consumer, so other flushers don't reclaim them."""
+        self.client.xclaim(
+            CHAT_OUTBOX_KEY,
+            group_name,
+            consumer_name,
+            min_idle_time=0,
+            message_ids=entry_ids,
+            justid=True,
+        )
 
-        messages = []
-        for message_key in message_keys:
-            message_data = self.client.hget(message_key, "data")
-            if message_data:
-                message_data_str = message_data.decode()
-                message = self.reconstruct_message(message_data_str)
-                messages.append(message)
+    def create_outbox_group(self, group_name: str):
+        try:
+            self.client.xgroup_create(
+                CHAT_OUTBOX_KEY, group_name, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            # The group was already created by another flusher.
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def get_outbox_entries(
+        self,
+        group_name: str,
+        consumer_name: str,
+        count: int,
+        block_ms: Optional[int] = None,
+        pending: bool = False,
+    ) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Get the outbox entries of this consumer as (entry_id, type, data), the ones not acknowledged yet if pending."""
+        response = self.client.xreadgroup(
+            group_name,
+            consumer_name,
+            {CHAT_OUTBOX_KEY: "0" if pending else ">"},
+            count=count,
+            block=None if pending else block_ms,
+        )
+        if not response:
+            return []
+        _, entries = response[0]
+        return self._parse_outbox_entries(entries)
+
+    def reclaim_outbox_entries(
+        self, group_name: str, consumer_name: str, min_idle_ms: int, count: int
+    ) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Claim the entries delivered to another flusher but not acknowledged after min_idle_ms."""
+        _, entries, *_ = self.client.xautoclaim(
+            CHAT_OUTBOX_KEY,
+            group_name,
+            consumer_name,
+            min_idle_time=min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        return self._parse_outbox_entries(entries)
+
+    def _parse_outbox_entries(
+        self, entries: List[Tuple[bytes, Dict[bytes, bytes]]]
+    ) -> List[Tuple[str, str, Dict[str, Any]]]:
+        return [
+            (entry_id.decode(), fields[b"type"].decode(), json.loads(fields[b"data"]))
+            for entry_id, fields in entries
+            # Entries deleted from the stream are still returned as pending, without fields.
+            if fields
+        ]
+
+    def clear_conversation_buffer(self, process_id: str):
+        self.clear_buffer_script(keys=self._get_buffer_script_keys(process_id))
+
+    def is_buffer_loaded(self, process_id: str) -> bool:
+        """Check if the buffer stored on Supabase was loaded into Redis, or cleared since."""
+        return bool(self.client.exists(f"conversation_buffer:{process_id}:loaded"))
+
+    def set_buffer_loaded(self, process_id: str):
+        self.client.set(f"conversation_buffer:{process_id}:loaded", 1)
+
+    def trigger_buffer_warning(self, process_id: str, warning_tokens: int) -> bool:
+        """Clear the buffer if its tokens reached warning_tokens."""
+        triggered = self.trigger_buffer_warning_script(
+            keys=self._get_buffer_script_keys(process_id), args=[warning_tokens]
+        )
+        return bool(triggered)
+
+    def _get_buffer_script_keys(self, process_id: str) -> List[str]:
+        return [
+            f"conversation:{process_id}",
+            f"conversation_buffer:{process_id}",
+            f"conversation_buffer:{process_id}:tokens",
+            f"conversation_buffer:{process_id}:loaded",
+        ]
+
+    def delete_message(self, process_id: str, message_id: str):
+        """Remove the message from the conversation, it is only deleted if the buffer doesn't have it."""
+        self.delete_message_script(
+            keys=[f"conversation:{process_id}", f"conversation_buffer:{process_id}"],
+            args=[message_id],
+        )
 
-        return messages
+    def get_conversation(self, process_id: str) -> List[ChatMessage]:
+        return [
+            chat_message
+            for _, chat_message in self._get_messages_with_keys(
+                f"conversation:{process_id}"
+            )
+        ]
 
     def get_conversation_with_keys(
         self, process_id: str
     ) -> List[Tuple[str, JSONMessage]]:
-        conversation_key = f"conversation:{process_id}"
-        message_keys = self.client.zrange(conversation_key, 0, -1)
+        return [
+            (message_key, chat_message.message)
+            for message_key, chat_message in self._get_messages_with_keys(
+                f"conversation:{process_id}"
+            )
+        ]
+
+    def get_conversation_buffer(self, process_id: str) -> List[ChatMessage]:
+        return [
+            chat_message
+            for _, chat_message in self._get_messages_with_keys(
+                f"conversation_buffer:{process_id}"
+            )
+        ]
+
+    def _get_messages_with_keys(
+        self, sorted_set_key: str
+    ) -> List[Tuple[str, ChatMessage]]:
+        """Get all the messages referenced by a sorted set in two round-trips: ZRANGE + MGET."""
+        # Retrieve all message ids from the sorted set, ordered by timestamp
+        message_ids = [
+            message_id.decode()
+            for message_id in self.client.zrange(sorted_set_key, 0, -1)
+        ]
+        if not message_ids:
+            return []
+
+        message_keys = [f"message:{message_id}" for message_id in message_ids]
+        messages_data = self.client.mget(message_keys)
 
         messages_with_keys = []
-        for message_key in message_keys:
-            message_data = self.client.hget(message_key, "data")
+        for message_key, message_id, message_data in zip(
+            message_keys, message_ids, messages_data
+        ):
             if message_data:
-                message_data_str = message_data.decode()
-                message = self.reconstruct_message(message_data_str)
-                messages_with_keys.append((message_key, message))
-
+                chat_message = ChatMessage.from_compact_json(message_id, message_data)
+                messages_with_keys.append((message_key, chat_message))
         return messages_with_keys
 
-    def get_conversation_buffer(self, process_id: str) -> List[JSONMessage]:
-        conversation_key = f"conversation_buffer:{process_id}"
+    def update_message(
+        self, process_id: str, message_key: str, message: JSONMessage, tokens: int
+    ):
+        """Update the message shared by the conversation and the buffer, keeping the buffer tokens counted."""
+        self.update_message_script(
+            keys=[
+                message_key,
+                f"conversation_buffer:{process_id}",
+                f"conversation_buffer:{process_id}:tokens",
+            ],
+            args=[
+                message_key.split(":", 1)[1],
+                type(message).__name__,
+                tokens,
+                json.dumps(
+                    message.to_dict(), separators=(",", ":"), ensure_ascii=False
+                ),
+            ],
+        )
 
-        # Retrieve all message keys from the sorted set, ordered by timestamp
-        message_keys = self.client.zrange(conversation_key, 0, -1)
+    def migrate_legacy_conversations(self) -> int:
+        """Move the messages stored as a hash per conversation and buffer to the single message store, returns the number migrated."""
+        num_migrated = 0
+        for prefix in ["conversation", "conversation_buffer"]:
+            for sorted_set_key in self.client.scan_iter(
+                match=f"{prefix}:*", _type="ZSET"
+            ):
+                num_migrated += self._migrate_legacy_sorted_set(sorted_set_key)
+        return num_migrated
 
-        messages = []
-        for message_key in message_keys:
-            message_data = self.client.hget(message_key, "data")
-            if message_data:
-                message_data_str = message_data.decode()
-                message = self.reconstruct_message(message_data_str)
-                messages.append(message)
-
-        return messages
-
-    def reconstruct_message(self, message_data_str: str) -> JSONMessage:
-        message_data_json = json.loads(message_data_str)
-        message_type = message_data_json["type"]
-        message_json_str = message_data_json["data"]
-
-        message_class: JSONMessage = {
-            "UserMessage": UserMessage,
-            "AssistantMessage": AssistantMessage,
-            "SystemMessage": SystemMessage,
-            "ToolResponseMessage": ToolResponseMessage,
-            "ToolCalls": ToolCalls,
-        }.get(message_type)
-
-        if message_class:
-            return message_class.from_json(message_json_str)
-        else:
-            raise ValueError(f"Unknown message type: {message_type}")
-
-    def update_message(self, message_key: str, message: JSONMessage):
-        message_data = json.dumps(
-            {"type": type(message).__name__, "data": message.to_json()}
+    def _migrate_legacy_sorted_set(self, sorted_set_key: bytes) -> int:
+        legacy_members = [
+            (member, score)
+            for member, score in self.client.zrange(
+                sorted_set_key, 0, -1, withscores=True
+            )
+            # The legacy members are the keys of the hashes, the new ones only the ids.
+            if b":message:" in member
+        ]
+        if not legacy_members:
+            return 0
+
+        pipeline = self.client.pipeline(transaction=False)
+        for legacy_key, _ in legacy_members:
+            pipeline.hmget(legacy_key, "data", "message_id", "timestamp", "tokens")
+        legacy_messages_fields = pipeline.execute()
+
+        pipeline = self.client.pipeline()
+        for (legacy_key, score), message_fields in zip(
+            legacy_members, legacy_messages_fields
+        ):
+            chat_message = self._reconstruct_legacy_chat_message(
+                legacy_key, *message_fields
+            )
+            if chat_message is not None:
+                pipeline.set(
+                    f"message:{chat_message.message_id}",
+                    chat_message.to_compact_json(),
+                )
+                pipeline.zadd(sorted_set_key, {chat_message.message_id: score})
+            pipeline.zrem(sorted_set_key, legacy_key)
+            pipeline.delete(legacy_key)
+        pipeline.execute()
+        return len(legacy_members)
+
+    def _reconstruct_legacy_chat_message(
+        self,
+        message_key: bytes,
+        data: Optional[bytes],
+        message_id: Optional[bytes],
+        timestamp: Optional[bytes],
+        tokens: Optional[bytes],
+    ) -> Optional[ChatMessage]:
+        if not data:
+            return None
+
+        # Messages stored before message_id was part of the hash still have it as key suffix.
+        if message_id is None:
+            message_id = message_key.rsplit(b":", 1)[-1]
+        message_data = json.loads(data)
+        return ChatMessage(
+            message_id=message_id.decode(),
+            timestamp=timestamp.decode() if timestamp is not None else None,
+            message=to_json_message(message_data["type"], message_data["data"]),
+            tokens=int(tokens) if tokens is not None else None,
+        )
+
+
+def benchmark(client: Redis, num_messages: int = 1000):
+    """Compare the Redis memory used per message by the previous layout and the single message store."""
+
+    def add_message_previous(process_id: str, chat_message: ChatMessage):
+        message = chat_message.message
+        message_mapping = {
+            "data": json.dumps(
+                {"type": type(message).__name__, "data": message.to_json()}
+            ),
+            "message_id": chat_message.message_id,
+            "timestamp": chat_message.timestamp,
+            "tokens": chat_message.tokens,
+        }
+        epoch = convert_timestamps_to_epoch([chat_message.timestamp])[0]
+        for prefix in ["conversation", "conversation_buffer"]:
+            key = f"{prefix}:{process_id}:message:{chat_message.message_id}"
+            client.hset(key, mapping=message_mapping)
+            client.zadd(f"{prefix}:{process_id}", {key: epoch})
+
+    def get_memory_usage(keys: List[str]) -> int:
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.memory_usage(key, samples=0)
+        return sum(usage or 0 for usage in pipeline.execute())
+
+    process_id = f"benchmark-{uuid.uuid4()}"
+    chat_messages = [
+        ChatMessage(
+            message_id=str(uuid.uuid4()),
+            timestamp=f"2024-03-01T10:{index // 60 % 60:02d}:{index % 60:02d}"
+            f".{index:06d}+00:00",
+            message=(UserMessage if index % 2 else AssistantMessage)(
+                name="benchmark",
+                content=f"Message {index}: " + "Lorem ipsum dolor sit amet. " * 8,
+            ),
+            tokens=60,
+        )
+        for index in range(num_messages)
+    ]
+    sorted_set_keys = [
+        f"conversation:{process_id}",
+        f"conversation_buffer:{process_id}",
+    ]
+    previous_keys = sorted_set_keys + [
+        f"{prefix}:{process_id}:message:{chat_message.message_id}"
+        for prefix in ["conversation", "conversation_buffer"]
+        for chat_message in chat_messages
+    ]
+    current_keys = sorted_set_keys + [
+        f"message:{chat_message.message_id}" for chat_message in chat_messages
+    ]
+
+    redis_handler = ChatRedisHandler(client)
+    try:
+        for chat_message in chat_messages:
+            add_message_previous(process_id, chat_message)
+        previous_bytes = get_memory_usage(previous_keys)
+
+        for sorted_set_key in sorted_set_keys:
+            redis_handler._migrate_legacy_sorted_set(sorted_set_key.encode())
+        current_bytes = get_memory_usage(current_keys)
+        assert redis_handler.get_conversation(process_id)[-1].to_string() == (
+            chat_messages[-1].to_string()
         )
-        self.client.hmset(message_key, {"data": message_data})
+    finally:
+        client.delete(*set(previous_keys + current_keys))
+
+    print(f"previous: {previous_bytes / num_messages:.0f} bytes/message")
+    print(f"current: {current_bytes / num_messages:.0f} bytes/message")
+
+
+def benchmark_loading(client: Redis, lengths: Tuple[int, ...] = (10, 50, 200, 1000)):
+    """Compare the round-trips and latency of loading a conversation message by message and in batch."""
+
+    def get_conversation_previous(process_id: str) -> List[ChatMessage]:
+        chat_messages = []
+        for message_id in client.zrange(f"conversation:{process_id}", 0, -1):
+            message_data = client.get(f"message:{message_id.decode()}")
+            if message_data:
+                chat_messages.append(
+                    ChatMessage.from_compact_json(message_id.decode(), message_data)
+                )
+        return chat_messages
+
+    def count_round_trips(run) -> int:
+        num_commands = 0
+        execute_command = client.execute_command
+
+        def counting_execute_command(*args, **kwargs):
+            nonlocal num_commands
+            num_commands += 1
+            return execute_command(*args, **kwargs)
+
+        client.execute_command = counting_execute_command
+        try:
+            run()
+        finally:
+            del client.execute_command
+        return num_commands
+
+    redis_handler = ChatRedisHandler(client)
+    for num_messages in lengths:
+        process_id = f"benchmark-{uuid.uuid4()}"
+        chat_messages = [
+            ChatMessage(
+                message_id=str(uuid.uuid4()),
+                timestamp=f"2024-03-01T10:{index // 60 % 60:02d}:{index % 60:02d}"
+                f".{index:06d}+00:00",
+                message=UserMessage(name="benchmark", content=f"Message {index}"),
+                tokens=5,
+            )
+            for index in range(num_messages)
+        ]
+        redis_handler.add_messages(process_id, chat_messages)
+        try:
+            loaders = {
+                "previous": lambda: get_conversation_previous(process_id),
+                "current": lambda: redis_handler.get_conversation(process_id),
+            }
+            for name, run in loaders.items():
+                assert len(run()) == num_messages
+                round_trips = count_round_trips(run)
+                elapsed = min(timeit.repeat(run, number=1, repeat=5))
+                print(
+                    f"{num_messages} messages, {name}: {round_trips} round-trips, "
+                    f"{elapsed * 1e3:.2f} ms"
+                )
+        finally:
+            message_keys = [
+                f"message:{chat_message.message_id}" for chat_message in chat_messages
+            ]
+            client.delete(
+                *redis_handler._get_buffer_script_keys(process_id), *message_keys
+            )
+
+
+def main():
+    """Migrate the conversations stored with the previous layout, or benchmark it against the previous one with --benchmark."""
+    from aware.database.client_handlers import ClientHandlers
+
+    client = ClientHandlers().get_redis_client()
+    if "--benchmark" in sys.argv:
+        benchmark(client)
+        benchmark_loading(client)
+        return
+    num_migrated = ChatRedisHandler(client).migrate_legacy_conversations()
+    print(f"Migrated {num_migrated} messages.")
+
+
+if __name__ == "__main__":
+    main()
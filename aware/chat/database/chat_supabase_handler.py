@@ -1,16 +1,16 @@
+import logging
 from supabase import Client
-from typing import List
+from typing import Any, Dict, List
 
 from aware.chat.conversation_schemas import ChatMessage, JSONMessage
 from aware.chat.database.messages_factory import MessagesFactory
 from aware.config.config import Config
-from aware.utils.logger.process_logger import ProcessLogger
 
 
 class ChatSupabaseHandler:
-    def __init__(self, client: Client, process_logger: ProcessLogger):
+    def __init__(self, client: Client, logger: logging.Logger):
         self.client = client
-        self.logger = process_logger.get_logger("chat_supabase_handler")
+        self.logger = logger
 
     def add_message(
         self,
@@ -18,6 +18,37 @@ class ChatSupabaseHandler:
         process_id: str,
         json_message: JSONMessage,
     ) -> ChatMessage:
+        invoke_options = self._get_message_options(user_id, process_id, json_message)
+        self.logger.info("Adding message to database")
+        response = self.client.rpc("insert_new_message", invoke_options).execute().data
+        self.logger.info(f"Database acknowledge {response}")
+        response = response[0]
+        return ChatMessage(
+            message_id=response["id"],
+            timestamp=response["created_at"],
+            message=json_message,
+        )
+
+    def add_messages(self, messages: List[Dict[str, Any]]):
+        """Insert the messages created with local ids, the ones already inserted are skipped so a batch can be retried."""
+        self.logger.info(f"Adding {len(messages)} messages to database")
+        self.client.rpc("insert_new_messages", {"p_messages": messages}).execute()
+
+    def get_message_row(
+        self, user_id: str, process_id: str, chat_message: ChatMessage
+    ) -> Dict[str, Any]:
+        """The arguments of insert_new_messages for a message created with a local id."""
+        message_row = self._get_message_options(
+            user_id, process_id, chat_message.message
+        )
+        message_row.update(
+            {"p_id": chat_message.message_id, "p_created_at": chat_message.timestamp}
+        )
+        return message_row
+
+    def _get_message_options(
+        self, user_id: str, process_id: str, json_message: JSONMessage
+    ) -> Dict[str, Any]:
         invoke_options = {
             "p_user_id": user_id,
             "p_process_id": process_id,
@@ -31,15 +62,7 @@ class ChatSupabaseHandler:
         }
         # Expand dictionary with json_message data
         invoke_options.update(json_message_dict)
-        self.logger.info("Adding message to database")
-        response = self.client.rpc("insert_new_message", invoke_options).execute().data
-        self.logger.info(f"Database acknowledge {response}")
-        response = response[0]
-        return ChatMessage(
-            message_id=response["id"],
-            timestamp=response["created_at"],
-            message=json_message,
-        )
+        return invoke_options
 
     def clear_conversation_buffer(self, process_id: str):
         response = self.client.rpc(
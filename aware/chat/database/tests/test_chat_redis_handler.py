@@ -0,0 +1,146 @@
+import json
+import unittest
+
+import fakeredis
+
+from aware.chat.conversation_schemas import ChatMessage, UserMessage
+from aware.chat.database.chat_redis_handler import ChatRedisHandler
+
+
+def create_chat_message(index: int, tokens: int) -> ChatMessage:
+    return ChatMessage(
+        message_id=f"message_{index}",
+        timestamp=f"2024-03-01T10:00:{index:02d}+00:00",
+        message=UserMessage(name="user", content=f"Message {index}"),
+        tokens=tokens,
+    )
+
+
+class TestChatRedisHandler(unittest.TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        self.redis_handler = ChatRedisHandler(self.client)
+
+    def get_buffer_tokens(self, process_id: str) -> int:
+        return int(self.client.get(f"conversation_buffer:{process_id}:tokens"))
+
+    def test_buffer_tokens_count_each_message_once(self):
+        self.redis_handler.add_message("process", create_chat_message(0, tokens=5))
+        self.redis_handler.add_messages_to_buffer(
+            "process",
+            [create_chat_message(0, tokens=5), create_chat_message(1, tokens=7)],
+        )
+        self.assertEqual(self.get_buffer_tokens("process"), 12)
+
+    def test_buffer_tokens_are_counted_from_a_buffer_stored_without_them(self):
+        legacy_message = create_chat_message(0, tokens=10)
+        self.client.set(
+            f"message:{legacy_message.message_id}", legacy_message.to_compact_json()
+        )
+        self.client.zadd("conversation_buffer:process", {legacy_message.message_id: 1})
+
+        self.redis_handler.add_message("process", create_chat_message(1, tokens=5))
+        self.assertEqual(self.get_buffer_tokens("process"), 15)
+
+        # Also when the counter is lost while the buffer is kept.
+        self.client.delete("conversation_buffer:process:tokens")
+        self.assertFalse(self.redis_handler.trigger_buffer_warning("process", 16))
+        self.assertEqual(self.get_buffer_tokens("process"), 15)
+
+    def test_buffer_warning_clears_the_buffer_once_reached(self):
+        for index in range(3):
+            self.redis_handler.add_message(
+                "process", create_chat_message(index, tokens=5)
+            )
+
+        self.assertFalse(self.redis_handler.trigger_buffer_warning("process", 20))
+        self.assertTrue(self.redis_handler.trigger_buffer_warning("process", 15))
+        # Only one caller triggers the warning each time the tokens are reached.
+        self.assertFalse(self.redis_handler.trigger_buffer_warning("process", 15))
+
+        self.assertEqual(self.redis_handler.get_conversation_buffer("process"), [])
+        self.assertEqual(self.get_buffer_tokens("process"), 0)
+        # The buffer stored on Supabase is not loaded again after clearing it.
+        self.assertTrue(self.redis_handler.is_buffer_loaded("process"))
+        self.assertEqual(len(self.redis_handler.get_conversation("process")), 3)
+
+    def test_updating_a_message_updates_the_buffer_tokens(self):
+        self.redis_handler.add_message("process", create_chat_message(0, tokens=5))
+        message_key, message = self.redis_handler.get_conversation_with_keys("process")[
+            0
+        ]
+        message.content = "Updated"
+
+        self.redis_handler.update_message("process", message_key, message, tokens=8)
+        self.assertEqual(self.get_buffer_tokens("process"), 8)
+        (chat_message,) = self.redis_handler.get_conversation_buffer("process")
+        self.assertEqual(chat_message.tokens, 8)
+        self.assertEqual(chat_message.message.content, "Updated")
+
+    def test_messages_are_stored_once_for_the_conversation_and_the_buffer(self):
+        chat_message = create_chat_message(0, tokens=5)
+        self.redis_handler.add_message("process", chat_message)
+
+        self.assertEqual(self.client.keys("message:*"), [b"message:message_0"])
+        for loaded_messages in [
+            self.redis_handler.get_conversation("process"),
+            self.redis_handler.get_conversation_buffer("process"),
+        ]:
+            (loaded_message,) = loaded_messages
+            self.assertEqual(loaded_message.message_id, chat_message.message_id)
+            self.assertEqual(loaded_message.timestamp, chat_message.timestamp)
+            self.assertEqual(loaded_message.tokens, 5)
+            self.assertEqual(loaded_message.to_string(), chat_message.to_string())
+
+    def test_messages_are_deleted_when_no_longer_referenced(self):
+        for index in range(2):
+            self.redis_handler.add_message(
+                "process", create_chat_message(index, tokens=5)
+            )
+
+        # Still in the buffer, only removed from the conversation.
+        self.redis_handler.delete_message("process", "message_0")
+        self.assertEqual(
+            [
+                chat_message.message_id
+                for chat_message in self.redis_handler.get_conversation("process")
+            ],
+            ["message_1"],
+        )
+        self.assertTrue(self.client.exists("message:message_0"))
+
+        self.redis_handler.clear_conversation_buffer("process")
+        self.assertFalse(self.client.exists("message:message_0"))
+        self.assertTrue(self.client.exists("message:message_1"))
+
+    def test_legacy_conversations_are_migrated(self):
+        legacy_message = UserMessage(name="user", content="Legacy")
+        for prefix in ["conversation", "conversation_buffer"]:
+            legacy_key = f"{prefix}:process:message:legacy"
+            self.client.hset(
+                legacy_key,
+                mapping={
+                    "data": json.dumps(
+                        {"type": "UserMessage", "data": legacy_message.to_json()}
+                    ),
+                    "timestamp": "2024-03-01T10:00:00+00:00",
+                    "tokens": 3,
+                },
+            )
+            self.client.zadd(f"{prefix}:process", {legacy_key: 1})
+
+        self.assertEqual(self.redis_handler.migrate_legacy_conversations(), 2)
+        self.assertEqual(self.redis_handler.migrate_legacy_conversations(), 0)
+        self.assertEqual(self.client.keys("*:message:*"), [])
+        for loaded_messages in [
+            self.redis_handler.get_conversation("process"),
+            self.redis_handler.get_conversation_buffer("process"),
+        ]:
+            (loaded_message,) = loaded_messages
+            self.assertEqual(loaded_message.message_id, "legacy")
+            self.assertEqual(loaded_message.tokens, 3)
+            self.assertEqual(loaded_message.message.content, "Legacy")
+
+
+if __name__ == "__main__":
+    unittest.main()
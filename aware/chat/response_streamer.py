@@ -0,0 +1,213 @@
+import asyncio
+import re
+from typing import Dict, List, Optional, Set, Union
+from openai.types.chat.chat_completion_chunk import ChoiceDelta
+
+from aware.chat.call_info import CallInfo
+from aware.chat.conversation_schemas import AssistantMessage
+from aware.chat.database.chat_async_redis_handler import ChatAsyncRedisHandler
+from aware.chat.database.chat_supabase_handler import ChatSupabaseHandler
+from aware.config.config import Config
+from aware.database.client_handlers import ClientHandlers
+from aware.utils.logger.process_logger import ProcessLogger
+
+
+class _StringArgumentDecoder:
+    """Decode the value of a string argument from the JSON arguments of a tool call while they are generated."""
+
+    escapes = {
+        '"': '"',
+        "\\": "\\",
+        "/": "/",
+        "b": "\b",
+        "f": "\f",
+        "n": "\n",
+        "r": "\r",
+        "t": "\t",
+    }
+
+    def __init__(self, argument: str):
+        self.value_start = re.compile(
+            r'[{,]\s*"' + re.escape(argument) + r'"\s*:\s*"'
+        )
+        self.arguments = ""
+        self.position: Optional[int] = None
+        self.finished = False
+
+    def feed(self, arguments: str) -> str:
+        """Add the new chunk of arguments and return the newly decoded text of the value."""
+        self.arguments += arguments
+        if self.finished:
+            return ""
+        if self.position is None:
+            match = self.value_start.search(self.arguments)
+            if match is None:
+                return ""
+            self.position = match.end()
+
+        text = ""
+        while self.position < len(self.arguments):
+            char = self.arguments[self.position]
+            if char == '"':
+                self.finished = True
+                break
+            if char != "\\":
+                text += char
+                self.position += 1
+                continue
+            # Escape sequence, wait for the next chunk when it is incomplete.
+            decoded, length = self._decode_escape(self.position)
+            if decoded is None:
+                break
+            text += decoded
+            self.position += length
+        return text
+
+    def _decode_escape(self, position: int):
+        escape = self.arguments[position + 1 : position + 2]
+        if not escape:
+            return None, 0
+        if escape != "u":
+            return self.escapes.get(escape, escape), 2
+        code = self._read_code_unit(position)
+        if code is None:
+            return None, 0
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate, it has to be combined with the low surrogate that follows.
+            if len(self.arguments) < position + 12:
+                return None, 0
+            low = self._read_code_unit(position + 6)
+            if low is not None and 0xDC00 <= low < 0xE000:
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
+
+    def _read_code_unit(self, position: int) -> Optional[int]:
+        digits = self.arguments[position + 2 : position + 6]
+        if len(digits) < 4 or self.arguments[position : position + 2] != "\\u":
+            return None
+        try:
+            return int(digits, 16)
+        except ValueError:
+            return None
+
+
+class ResponseStreamer:
+    """Persist the deltas of a streamed response and deliver the text addressed to the user while it is generated.
+
+    The text is the assistant content and, when the call sets stream_tool_argument, the value of that argument on the
+    matching tool calls. It is delivered by paragraphs so the user doesn't receive a message per token.
+    """
+
+    paragraph_separator = "\n\n"
+
+    def __init__(
+        self, call_info: CallInfo, redis_handler: ChatAsyncRedisHandler
+    ):
+        self.call_info = call_info
+        self.redis_handler = redis_handler
+        self.supabase_handler = ChatSupabaseHandler(
+            client=ClientHandlers().get_supabase_client(),
+            logger=ProcessLogger(
+                user_id=call_info.process_ids.user_id,
+                agent_name=call_info.name,
+                process_name="response_streamer",
+            ).get_logger("chat_supabase_handler"),
+        )
+        self.stream_tool_name: Optional[str] = None
+        self.stream_argument: Optional[str] = None
+        if call_info.stream_tool_argument:
+            self.stream_tool_name, self.stream_argument = (
+                call_info.stream_tool_argument
+            )
+        # Texts are keyed by None for the content and by index for the tool calls.
+        self.texts: Dict[Union[int, None], str] = {}
+        self.sent_lengths: Dict[Union[int, None], int] = {}
+        self.delivered_keys: Set[Union[int, None]] = set()
+        self.tool_call_names: Dict[int, str] = {}
+        self.decoders: Dict[int, _StringArgumentDecoder] = {}
+
+    async def on_delta(self, delta: ChoiceDelta):
+        call_id = self.call_info.call_id
+        if delta.content:
+            await self.redis_handler.add_response_delta(
+                call_id, {"type": "content", "content": delta.content}
+            )
+            await self._add_text(None, delta.content)
+
+        for tool_call_delta in delta.tool_calls or []:
+            function = tool_call_delta.function
+            name = (function.name if function else None) or ""
+            arguments = (function.arguments if function else None) or ""
+            await self.redis_handler.add_response_delta(
+                call_id,
+                {
+                    "type": "tool_call",
+                    "index": tool_call_delta.index,
+                    "id": tool_call_delta.id or "",
+                    "name": name,
+                    "arguments": arguments,
+                },
+            )
+            await self._on_tool_call_delta(tool_call_delta.index, name, arguments)
+
+    async def close(self, error: Optional[str] = None):
+        """Deliver the remaining text and mark the stream as finished, or as failed with the error."""
+        try:
+            if error is None:
+                for key in list(self.texts):
+                    await self._send_to_user(key, len(self.texts[key]))
+        finally:
+            await self.redis_handler.close_response_stream(
+                self.call_info.call_id,
+                expire_sec=Config().response_stream_expire_sec,
+                error=error,
+            )
+
+    def get_streamed_texts(self) -> List[str]:
+        """Get the full texts which were delivered, at least partially, to the user."""
+        return [self.texts[key] for key in self.texts if key in self.delivered_keys]
+
+    async def _on_tool_call_delta(self, index: int, name: str, arguments: str):
+        if self.stream_tool_name is None:
+            return
+        self.tool_call_names[index] = self.tool_call_names.get(index, "") + name
+        decoder = self.decoders.get(index)
+        if decoder is None:
+            if self.tool_call_names[index] != self.stream_tool_name:
+                return
+            # The name is sent on the first delta of the tool call, before its arguments.
+            decoder = _StringArgumentDecoder(self.stream_argument)
+            self.decoders[index] = decoder
+        text = decoder.feed(arguments)
+        if text:
+            await self._add_text(index, text)
+
+    async def _add_text(self, key: Union[int, None], text: str):
+        self.texts[key] = self.texts.get(key, "") + text
+        separator = self.paragraph_separator
+        end = self.texts[key].rfind(separator, self.sent_lengths.get(key, 0))
+        if end != -1:
+            await self._send_to_user(key, end, next_start=end + len(separator))
+
+    async def _send_to_user(
+        self, key: Union[int, None], end: int, next_start: Optional[int] = None
+    ):
+        start = self.sent_lengths.get(key, 0)
+        self.sent_lengths[key] = end if next_start is None else next_start
+        content = self.texts[key][start:end]
+        if not content.strip():
+            return
+        assistant_message = AssistantMessage(
+            name=self.call_info.name, content=content
+        )
+        # Supabase client is sync, run it on a thread to don't block the rest of the calls.
+        await asyncio.to_thread(
+            self.supabase_handler.send_message_to_user,
+            user_id=self.call_info.process_ids.user_id,
+            process_id=self.call_info.process_ids.process_id,
+            message_type=assistant_message.__class__.__name__,
+            role=assistant_message.role,
+            name=assistant_message.name,
+            content=assistant_message.content,
+        )
+        self.delivered_keys.add(key)
@@ -9,6 +9,7 @@ from aware.communication.primitives.database.primitives_supabase_handler import
 )
 from aware.communication.primitives.action import Action, ActionStatus
 from aware.communication.primitives.event import Event, EventStatus
+from aware.communication.primitives.interface.input import Input
 from aware.communication.primitives.request import Request, RequestStatus
 from aware.communication.primitives.topic import Topic
 from aware.database.client_handlers import ClientHandlers
@@ -24,6 +25,9 @@ class PrimitivesDatabaseHandler:
             client=ClientHandlers().get_supabase_client()
         )
 
+    def are_inputs_indexed(self, process_id: str) -> bool:
+        return self.redis_handler.are_inputs_indexed(process_id)
+
     def create_action(
         self, client_id: str, request_message: Dict[str, Any], priority: int
     ) -> DatabaseResult[Action]:
@@ -122,6 +126,9 @@ class PrimitivesDatabaseHandler:
         except Exception as e:
             return DatabaseResult(error=f"Error creating request: {e}")
 
+    def add_input(self, process_id: str, input: Input, protocol_id: str):
+        self.redis_handler.add_input(process_id, input, protocol_id)
+
     def delete_current_input(self, process_id: str):
         self.redis_handler.delete_current_input_metadata(process_id)
 
@@ -139,24 +146,39 @@ class PrimitivesDatabaseHandler:
     def get_event(self, event_id: str) -> Optional[Event]:
         return self.redis_handler.get_event(event_id)
 
-    def get_events(self, event_type_id: str) -> List[Event]:
-        return self.redis_handler.get_events(event_type_id)
+    def get_events(
+        self, event_type_id: str, limit: Optional[int] = None
+    ) -> List[Event]:
+        return self.redis_handler.get_events(event_type_id, limit)
 
-    def get_client_actions(self, client_id: str) -> List[Action]:
-        return self.redis_handler.get_client_actions(client_id)
+    def get_client_actions(
+        self, client_id: str, limit: Optional[int] = None
+    ) -> List[Action]:
+        return self.redis_handler.get_client_actions(client_id, limit)
 
-    def get_service_actions(self, service_id: str) -> List[Action]:
-        return self.redis_handler.get_service_actions(service_id)
+    def get_service_actions(
+        self, service_id: str, limit: Optional[int] = None
+    ) -> List[Action]:
+        return self.redis_handler.get_service_actions(service_id, limit)
 
-    def get_client_requests(self, client_id: str) -> List[Request]:
-        return self.redis_handler.get_client_requests(client_id)
+    def get_client_requests(
+        self, client_id: str, limit: Optional[int] = None
+    ) -> List[Request]:
+        return self.redis_handler.get_client_requests(client_id, limit)
 
-    def get_service_requests(self, service_id: str) -> List[Request]:
-        return self.redis_handler.get_service_requests(service_id)
+    def get_service_requests(
+        self, service_id: str, limit: Optional[int] = None
+    ) -> List[Request]:
+        return self.redis_handler.get_service_requests(service_id, limit)
 
     def get_topic(self, topic_id: str) -> Optional[Topic]:
         return self.redis_handler.get_topic(topic_id)
 
+    def pop_highest_priority_input(
+        self, process_id: str
+    ) -> Optional[CurrentInputMetadata]:
+        return self.redis_handler.pop_highest_priority_input(process_id)
+
     def send_action_feedback(self, action: Action, feedback: Dict[str, Any]):
         action.update_feedback(feedback)
         self.redis_handler.update_action(action, feedback)
@@ -169,6 +191,9 @@ class PrimitivesDatabaseHandler:
             process_id, current_input_metadata
         )
 
+    def set_inputs_indexed(self, process_id: str):
+        self.redis_handler.set_inputs_indexed(process_id)
+
     def set_event_completed(self, event: Event, details: str, success: bool):
         event.event_details = details
 
@@ -196,7 +221,7 @@ class PrimitivesDatabaseHandler:
         else:
             request.data.status = RequestStatus.FAILURE
 
-        self.redis_handler.delete_request(request.id)
+        self.redis_handler.delete_request(request)
         self.supabase_handler.set_request_completed(request)
 
     def update_action_status(self, action: Action, status: ActionStatus):
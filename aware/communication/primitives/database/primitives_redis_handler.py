@@ -1,60 +1,124 @@
+import json
 from redis import Redis
-from typing import Any, Dict, List, Optional
+from redis.client import Pipeline
+from typing import Any, Dict, List, Optional, Tuple
 
 from aware.communication.helpers.current_input_metadata import CurrentInputMetadata
 from aware.communication.primitives.action import Action
 from aware.communication.primitives.event import Event, EventType
+from aware.communication.primitives.interface.input import Input
 from aware.communication.primitives.request import Request
 from aware.communication.primitives.topic import Topic
-from aware.utils.helpers import convert_timestamp_to_epoch, get_current_date_iso8601
+from aware.utils.timestamps import (
+    convert_timestamp_to_epoch,
+    get_current_date_iso8601,
+)
+
+
+# Pop the highest priority input of the process and set it as current input, skipping the ones already deleted.
+POP_INPUT_SCRIPT = """
+while true do
+    local popped = redis.call("ZPOPMAX", KEYS[1])
+    if #popped == 0 then
+        return nil
+    end
+    local metadata = cjson.decode(popped[1])
+    local input_key = metadata["input_type"] .. ":" .. metadata["input_id"]
+    if redis.call("EXISTS", input_key) == 1 then
+        redis.call("SET", KEYS[2], popped[1])
+        redis.call("INCR", KEYS[3])
+        return popped[1]
+    end
+end
+"""
+# Get the primitives of a sorted set range, ordered by score, in a single round-trip.
+GET_PRIMITIVES_SCRIPT = """
+local ids = redis.call("ZRANGE", KEYS[1], ARGV[2], ARGV[3])
+local primitives = {}
+for start = 1, #ids, 1000 do
+    local keys = {}
+    for index = start, math.min(start + 999, #ids) do
+        keys[#keys + 1] = ARGV[1] .. ":" .. ids[index]
+    end
+    for _, primitive in ipairs(redis.call("MGET", unpack(keys))) do
+        primitives[#primitives + 1] = primitive
+    end
+end
+return primitives
+"""
 
 
 class PrimitivesRedisHandler:
     def __init__(self, client: Redis):
         self.client = client
+        self.pop_input_script = client.register_script(POP_INPUT_SCRIPT)
+        self.get_primitives_script = client.register_script(GET_PRIMITIVES_SCRIPT)
 
     def create_action(self, action: Action):
+        pipeline = self.client.pipeline()
         # Convert the action to JSON and store it
-        self.client.set(f"action:{action.id}", action.to_json())
+        pipeline.set(f"action:{action.id}", action.to_json())
         # Order the actions by priority
         service_order_key = f"action_service:{action.service_id}:actions:order"
-        self.client.zadd(
+        pipeline.zadd(
             service_order_key,
             {action.id: action.data.priority},
         )
         client_order_key = f"action_client:{action.client_id}:actions:order"
-        self.client.zadd(
+        pipeline.zadd(
             client_order_key,
             {action.id: action.data.priority},
         )
+        input_score = self._get_input_score(action.data.priority, action.timestamp)
+        pipeline.zadd(
+            f"process:{action.service_process_id}:inputs",
+            {self._get_input_member(action, action.service_id): input_score},
+        )
+        self._bump_communication_versions(pipeline, [action.client_process_id])
+        pipeline.execute()
 
     def create_event(self, event: Event):
+        score = self._get_input_score(event.priority, event.timestamp)
+        pipeline = self.client.pipeline()
         # Convert the event to JSON and store it
-        self.client.set(f"event:{event.id}", event.to_json())
+        pipeline.set(f"event:{event.id}", event.to_json())
         # Order the events by timestamp
         event_order_key = f"event_types:{event.event_type_id}:events:order"
-        self.client.zadd(
+        pipeline.zadd(
             event_order_key,
             {event.id: convert_timestamp_to_epoch(event.timestamp)},
         )
+        for process_id, subscriber_id in self._get_event_subscribers(event):
+            pipeline.zadd(
+                f"process:{process_id}:inputs",
+                {self._get_input_member(event, subscriber_id): score},
+            )
+        pipeline.execute()
 
     def create_event_type(self, event_type: EventType):
         event_type_key = f"event_type:{event_type.id}"
         self.client.set(event_type_key, event_type.to_json())
 
     def create_request(self, request: Request):
+        pipeline = self.client.pipeline()
         # Convert the request to JSON and store it
-        self.client.set(f"request:{request.id}", request.to_json())
+        pipeline.set(f"request:{request.id}", request.to_json())
 
         # Key for the sorted set to maintain the order of requests by timestamp
-        self.client.zadd(
+        pipeline.zadd(
             f"request_service:{request.service_id}:requests:order",
             {request.id: request.data.priority},
         )
-        self.client.zadd(
+        pipeline.zadd(
             f"request_client:{request.client_id}:requests:order",
             {request.id: request.data.priority},
         )
+        input_score = self._get_input_score(request.data.priority, request.timestamp)
+        pipeline.zadd(
+            f"process:{request.service_process_id}:inputs",
+            {self._get_input_member(request, request.service_id): input_score},
+        )
+        pipeline.execute()
 
     def create_topic(self, topic: Topic):
         self.client.set(
@@ -63,35 +127,65 @@ class PrimitivesRedisHandler:
         )
 
     def delete_current_input_metadata(self, process_id: str):
-        self.client.delete(f"current_input:{process_id}")
+        pipeline = self.client.pipeline()
+        pipeline.delete(f"current_input:{process_id}")
+        self._bump_communication_versions(pipeline, [process_id])
+        pipeline.execute()
 
     def delete_action(self, action: Action):
-        self.client.delete(f"action:{action.id}")
+        pipeline = self.client.pipeline()
+        pipeline.delete(f"action:{action.id}")
 
-        self.client.zrem(
+        pipeline.zrem(
             f"action_service:{action.service_id}:actions:order",
             action.id,
         )
-        self.client.zrem(
+        pipeline.zrem(
             f"action_client:{action.client_id}:actions:order",
             action.id,
         )
+        pipeline.zrem(
+            f"process:{action.service_process_id}:inputs",
+            self._get_input_member(action, action.service_id),
+        )
+        self._bump_communication_versions(
+            pipeline, [action.client_process_id, action.service_process_id]
+        )
+        pipeline.execute()
 
     def delete_event(self, event: Event):
-        self.client.delete(f"event:{event.id}")
-        self.client.zrem(
+        pipeline = self.client.pipeline()
+        pipeline.delete(f"event:{event.id}")
+        pipeline.zrem(
             f"event_types:{event.event_type_id}:events:order",
             event.id,
         )
+        # Once completed by a subscriber the event is not pending for the others.
+        for process_id, subscriber_id in self._get_event_subscribers(event):
+            pipeline.zrem(
+                f"process:{process_id}:inputs",
+                self._get_input_member(event, subscriber_id),
+            )
+        pipeline.execute()
 
     def delete_request(self, request: Request):
-        self.client.delete(f"request:{request.id}")
+        pipeline = self.client.pipeline()
+        pipeline.delete(f"request:{request.id}")
 
-        self.client.zrem(
+        pipeline.zrem(
             f"request_service:{request.service_id}:requests:order",
             request.id,
         )
-        self.client.zrem(f"request_client:{request.client_id}:requests:order")
+        pipeline.zrem(
+            f"request_client:{request.client_id}:requests:order",
+            request.id,
+        )
+        pipeline.zrem(
+            f"process:{request.service_process_id}:inputs",
+            self._get_input_member(request, request.service_id),
+        )
+        self._bump_communication_versions(pipeline, [request.service_process_id])
+        pipeline.execute()
 
     def get_current_input_metadata(
         self, process_id: str
@@ -101,62 +195,145 @@ class PrimitivesRedisHandler:
             return CurrentInputMetadata.from_json(metadata)
         return None
 
-    def get_client_actions(self, action_id: str):
-        return self.get_actions(f"action_client:{action_id}:actions:order")
-
-    def get_service_actions(self, action_id: str):
-        return self.get_actions(f"action_service:{action_id}:actions:order")
-
-    def get_client_requests(self, client_id: str):
-        return self.get_requests(f"request_client:{client_id}:requests:order")
-
-    def get_service_requests(self, service_id: str):
-        return self.get_requests(f"request_service:{service_id}:requests:order")
-
-    def get_actions(self, action_order_key: str):
-        action_ids = self.client.zrange(action_order_key, 0, -1)
-
-        actions = []
-        for action_id_bytes in action_ids:
-            action_id = action_id_bytes.decode("utf-8")
-
-            action = self.get_action(action_id)
-            if action is not None:
-                actions.append(action)
-
-        return actions
+    def get_client_actions(
+        self, client_id: str, limit: Optional[int] = None
+    ) -> List[Action]:
+        return self.get_actions(f"action_client:{client_id}:actions:order", limit)
+
+    def get_service_actions(
+        self, service_id: str, limit: Optional[int] = None
+    ) -> List[Action]:
+        return self.get_actions(f"action_service:{service_id}:actions:order", limit)
+
+    def get_client_requests(
+        self, client_id: str, limit: Optional[int] = None
+    ) -> List[Request]:
+        return self.get_requests(f"request_client:{client_id}:requests:order", limit)
+
+    def get_service_requests(
+        self, service_id: str, limit: Optional[int] = None
+    ) -> List[Request]:
+        return self.get_requests(
+            f"request_service:{service_id}:requests:order", limit
+        )
 
-    # TODO: Fix me?
-    def get_events(self, event_type_id: str) -> List[Event]:
-        # Retrieve all event IDs from the sorted set, ordered by timestamp
+    def get_actions(
+        self, action_order_key: str, limit: Optional[int] = None
+    ) -> List[Action]:
+        """Get the actions ordered by priority, only the limit with highest priority if set."""
+        return [
+            Action.from_json(data)
+            for data in self._get_primitives("action", action_order_key, limit)
+        ]
+
+    def get_events(
+        self, event_type_id: str, limit: Optional[int] = None
+    ) -> List[Event]:
+        """Get the events ordered by timestamp, only the limit newest if set."""
         events_order_key = f"event_types:{event_type_id}:events:order"
-        events_ids = self.client.zrange(events_order_key, 0, -1)
+        return [
+            Event.from_json(data)
+            for data in self._get_primitives("event", events_order_key, limit)
+        ]
+
+    def get_requests(
+        self, request_order_key: str, limit: Optional[int] = None
+    ) -> List[Request]:
+        """Get the requests ordered by priority, only the limit with highest priority if set."""
+        return [
+            Request.from_json(data)
+            for data in self._get_primitives("request", request_order_key, limit)
+        ]
+
+    def _get_primitives(
+        self, key_prefix: str, order_key: str, limit: Optional[int]
+    ) -> List[bytes]:
+        """Get the data of the primitives referenced by the sorted set, skipping the ones already deleted.
+
+        With a limit only the ones with the highest scores are fetched, still in ascending order.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        start = -limit if limit is not None else 0
+        primitives = self.get_primitives_script(
+            keys=[order_key], args=[key_prefix, start, -1]
+        )
+        return [data for data in primitives if data]
 
-        events = []
-        for event_id_bytes in events_ids:
-            event_id = event_id_bytes.decode("utf-8")
+    def add_input(self, process_id: str, input: Input, protocol_id: str):
+        """Add a pending input to the index of the process, used to index the inputs stored before it existed."""
+        input_score = self._get_input_score(input.priority, input.timestamp)
+        self.client.zadd(
+            f"process:{process_id}:inputs",
+            {self._get_input_member(input, protocol_id): input_score},
+        )
 
-            # Fetch the event data for each event ID and deserialize it
-            event = self.get_event(event_id)
-            if event is not None:
-                events.append(event)
+    def pop_highest_priority_input(
+        self, process_id: str
+    ) -> Optional[CurrentInputMetadata]:
+        """Set the pending input with the highest priority (the oldest one on ties) as current input."""
+        metadata = self.pop_input_script(
+            keys=[
+                f"process:{process_id}:inputs",
+                f"current_input:{process_id}",
+                f"process:{process_id}:communication:version",
+            ]
+        )
+        if metadata:
+            return CurrentInputMetadata.from_json(metadata)
+        return None
 
-        return events
+    def are_inputs_indexed(self, process_id: str) -> bool:
+        return bool(self.client.exists(f"process:{process_id}:inputs:indexed"))
 
-    def get_requests(self, request_order_key: str):
-        # Retrieve all request IDs from the sorted set, ordered by timestamp
-        request_ids = self.client.zrange(request_order_key, 0, -1)
+    def set_inputs_indexed(self, process_id: str):
+        self.client.set(f"process:{process_id}:inputs:indexed", 1)
 
-        requests = []
-        for request_id_bytes in request_ids:
-            request_id = request_id_bytes.decode("utf-8")
+    def _bump_communication_versions(
+        self, pipeline: Pipeline, process_ids: List[str]
+    ):
+        # Outdate the communication snapshots of the processes that show the primitive on their prompt.
+        for process_id in set(process_ids):
+            pipeline.incr(f"process:{process_id}:communication:version")
+
+    def _get_event_subscribers(self, event: Event) -> List[Tuple[str, str]]:
+        return self._get_subscribers(
+            "event_subscriber",
+            f"event_type:{event.event_type_id}:event_subscriber_ids",
+        )
 
-            # Fetch the request data for each request ID and deserialize it
-            request = self.get_request(request_id)
-            if request is not None:
-                requests.append(request)
+    def _get_topic_subscribers(self, topic_id: str) -> List[Tuple[str, str]]:
+        return self._get_subscribers(
+            "topic_subscriber", f"topic:{topic_id}:subscriber_ids"
+        )
 
-        return requests
+    def _get_subscribers(
+        self, protocol_type: str, index_key: str
+    ) -> List[Tuple[str, str]]:
+        """Get the process and id of the indexed subscribers, without building the protocols."""
+        subscriber_ids = self.client.smembers(index_key)
+        if not subscriber_ids:
+            return []
+        subscriber_keys = [
+            f"{protocol_type}:{subscriber_id.decode()}"
+            for subscriber_id in subscriber_ids
+        ]
+        subscribers = []
+        for subscriber in self.client.mget(subscriber_keys):
+            if subscriber:
+                data = json.loads(subscriber)
+                subscribers.append((data["process_id"], data["id"]))
+        return subscribers
+
+    def _get_input_member(self, input: Input, protocol_id: str) -> str:
+        # The member is the metadata set as current input when it is popped.
+        return CurrentInputMetadata(
+            input_type=input.get_type(), input_id=input.id, protocol_id=protocol_id
+        ).to_json()
+
+    def _get_input_score(self, priority: int, timestamp: str) -> float:
+        # Higher priority first, the fractional part orders the inputs with the same priority by arrival.
+        return priority + 1 - convert_timestamp_to_epoch(timestamp) / 1e10
 
     def get_action(self, action_id: str) -> Optional[Action]:
         data = self.client.get(f"action:{action_id}")
@@ -185,23 +362,40 @@ class PrimitivesRedisHandler:
     def set_current_input_metadata(
         self, process_id: str, current_input_metadata: CurrentInputMetadata
     ):
-        self.client.set(
+        pipeline = self.client.pipeline()
+        pipeline.set(
             f"current_input:{process_id}",
             current_input_metadata.to_json(),
         )
+        self._bump_communication_versions(pipeline, [process_id])
+        pipeline.execute()
 
     def update_action(self, action: Action):
-        self.client.set(f"action:{action.id}", action.to_json())
+        pipeline = self.client.pipeline()
+        pipeline.set(f"action:{action.id}", action.to_json())
+        self._bump_communication_versions(
+            pipeline, [action.client_process_id, action.service_process_id]
+        )
+        pipeline.execute()
 
     def update_topic(self, topic_id: str, message: Dict[str, Any]):
         topic = self.get_topic(topic_id)
         topic.message = message
         topic.timestamp = get_current_date_iso8601()
 
-        self.client.set(
+        pipeline = self.client.pipeline()
+        pipeline.set(
             f"topic:{topic_id}",
             topic.to_json(),
         )
+        subscriber_processes = [
+            process_id for process_id, _ in self._get_topic_subscribers(topic_id)
+        ]
+        self._bump_communication_versions(pipeline, subscriber_processes)
+        pipeline.execute()
 
     def update_request(self, request: Request):
-        self.client.set(f"request:{request.id}", request.to_json())
+        pipeline = self.client.pipeline()
+        pipeline.set(f"request:{request.id}", request.to_json())
+        self._bump_communication_versions(pipeline, [request.service_process_id])
+        pipeline.execute()
@@ -7,6 +7,7 @@ from aware.communication.primitives.database.primitives_database_handler import
 )
 from aware.communication.primitives.interface.function_detail import FunctionDetail
 from aware.communication.protocols.interface.protocol import Protocol
+from aware.config.config import Config
 
 
 @dataclass
@@ -67,7 +68,10 @@ class ActionClient(Protocol):
         return ActionClient(**data)
 
     def get_action_feedback(self) -> str:
-        actions = self.primitives_database_handler.get_client_actions(self.id)
+        # Only the actions with highest priority, to keep the prompt bounded.
+        actions = self.primitives_database_handler.get_client_actions(
+            self.id, limit=Config().max_action_feedbacks
+        )
         return "\n".join([action.feedback_to_string() for action in actions])
 
     def create_action(self, request_message: Dict[str, Any], priority: int):
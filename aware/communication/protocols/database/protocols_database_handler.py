@@ -1,7 +1,6 @@
 from typing import Any, Dict, List, Optional, Tuple
 
 from aware.agent.agent_communication import AgentCommunication
-from aware.communication.helpers.current_input_metadata import CurrentInputMetadata
 from aware.communication.primitives.database.primitives_database_handler import (
     PrimitivesDatabaseHandler,
 )
@@ -9,6 +8,7 @@ from aware.communication.primitives.interface.input import Input
 from aware.communication.primitives import Action, Request, Event
 from aware.communication.protocols.interface.input_protocol import InputProtocol
 from aware.communication.protocols.database.protocols_redis_handler import (
+    PROTOCOL_TYPES,
     ProtocolsRedisHandler,
 )
 from aware.communication.protocols.database.protocols_supabase_handler import (
@@ -28,6 +28,20 @@ from aware.communication.protocols.action_service import ActionServiceData
 from aware.database.client_handlers import ClientHandlers
 from aware.utils.logger.file_logger import FileLogger
 
+# Input type: (class, type of the protocol that receives it).
+INPUT_TYPES = {
+    "request": (Request, "request_service"),
+    "action": (Action, "action_service"),
+    "event": (Event, "event_subscriber"),
+}
+# Protocols of the agent communication, by AgentCommunication argument.
+COMMUNICATION_PROTOCOL_TYPES = {
+    "topic_publishers": "topic_publisher",
+    "topic_subscribers": "topic_subscriber",
+    "action_clients": "action_client",
+    "request_clients": "request_client",
+}
+
 
 class ProtocolsDatabaseHandler:
     def __init__(self):
@@ -44,6 +58,11 @@ class ProtocolsDatabaseHandler:
         self.primitives_database_handler.delete_current_input(process_id)
 
     def get_agent_communication(self, process_id: str) -> AgentCommunication:
+        """Get the communication from its snapshot, only rebuilt when a protocol, the input, a topic or an action changed."""
+        version, snapshot = self.redis_handler.get_communication_snapshot(process_id)
+        if snapshot is not None:
+            return self._from_snapshot(snapshot)
+
         current_input, input_protocol = self.get_current_input(process_id)
         if current_input is None:
             raise Exception(
@@ -51,15 +70,59 @@ class ProtocolsDatabaseHandler:
             )
 
         input_protocol.add_input(current_input)
+        protocols = self.redis_handler.get_process_protocols(
+            process_id, list(COMMUNICATION_PROTOCOL_TYPES.values())
+        )
         agent_communication = AgentCommunication(
-            topic_publishers=self.get_topic_publishers(process_id),
-            topic_subscribers=self.get_topic_subscribers(process_id),
-            action_clients=self.get_action_clients(process_id),
-            request_clients=self.get_request_clients(process_id),
+            **{
+                argument: protocols[protocol_type]
+                for argument, protocol_type in COMMUNICATION_PROTOCOL_TYPES.items()
+            },
             input_protocol=input_protocol,
         )
+        self.redis_handler.set_communication_snapshot(
+            process_id, version, self._to_snapshot(agent_communication)
+        )
         return agent_communication
 
+    def _to_snapshot(self, agent_communication: AgentCommunication) -> Dict[str, Any]:
+        input_protocol = agent_communication.input_protocol
+        snapshot = {
+            argument: {
+                name: protocol.to_json()
+                for name, protocol in getattr(agent_communication, argument).items()
+            }
+            for argument in COMMUNICATION_PROTOCOL_TYPES
+        }
+        snapshot.update(
+            {
+                "input_type": input_protocol.get_input().get_type(),
+                "input": input_protocol.get_input().to_json(),
+                "input_protocol": input_protocol.to_json(),
+                "prompt_kwargs": agent_communication.to_prompt_kwargs(),
+            }
+        )
+        return snapshot
+
+    def _from_snapshot(self, snapshot: Dict[str, Any]) -> AgentCommunication:
+        protocols: Dict[str, Dict[str, Any]] = {}
+        for argument, protocol_type in COMMUNICATION_PROTOCOL_TYPES.items():
+            protocol_class, _ = PROTOCOL_TYPES[protocol_type]
+            protocols[argument] = {
+                name: protocol_class.from_json(data)
+                for name, data in snapshot[argument].items()
+            }
+
+        input_class, input_protocol_type = INPUT_TYPES[snapshot["input_type"]]
+        input_protocol_class, _ = PROTOCOL_TYPES[input_protocol_type]
+        input_protocol = input_protocol_class.from_json(snapshot["input_protocol"])
+        input_protocol.add_input(input_class.from_json(snapshot["input"]))
+        return AgentCommunication(
+            **protocols,
+            input_protocol=input_protocol,
+            prompt_kwargs=snapshot["prompt_kwargs"],
+        )
+
     def get_current_input(
         self, process_id: str
     ) -> Tuple[Optional[Input], Optional[InputProtocol]]:
@@ -101,40 +164,28 @@ class ProtocolsDatabaseHandler:
         return current_input_metadata is not None
 
     def update_highest_prio_input(self, process_id: str) -> bool:
-        highest_prio_input: Optional[Input] = None
-        current_input_protocol: Optional[InputProtocol] = None
+        """Set the pending input with the highest priority as current input, popped from the input index of the process."""
+        if not self.primitives_database_handler.are_inputs_indexed(process_id):
+            self._index_inputs(process_id)
+            self.primitives_database_handler.set_inputs_indexed(process_id)
+
+        current_input_metadata = (
+            self.primitives_database_handler.pop_highest_priority_input(process_id)
+        )
+        return current_input_metadata is not None
 
-        # Consolidate all services and subscribers into a single iterable
-        # TODO: How to get highest priority input without creating all the protocols as they require to have input?
+    def _index_inputs(self, process_id: str):
+        """Index the inputs that were pending before the index existed, only done once per process."""
         all_input_protocols: List[InputProtocol] = [
             *self.get_request_services(process_id).values(),
             *self.get_action_services(process_id).values(),
             *self.get_event_subscribers(process_id).values(),
         ]
-
-        # Iterate over all input sources to find the one with the highest priority
         for input_protocol in all_input_protocols:
-            new_input = input_protocol.get_highest_priority_input()
-            if new_input and (
-                highest_prio_input is None
-                or new_input.priority > highest_prio_input.priority
-            ):
-                highest_prio_input = new_input
-                current_input_protocol = input_protocol
-
-        if highest_prio_input is None:
-            return False
-
-        # Update the current input metadata
-        current_input_metadata = CurrentInputMetadata(
-            input_type=highest_prio_input.get_type(),
-            input_id=highest_prio_input.id,
-            protocol_id=current_input_protocol.id,
-        )
-        self.primitives_database_handler.set_current_input_metadata(
-            process_id, current_input_metadata
-        )
-        return True
+            for input in input_protocol.get_inputs():
+                self.primitives_database_handler.add_input(
+                    process_id, input, input_protocol.id
+                )
 
     # TODO: Create event subscriber.
     def create_action_client(self, user_id: str, process_id: str, action_name: str):
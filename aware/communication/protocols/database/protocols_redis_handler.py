@@ -1,5 +1,6 @@
+import json
 from redis import Redis
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 from aware.communication.protocols import (
     EventSubscriber,
@@ -11,254 +12,305 @@ from aware.communication.protocols import (
     ActionClient,
     ActionService,
 )
+from aware.communication.protocols.interface.protocol import Protocol
+from aware.config.config import Config
+
+# Protocol type: (class, name of the protocol in its process).
+PROTOCOL_TYPES: Dict[str, Tuple[Type[Protocol], Callable[[Any], str]]] = {
+    "event_subscriber": (EventSubscriber, lambda protocol: protocol.event_name),
+    "event_publisher": (EventPublisher, lambda protocol: protocol.event_name),
+    "action_client": (ActionClient, lambda protocol: protocol.service_name),
+    "action_service": (ActionService, lambda protocol: protocol.data.service_name),
+    "request_client": (RequestClient, lambda protocol: protocol.service_name),
+    "request_service": (RequestService, lambda protocol: protocol.data.service_name),
+    "topic_publisher": (TopicPublisher, lambda protocol: protocol.topic_name),
+    "topic_subscriber": (TopicSubscriber, lambda protocol: protocol.topic_name),
+}
+# Sets of JSON protocols used before the ids index, by protocol type.
+LEGACY_PROCESS_SETS = {
+    "event_subscriber": "event_subscribers",
+    "event_publisher": "event_publishers",
+    "action_client": "action_clients",
+    "action_service": "action_services",
+    "request_client": "request_clients",
+    "request_service": "request_service",
+    "topic_publisher": "topic_publishers",
+    "topic_subscriber": "topic_subscribers",
+}
 
 
 class ProtocolsRedisHandler:
+    """Each protocol is stored once under its own key, the process keeps a hash of name -> id per protocol type."""
+
     def __init__(self, client: Redis):
         self.client = client
 
+    def _create_protocol(
+        self,
+        protocol_type: str,
+        protocol: Protocol,
+        index_keys: Optional[List[str]] = None,
+    ):
+        """Store the protocol and index its id, index_keys are extra sets of ids the protocol belongs to."""
+        _, get_name = PROTOCOL_TYPES[protocol_type]
+        pipeline = self.client.pipeline()
+        pipeline.set(f"{protocol_type}:{protocol.id}", protocol.to_json())
+        pipeline.hset(
+            f"process:{protocol.process_id}:{protocol_type}_ids",
+            get_name(protocol),
+            protocol.id,
+        )
+        for index_key in index_keys or []:
+            pipeline.sadd(index_key, protocol.id)
+        # Invalidate the process cached by the workers, as its protocols changed.
+        pipeline.incr(f"process:{protocol.process_id}:version")
+        pipeline.incr(f"process:{protocol.process_id}:communication:version")
+        pipeline.execute()
+
     def create_event_subscriber(
         self,
         event_subscriber: EventSubscriber,
     ):
-        self.client.sadd(
-            f"process:{event_subscriber.process_id}:event_subscribers",
-            event_subscriber.to_json(),
-        )
-        self.client.sadd(
-            f"event_type:{event_subscriber.event_type_id}:event_subscribers",
-            event_subscriber.to_json(),
-        )
-        self.client.set(
-            f"event_subscriber:{event_subscriber.id}",
-            event_subscriber.to_json(),
+        self._create_protocol(
+            "event_subscriber",
+            event_subscriber,
+            index_keys=self._get_index_keys(event_subscriber),
         )
 
     def create_event_publisher(
         self,
         event_publisher: EventPublisher,
     ):
-        self.client.sadd(
-            f"process:{event_publisher.process_id}:event_publishers",
-            event_publisher.to_json(),
-        )
-        self.client.set(
-            f"event_publisher:{event_publisher.id}",
-            event_publisher.to_json(),
-        )
+        self._create_protocol("event_publisher", event_publisher)
 
     def create_action_client(
         self,
         action_client: ActionClient,
     ):
-        self.client.sadd(
-            f"process:{action_client.process_id}:action_clients",
-            action_client.to_json(),
-        )
-        self.client.set(
-            f"action_client:{action_client.id}",
-            action_client.to_json(),
-        )
+        self._create_protocol("action_client", action_client)
 
     def create_action_service(
         self,
         action_service: ActionService,
     ):
-        self.client.sadd(
-            f"process:{action_service.process_id}:action_services",
-            action_service.to_json(),
-        )
-        self.client.set(
-            f"action_service:{action_service.id}",
-            action_service.to_json(),
-        )
+        self._create_protocol("action_service", action_service)
 
     def create_request_client(
         self,
         request_client: RequestClient,
     ):
-        self.client.sadd(
-            f"process:{request_client.process_id}:request_clients",
-            request_client.to_json(),
-        )
-        self.client.set(
-            f"request_client:{request_client.id}",
-            request_client.to_json(),
-        )
+        self._create_protocol("request_client", request_client)
 
     def create_request_service(self, request_service: RequestService):
-        self.client.sadd(
-            f"process:{request_service.process_id}:request_service",
-            request_service.to_json(),
-        )
-        self.client.set(
-            f"request_service:{request_service.id}",
-            request_service.to_json(),
-        )
+        self._create_protocol("request_service", request_service)
 
     def create_topic_publisher(self, topic_publisher: TopicPublisher):
-        self.client.sadd(
-            f"process:{topic_publisher.process_id}:topic_publishers",
-            topic_publisher.to_json(),
-        )
-        self.client.set(
-            f"topic_publisher:{topic_publisher.id}",
-            topic_publisher.to_json(),
-        )
+        self._create_protocol("topic_publisher", topic_publisher)
 
     def create_topic_subscriber(self, topic_subscriber: TopicSubscriber):
-        self.client.sadd(
-            f"process:{topic_subscriber.process_id}:topic_subscribers",
-            topic_subscriber.to_json(),
+        self._create_protocol(
+            "topic_subscriber",
+            topic_subscriber,
+            index_keys=self._get_index_keys(topic_subscriber),
+        )
+
+    def get_process_protocols(
+        self, process_id: str, protocol_types: List[str]
+    ) -> Dict[str, Dict[str, Protocol]]:
+        """Get the protocols of the process by type and name, in two round-trips regardless of their number."""
+        pipeline = self.client.pipeline(transaction=False)
+        for protocol_type in protocol_types:
+            pipeline.hgetall(f"process:{process_id}:{protocol_type}_ids")
+        protocol_ids = pipeline.execute()
+
+        keys = [
+            f"{protocol_type}:{protocol_id.decode()}"
+            for protocol_type, ids in zip(protocol_types, protocol_ids)
+            for protocol_id in ids.values()
+        ]
+        protocols_data = iter(self.client.mget(keys) if keys else [])
+
+        protocols: Dict[str, Dict[str, Protocol]] = {}
+        for protocol_type, ids in zip(protocol_types, protocol_ids):
+            protocol_class, _ = PROTOCOL_TYPES[protocol_type]
+            protocols[protocol_type] = {}
+            for name in ids:
+                data = next(protocols_data)
+                if data:
+                    protocol = protocol_class.from_json(data)
+                    protocols[protocol_type][name.decode()] = protocol
+        return protocols
+
+    def get_communication_snapshot(
+        self, process_id: str
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Get the communication version of the process and its snapshot, None when the snapshot is outdated."""
+        version, snapshot = self.client.mget(
+            f"process:{process_id}:communication:version",
+            f"process:{process_id}:communication",
         )
+        version = int(version or 0)
+        if snapshot:
+            snapshot_data = json.loads(snapshot)
+            if snapshot_data["version"] == version:
+                return version, snapshot_data
+        return version, None
+
+    def set_communication_snapshot(
+        self, process_id: str, version: int, snapshot: Dict[str, Any]
+    ):
+        """Store the snapshot built from the state at version, a later write makes it outdated."""
         self.client.set(
-            f"topic_subscriber:{topic_subscriber.id}",
-            topic_subscriber.to_json(),
+            f"process:{process_id}:communication",
+            json.dumps({**snapshot, "version": version}),
+            ex=Config().communication_snapshot_expire_sec,
         )
-        self.client.sadd(
-            f"topic:{topic_subscriber.topic_id}:subscribers",
-            topic_subscriber.to_json(),
+
+    def _get_protocol(self, protocol_type: str, protocol_id: str) -> Optional[Any]:
+        data = self.client.get(f"{protocol_type}:{protocol_id}")
+        if data:
+            protocol_class, _ = PROTOCOL_TYPES[protocol_type]
+            return protocol_class.from_json(data)
+        return None
+
+    def _get_protocols(self, process_id: str, protocol_type: str) -> Dict[str, Any]:
+        return self.get_process_protocols(process_id, [protocol_type])[protocol_type]
+
+    def _get_indexed_protocols(self, protocol_type: str, index_key: str) -> List[Any]:
+        protocol_ids = self.client.smembers(index_key)
+        if not protocol_ids:
+            return []
+        protocol_class, _ = PROTOCOL_TYPES[protocol_type]
+        protocols_data = self.client.mget(
+            [f"{protocol_type}:{protocol_id.decode()}" for protocol_id in protocol_ids]
         )
+        return [protocol_class.from_json(data) for data in protocols_data if data]
 
     def get_event_subscribers_from_type(
         self, event_type_id: str
     ) -> Dict[str, EventSubscriber]:
-        event_subscribers = {}
-        for event_subscriber in self.client.smembers(
-            f"event_type:{event_type_id}:event_subscribers"
-        ):
-            event_subscriber = EventSubscriber.from_json(event_subscriber)
-            event_subscribers[event_subscriber.process_id] = event_subscriber
-        return event_subscribers
+        event_subscribers = self._get_indexed_protocols(
+            "event_subscriber", f"event_type:{event_type_id}:event_subscriber_ids"
+        )
+        return {
+            event_subscriber.process_id: event_subscriber
+            for event_subscriber in event_subscribers
+        }
 
     def get_event_subscriber(
         self, event_subscriber_id: str
     ) -> Optional[EventSubscriber]:
-        data = self.client.get(f"event_subscriber:{event_subscriber_id}")
-        if data:
-            return EventSubscriber.from_json(data)
-        return None
+        return self._get_protocol("event_subscriber", event_subscriber_id)
 
     def get_event_subscribers(self, process_id: str) -> Dict[str, EventSubscriber]:
-        event_subscribers = {}
-        for event_subscriber in self.client.smembers(
-            f"process:{process_id}:event_subscribers"
-        ):
-            event_subscriber = EventSubscriber.from_json(event_subscriber)
-            event_subscribers[event_subscriber.event_name] = event_subscriber
-        return event_subscribers
+        return self._get_protocols(process_id, "event_subscriber")
 
     def get_event_publisher(
         self, event_publisher_id: str
     ) -> Optional[EventPublisher]:
-        data = self.client.get(f"event_publisher:{event_publisher_id}")
-        if data:
-            return EventPublisher.from_json(data)
-        return None
+        return self._get_protocol("event_publisher", event_publisher_id)
 
     def get_action_client(self, action_client_id: str) -> Optional[ActionClient]:
-        data = self.client.get(f"action_client:{action_client_id}")
-        if data:
-            return ActionClient.from_json(data)
-        return None
+        return self._get_protocol("action_client", action_client_id)
 
     def get_action_clients(self, process_id: str) -> Dict[str, ActionClient]:
-        action_clients = {}
-        for action_client in self.client.smembers(
-            f"process:{process_id}:action_clients"
-        ):
-            action_client = ActionClient.from_json(action_client)
-            action_clients[action_client.service_name] = action_client
-        return action_clients
+        return self._get_protocols(process_id, "action_client")
 
     def get_action_service(self, action_service_id: str) -> Optional[ActionService]:
-        data = self.client.get(f"action_service:{action_service_id}")
-        if data:
-            return ActionService.from_json(data)
-        return None
+        return self._get_protocol("action_service", action_service_id)
 
     def get_action_services(self, process_id: str) -> Dict[str, ActionService]:
-        action_services = {}
-        for action_service in self.client.smembers(
-            f"process:{process_id}:action_services"
-        ):
-            action_service = ActionService.from_json(action_service)
-            action_services[action_service.service_name] = action_service
-        return action_services
+        return self._get_protocols(process_id, "action_service")
 
     def get_request_client(self, request_client_id: str) -> Optional[RequestClient]:
-        data = self.client.get(f"request_client:{request_client_id}")
-        if data:
-            return RequestClient.from_json(data)
-        return None
+        return self._get_protocol("request_client", request_client_id)
 
     def get_request_clients(
         self,
         process_id: str,
     ) -> Dict[str, RequestClient]:
-        request_clients = {}
-        for request_client in self.client.smembers(
-            f"process:{process_id}:request_clients"
-        ):
-            request_client = RequestClient.from_json(request_client)
-            request_clients[request_client.service_name] = request_client
-        return request_clients
+        return self._get_protocols(process_id, "request_client")
 
     def get_request_service(self, request_service_id: str) -> Optional[RequestService]:
-        data = self.client.get(f"request_service:{request_service_id}")
-        if data:
-            return RequestService.from_json(data)
-        return None
+        return self._get_protocol("request_service", request_service_id)
 
     def get_request_services(
         self,
         process_id: str,
     ) -> Dict[str, RequestService]:
-        request_services = {}
-        for request_service in self.client.smembers(
-            f"process:{process_id}:request_service"
-        ):
-            request_service = RequestService.from_json(request_service)
-            request_services[request_service.data.service_name] = request_service
-        return request_services
+        return self._get_protocols(process_id, "request_service")
 
     def get_topic_publisher(self, topic_publisher_id: str) -> Optional[TopicPublisher]:
-        data = self.client.get(f"topic_publisher:{topic_publisher_id}")
-        if data:
-            return TopicPublisher.from_json(data)
-        return None
+        return self._get_protocol("topic_publisher", topic_publisher_id)
 
     def get_topic_publishers(self, process_id: str) -> Dict[str, TopicPublisher]:
-        topic_publishers = {}
-        for topic_publisher in self.client.smembers(
-            f"process:{process_id}:topic_publishers"
-        ):
-            topic_publisher = TopicPublisher.from_json(topic_publisher)
-            topic_publishers[topic_publisher.topic_name] = topic_publisher
-        return topic_publishers
+        return self._get_protocols(process_id, "topic_publisher")
 
     def get_topic_subscriber(
         self, topic_subscriber_id: str
     ) -> Optional[TopicSubscriber]:
-        data = self.client.get(f"topic_subscriber:{topic_subscriber_id}")
-        if data:
-            return TopicSubscriber.from_json(data)
-        return None
+        return self._get_protocol("topic_subscriber", topic_subscriber_id)
 
     def get_topic_subscribers(self, process_id: str) -> Dict[str, TopicSubscriber]:
-        topic_subscribers = {}
-        for topic_subscriber in self.client.smembers(
-            f"process:{process_id}:topic_subscribers"
-        ):
-            topic_subscriber = TopicSubscriber.from_json(topic_subscriber)
-            topic_subscribers[topic_subscriber.topic_name] = topic_subscriber
-        return topic_subscribers
+        return self._get_protocols(process_id, "topic_subscriber")
 
     def get_topic_subscribers_from_topic(
         self, topic_id: str
     ) -> Dict[str, TopicSubscriber]:
-        topic_subscribers = {}
-        for topic_subscriber in self.client.smembers(f"topic:{topic_id}:subscribers"):
-            topic_subscriber = TopicSubscriber.from_json(topic_subscriber)
-            topic_subscribers[topic_subscriber.process_id] = topic_subscriber
-        return topic_subscribers
+        topic_subscribers = self._get_indexed_protocols(
+            "topic_subscriber", f"topic:{topic_id}:subscriber_ids"
+        )
+        return {
+            topic_subscriber.process_id: topic_subscriber
+            for topic_subscriber in topic_subscribers
+        }
+
+    def migrate_legacy_protocols(self) -> int:
+        """Index the protocols stored as JSON inside the process sets, returns the number migrated.
+
+        The legacy JSON can be older than the protocol stored under its id, so it is only written when missing.
+        """
+        num_migrated = 0
+        for protocol_type, set_name in LEGACY_PROCESS_SETS.items():
+            protocol_class, get_name = PROTOCOL_TYPES[protocol_type]
+            for legacy_key in self.client.scan_iter(match=f"process:*:{set_name}"):
+                pipeline = self.client.pipeline()
+                for data in self.client.smembers(legacy_key):
+                    protocol = protocol_class.from_json(data)
+                    pipeline.set(
+                        f"{protocol_type}:{protocol.id}", protocol.to_json(), nx=True
+                    )
+                    pipeline.hset(
+                        f"process:{protocol.process_id}:{protocol_type}_ids",
+                        get_name(protocol),
+                        protocol.id,
+                    )
+                    for index_key in self._get_index_keys(protocol):
+                        pipeline.sadd(index_key, protocol.id)
+                    num_migrated += 1
+                pipeline.delete(legacy_key)
+                pipeline.execute()
+        for legacy_pattern in ["event_type:*:event_subscribers", "topic:*:subscribers"]:
+            for legacy_key in self.client.scan_iter(match=legacy_pattern):
+                self.client.delete(legacy_key)
+        return num_migrated
+
+    def _get_index_keys(self, protocol: Protocol) -> List[str]:
+        if isinstance(protocol, EventSubscriber):
+            return [f"event_type:{protocol.event_type_id}:event_subscriber_ids"]
+        if isinstance(protocol, TopicSubscriber):
+            return [f"topic:{protocol.topic_id}:subscriber_ids"]
+        return []
+
+
+def main():
+    """Migrate the protocols stored with the previous layout."""
+    from aware.database.client_handlers import ClientHandlers
+
+    redis_handler = ProtocolsRedisHandler(ClientHandlers().get_redis_client())
+    num_migrated = redis_handler.migrate_legacy_protocols()
+    print(f"Migrated {num_migrated} protocols.")
+
+
+if __name__ == "__main__":
+    main()
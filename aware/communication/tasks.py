@@ -89,7 +89,9 @@ def set_request_completed(primitive_str: str):
     if not isinstance(message, ToolResponseMessage):
         raise ValueError("Last message is not a tool response message.")
     message.content = request.response_to_string()
-    chat_database_handler.update_message(message_key, message)
+    chat_database_handler.update_message(
+        request.client_process_id, message_key, message
+    )
     # TODO: Refine this logic, we should have more control over agents that are waiting for a response, split between the current transition and the state.
     client_process_ids = ProcessDatabaseHandler().get_process_ids(
         request.client_process_id
@@ -0,0 +1,166 @@
+import importlib
+import json
+from pathlib import Path
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+HANDLER_MODULE = "aware.communication.protocols.database.protocols_redis_handler"
+PROTOCOL_NAMES = [
+    "EventSubscriber",
+    "EventPublisher",
+    "TopicPublisher",
+    "TopicSubscriber",
+    "RequestClient",
+    "RequestService",
+    "ActionClient",
+    "ActionService",
+]
+
+
+class FakeProtocol:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def to_json(self):
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_json(cls, json_str):
+        return cls(**json.loads(json_str))
+
+
+class TestProtocolsRedisHandler(unittest.TestCase):
+    def setUp(self):
+        # The protocol classes pull in the whole communication package, which can't be
+        # imported on its own yet, so the test lives outside of it. The handler only
+        # needs their ids, names and JSON.
+        protocols = types.ModuleType("aware.communication.protocols")
+        protocols.__path__ = [str(Path(__file__).parents[1] / "protocols")]
+        for name in PROTOCOL_NAMES:
+            setattr(protocols, name, type(name, (FakeProtocol,), {}))
+        protocol_interface = types.ModuleType(
+            "aware.communication.protocols.interface.protocol"
+        )
+        protocol_interface.Protocol = FakeProtocol
+
+        # The modules are restored after the test.
+        patcher = patch.dict(
+            sys.modules,
+            {
+                protocols.__name__: protocols,
+                protocol_interface.__name__: protocol_interface,
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Imported again with the minimal protocols.
+        for module_name in ["aware.communication.protocols.database", HANDLER_MODULE]:
+            sys.modules.pop(module_name, None)
+        self.handler_module = importlib.import_module(HANDLER_MODULE)
+
+        self.client = fakeredis.FakeRedis()
+        self.redis_handler = self.handler_module.ProtocolsRedisHandler(self.client)
+
+    def create_topic_subscriber(self, id: str, process_id: str, **fields):
+        return self.handler_module.TopicSubscriber(
+            id=id,
+            process_id=process_id,
+            topic_id=fields.get("topic_id", "topic"),
+            topic_name=fields.get("topic_name", f"name_{id}"),
+        )
+
+    def test_protocols_are_indexed_by_process_and_topic(self):
+        self.redis_handler.create_topic_subscriber(
+            self.create_topic_subscriber("subscriber_1", "process_1")
+        )
+        self.redis_handler.create_topic_subscriber(
+            self.create_topic_subscriber("subscriber_2", "process_2")
+        )
+        self.redis_handler.create_topic_publisher(
+            self.handler_module.TopicPublisher(
+                id="publisher_1", process_id="process_1", topic_name="topic_name"
+            )
+        )
+
+        protocols = self.redis_handler.get_process_protocols(
+            "process_1", ["topic_subscriber", "topic_publisher"]
+        )
+        self.assertEqual(
+            protocols["topic_subscriber"]["name_subscriber_1"].id, "subscriber_1"
+        )
+        self.assertEqual(protocols["topic_publisher"]["topic_name"].id, "publisher_1")
+
+        subscribers = self.redis_handler.get_topic_subscribers_from_topic("topic")
+        self.assertEqual(
+            {
+                process_id: subscriber.id
+                for process_id, subscriber in subscribers.items()
+            },
+            {"process_1": "subscriber_1", "process_2": "subscriber_2"},
+        )
+
+    def test_creating_a_protocol_invalidates_the_communication_snapshot(self):
+        version, _ = self.redis_handler.get_communication_snapshot("process_1")
+        self.redis_handler.set_communication_snapshot(
+            "process_1", version, {"protocols": []}
+        )
+        self.assertIsNotNone(
+            self.redis_handler.get_communication_snapshot("process_1")[1]
+        )
+
+        self.redis_handler.create_topic_subscriber(
+            self.create_topic_subscriber("subscriber_1", "process_1")
+        )
+        new_version, snapshot = self.redis_handler.get_communication_snapshot(
+            "process_1"
+        )
+        self.assertEqual(new_version, version + 1)
+        self.assertIsNone(snapshot)
+
+    def test_migration_indexes_the_legacy_sets_without_overwriting(self):
+        # The protocol was updated under its id after the legacy set was written.
+        updated_subscriber = self.create_topic_subscriber(
+            "subscriber_1", "process_1", topic_name="updated"
+        )
+        self.client.set("topic_subscriber:subscriber_1", updated_subscriber.to_json())
+        legacy_subscribers = [
+            self.create_topic_subscriber("subscriber_1", "process_1"),
+            self.create_topic_subscriber("subscriber_2", "process_1"),
+        ]
+        self.client.sadd(
+            "process:process_1:topic_subscribers",
+            *[subscriber.to_json() for subscriber in legacy_subscribers],
+        )
+        self.client.sadd("topic:topic:subscribers", legacy_subscribers[0].to_json())
+
+        self.assertEqual(self.redis_handler.migrate_legacy_protocols(), 2)
+        self.assertFalse(self.client.exists("process:process_1:topic_subscribers"))
+        self.assertFalse(self.client.exists("topic:topic:subscribers"))
+
+        self.assertEqual(
+            self.redis_handler.get_topic_subscriber("subscriber_1").topic_name,
+            "updated",
+        )
+        subscribers = self.redis_handler.get_process_protocols(
+            "process_1", ["topic_subscriber"]
+        )["topic_subscriber"]
+        self.assertEqual(subscribers["name_subscriber_2"].id, "subscriber_2")
+        self.assertEqual(
+            sorted(
+                subscriber.id
+                for subscriber in self.redis_handler._get_indexed_protocols(
+                    "topic_subscriber", "topic:topic:subscriber_ids"
+                )
+            ),
+            ["subscriber_1", "subscriber_2"],
+        )
+        # Nothing left to migrate.
+        self.assertEqual(self.redis_handler.migrate_legacy_protocols(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
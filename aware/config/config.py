@@ -29,15 +29,87 @@ class Config(metaclass=Singleton):
         # OPENAI
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_num_retries = os.getenv("OPENAI_NUM_RETRIES", 3)
+        self.openai_max_backoff_sec = 60
+        self.openai_timeout_sec = 600
+        # Pool of clients shared by the calls of the dispatcher.
+        self.openai_client_pool_size = 256
+        self.openai_client_idle_timeout_sec = 300
+        self.openai_max_connections = 100
+        self.openai_max_keepalive_connections = 20
+        self.openai_keepalive_expiry_sec = 60
+        self.openai_http2 = True
+        # Retry budget and circuit breaker per API key.
+        self.openai_retry_budget_ratio = 0.2
+        self.openai_retry_budget_max = 10
+        self.openai_circuit_failure_threshold = 5
+        self.openai_circuit_cooldown_sec = 30
 
         self.assistant_name = os.getenv("ASSISTANT_NAME", "Aware")
+        # Development mode, reloads the prompt templates when they change.
+        self.dev_mode = os.getenv("AWARE_DEV_MODE", "false").lower() == "true"
+
+        # Prompts, the bytecode cache uses the system temp folder when not set.
+        self.prompts_bytecode_cache_dir = os.getenv("PROMPTS_BYTECODE_CACHE_DIR")
+        self.prompts_static_cache_size = 256
+
+        # Logs, written in batches by a background thread.
+        self.log_format = os.getenv("LOG_FORMAT", "text")  # text or json
+        self.log_max_open_files = 64
+        self.log_batch_size = 256
+        self.log_rate_limit_per_sec = 100  # Per logger, 0 to disable.
+        self.log_rate_limit_burst = 500
+        # Fraction of the conversation dumps logged, they contain the full prompt.
+        self.conversation_log_sample_rate = float(
+            os.getenv("CONVERSATION_LOG_SAMPLE_RATE", 1.0)
+        )
+
         # Memory
         self.max_conversation_tokens = 2000  # TODO: Define this value.
         self.conversation_warning_threshold = 0.1  # 0.8  # TODO: Define this value.
 
         self.conversation_timeout_sec = 240
+        self.response_stream_expire_sec = 3600
+
+        # Messages written to Redis first and persisted to Supabase by the message flusher.
+        self.chat_write_behind = (
+            os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+        )
+        self.chat_outbox_group = os.getenv("CHAT_OUTBOX_GROUP", "message_flushers")
+        self.chat_outbox_batch_size = 100
+        self.chat_outbox_block_ms = 1000
+        self.chat_outbox_reclaim_idle_ms = 60000
+        self.chat_outbox_reclaim_interval_sec = 30
+        # Below chat_outbox_reclaim_idle_ms, the entries held while retrying are touched before each wait.
+        self.chat_outbox_max_backoff_sec = 30
+
+        # Call dispatcher
+        self.pending_calls_group = os.getenv("PENDING_CALLS_GROUP", "call_dispatchers")
+        self.pending_calls_batch_size = 10
+        self.pending_calls_prefetch = 100
+        self.pending_calls_block_ms = 5000
+        # The calls in-flight are touched every pending_calls_touch_interval_sec, so only the calls of a
+        # dispatcher that stopped stay idle long enough to be reclaimed.
+        self.pending_calls_reclaim_idle_ms = 300000
+        self.pending_calls_touch_interval_sec = 60
+        self.pending_calls_reclaim_interval_sec = 30
+        # AIMD concurrency per API key.
+        self.dispatcher_initial_concurrency = 10
+        self.dispatcher_min_concurrency = 1
+        self.dispatcher_max_concurrency = 100
+        self.dispatcher_target_latency_sec = 30
+        self.dispatcher_decrease_factor = 0.5
+        self.dispatcher_metrics_interval_sec = 10
+        self.dispatcher_max_error_backoff_sec = 30
         self.task_timeout_sec = 600
 
+        # Processes cached by each worker.
+        self.process_cache_size = 128
+
+        # Communication, actions with feedback included on the prompt of the client.
+        self.max_action_feedbacks = 20
+        # Snapshot of the communication of each main process, rebuilt when its version changes.
+        self.communication_snapshot_expire_sec = 24 * 3600
+
         # Capabilities
         self.max_iterations = 10
 
@@ -47,6 +119,17 @@ class Config(metaclass=Singleton):
             "LOCAL_WEAVIATE_URL", "localhost"
         )  # TODO: Remove after moving to cloud
         self.weaviate_port = os.getenv("WEAVIATE_PORT", 9090)
+        self.weaviate_grpc_port = os.getenv("WEAVIATE_GRPC_PORT", 50051)
+        self.weaviate_pool_connections = 10
+        self.weaviate_pool_maxsize = 100
+        self.weaviate_search_threads = 8
+
+        # Embeddings
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+        self.embedding_cache_size = 10000
+        self.embedding_redis_expire_sec = 7 * 24 * 3600
+        self.embedding_batch_window_ms = 5
+        self.embedding_max_batch_size = 2048
 
         self.weaviate_url = os.getenv("WEAVIATE_URL", "http://weaviate")
         self.weaviate_key = os.getenv("WEAVIATE_KEY")
@@ -0,0 +1,205 @@
+from array import array
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from openai import OpenAI
+
+from aware.config.config import Config, Singleton
+from aware.database.client_handlers import ClientHandlers
+from aware.utils.logger.file_logger import FileLogger
+
+Embedding = List[float]
+
+
+class EmbeddingService(metaclass=Singleton):
+    """Embeddings cached by content: an in-process LRU in front of Redis, keyed by the hash of model and text.
+
+    The misses of concurrent callers are merged during batch_window_sec into a single embeddings.create call.
+    """
+
+    def __init__(self):
+        config = Config()
+        self.model = config.embedding_model
+        self.max_cache_size = config.embedding_cache_size
+        self.redis_expire_sec = config.embedding_redis_expire_sec
+        self.batch_window_sec = config.embedding_batch_window_ms / 1000
+        self.max_batch_size = config.embedding_max_batch_size
+
+        self.openai_client = OpenAI()
+        self.redis_client = ClientHandlers().get_redis_client()
+        self.logger = FileLogger("embedding_service")
+
+        self.cache: "OrderedDict[str, Embedding]" = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.pending: Dict[str, Future] = {}
+        self.pending_lock = threading.Lock()
+        self.flush_scheduled = False
+
+        self.metrics_lock = threading.Lock()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_latency_sec = 0.0
+
+    def get_embedding(self, text: str) -> Embedding:
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[Embedding]:
+        """Get the embeddings of the texts, only calling the API for the ones that are not cached."""
+        texts = [self._normalize(text) for text in texts]
+        embeddings: Dict[str, Embedding] = {}
+
+        keys = {text: self._get_key(text) for text in set(texts)}
+        missing_texts = []
+        with self.cache_lock:
+            for text, key in keys.items():
+                embedding = self.cache.get(key)
+                if embedding is None:
+                    missing_texts.append(text)
+                else:
+                    self.cache.move_to_end(key)
+                    embeddings[text] = embedding
+        memory_hits = len(embeddings)
+
+        redis_embeddings = self._get_from_redis(
+            [keys[text] for text in missing_texts]
+        )
+        api_texts = []
+        for text, embedding in zip(missing_texts, redis_embeddings):
+            if embedding is None:
+                api_texts.append(text)
+            else:
+                embeddings[text] = embedding
+                self._add_to_cache(keys[text], embedding)
+
+        with self.metrics_lock:
+            self.memory_hits += memory_hits
+            self.redis_hits += len(missing_texts) - len(api_texts)
+            self.misses += len(api_texts)
+
+        if api_texts:
+            futures = self._enqueue(api_texts)
+            for text, future in futures.items():
+                embeddings[text] = future.result()
+        return [embeddings[text] for text in texts]
+
+    async def aget_embedding(self, text: str) -> Embedding:
+        return (await self.aget_embeddings([text]))[0]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[Embedding]:
+        """Async variant, runs on a thread so it shares the cache and the batching with the sync callers."""
+        return await asyncio.to_thread(self.get_embeddings, texts)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.metrics_lock:
+            requests = self.memory_hits + self.redis_hits + self.misses
+            hits = self.memory_hits + self.redis_hits
+            avg_latency_sec = (
+                self.api_latency_sec / self.api_calls if self.api_calls else 0.0
+            )
+            return {
+                "requests": requests,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": hits / requests if requests else 0.0,
+                "api_calls": self.api_calls,
+                "api_latency_sec": round(self.api_latency_sec, 3),
+                # Each hit would have needed at least one API call on its own.
+                "saved_latency_sec": round(hits * avg_latency_sec, 3),
+            }
+
+    def _enqueue(self, texts: List[str]) -> Dict[str, Future]:
+        """Add the texts to the next batch, the caller that opens a batch waits the window and sends it."""
+        futures = {}
+        with self.pending_lock:
+            for text in texts:
+                future = self.pending.get(text)
+                if future is None:
+                    future = Future()
+                    self.pending[text] = future
+                futures[text] = future
+            should_flush = not self.flush_scheduled
+            self.flush_scheduled = True
+
+        if should_flush:
+            time.sleep(self.batch_window_sec)
+            self._flush()
+        return futures
+
+    def _flush(self):
+        with self.pending_lock:
+            pending = self.pending
+            self.pending = {}
+            self.flush_scheduled = False
+
+        texts = list(pending)
+        for start in range(0, len(texts), self.max_batch_size):
+            batch = texts[start : start + self.max_batch_size]
+            try:
+                embeddings = self._create_embeddings(batch)
+            except Exception as e:
+                for text in batch:
+                    pending[text].set_exception(e)
+                continue
+            for text, embedding in zip(batch, embeddings):
+                pending[text].set_result(embedding)
+            # After resolving the callers, the embeddings are valid even if they can't be cached.
+            try:
+                self._store_embeddings(batch, embeddings)
+            except Exception as e:
+                self.logger.error(f"Error caching {len(batch)} embeddings: {e}")
+
+    def _create_embeddings(self, texts: List[str]) -> List[Embedding]:
+        started_at = time.monotonic()
+        response = self.openai_client.embeddings.create(input=texts, model=self.model)
+        with self.metrics_lock:
+            self.api_calls += 1
+            self.api_latency_sec += time.monotonic() - started_at
+
+        return [
+            data.embedding
+            for data in sorted(response.data, key=lambda data: data.index)
+        ]
+
+    def _store_embeddings(self, texts: List[str], embeddings: List[Embedding]):
+        keys = [self._get_key(text) for text in texts]
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, embedding in zip(keys, embeddings):
+            self._add_to_cache(key, embedding)
+            # Stored as float32 to keep the entries compact.
+            pipeline.set(
+                key, array("f", embedding).tobytes(), ex=self.redis_expire_sec
+            )
+        pipeline.execute()
+
+    def _get_from_redis(self, keys: List[str]) -> List[Optional[Embedding]]:
+        if not keys:
+            return []
+        embeddings = []
+        for data in self.redis_client.mget(keys):
+            if data is None:
+                embeddings.append(None)
+            else:
+                embeddings.append(array("f", data).tolist())
+        return embeddings
+
+    def _add_to_cache(self, key: str, embedding: Embedding):
+        with self.cache_lock:
+            self.cache[key] = embedding
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_cache_size:
+                self.cache.popitem(last=False)
+
+    def _get_key(self, text: str) -> str:
+        text_hash = hashlib.sha256(f"{self.model}\n{text}".encode()).hexdigest()
+        return f"embedding:{text_hash}"
+
+    def _normalize(self, text: str) -> str:
+        return text.replace("\n", " ")
@@ -11,6 +11,7 @@ class MemoryManager:
     def __init__(self, user_id: str, logger: FileLogger):
         self.user_id = user_id
         self.logger = logger
+        # Shared connection, only the first manager of the process connects.
         self.weaviate_db = WeaviateDB()
 
     def create_agent(self, user_id: str, agent_data: AgentData) -> str:
@@ -65,21 +66,16 @@ class MemoryManager:
         Returns:
             str: Feedback message.
         """
-        datapoints: Dict[str, List[str]] = {}
-        for query in queries:
-            search_results = self.weaviate_db.search_info(
-                query=query, user_id=self.user_id
-            )
-            if search_results.error:
-                return (
-                    f"Error searching for query: {query}, error: {search_results.error}"
-                )
-            results = search_results.data
-            self.logger.info(f"Searching for query {query}, results: {results}")
-            datapoints[query] = results
+        search_results = self.weaviate_db.search_info_batch(
+            queries=queries, user_id=self.user_id
+        )
+        if search_results.error:
+            return f"Error searching for queries: {queries}, error: {search_results.error}"
+        datapoints: Dict[str, List[str]] = search_results.data
+        self.logger.info(f"Searching for queries {queries}, results: {datapoints}")
         response = ""
         for query, data in datapoints.items():
-            data_str = "Not found."
+            data_str = "Not found.\n" if not data else ""
             for index, datapoint in enumerate(data):
                 data_str += f"- Data {index}: {datapoint}\n"
             response += f"- Query: {query}\nAnswer: {data_str}"
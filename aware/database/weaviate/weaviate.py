@@ -1,51 +1,88 @@
+import atexit
 import json
-from openai import OpenAI
 import os
 from pathlib import Path
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
 
 import weaviate
 import weaviate.classes as wvc
 
 from aware.agent.agent_data import AgentData
 from aware.config.config import Config
+from aware.database.weaviate.embedding_service import EmbeddingService
 from aware.database.weaviate.helpers import (
     WeaviateTool,
     WeaviateResult,
 )
 
-
 class WeaviateDB:
-    def __init__(self):
-        weaviate_key = Config().weaviate_key
-        self.openai_client = OpenAI()
+    """Process-wide Weaviate connection, shared by all the memory managers and thread-safe."""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(WeaviateDB, cls).__new__(cls)
+                    instance._initialize()
+                    cls._instance = instance
+        return cls._instance
+
+    def _initialize(self):
+        config = Config()
+        weaviate_key = config.weaviate_key
+        # The client keeps a pool of HTTP connections and a gRPC channel, shared by all threads.
+        additional_config = wvc.init.AdditionalConfig(
+            connection=wvc.init.ConnectionConfig(
+                session_pool_connections=config.weaviate_pool_connections,
+                session_pool_maxsize=config.weaviate_pool_maxsize,
+            )
+        )
 
         if weaviate_key:
             # Run on weaviate cloud service
             self.client = weaviate.connect_to_wcs(
-                cluster_url=Config().weaviate_url,
+                cluster_url=config.weaviate_url,
                 auth_credentials=weaviate.auth.AuthApiKey(api_key=weaviate_key),
                 headers={
-                    "X-OpenAI-Api-Key": Config().openai_api_key,
+                    "X-OpenAI-Api-Key": config.openai_api_key,
                 },
+                additional_config=additional_config,
             )
         else:
             # Run locally
             self.client = weaviate.connect_to_local(
-                host=Config().local_weaviate_url, port=Config().weaviate_port
+                host=config.local_weaviate_url,
+                port=config.weaviate_port,
+                grpc_port=config.weaviate_grpc_port,
+                additional_config=additional_config,
             )
+        # Bounded pool to run the vector searches of several queries concurrently.
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=config.weaviate_search_threads
+        )
+        atexit.register(self.client.close)
+
         schemas_path = os.path.join(Path(__file__).parent, "schemas", "schemas.json")
+        self._bootstrap_schemas(schemas_path)
+
+    def _bootstrap_schemas(self, schemas_path: str):
+        """Create the schemas missing in Weaviate, checking all of them with a single request."""
+        with open(schemas_path) as json_file:
+            class_names = set(json.load(json_file))
+
+        existing_class_names = set(self.client.collections.list_all(simple=True))
+        if class_names <= existing_class_names:
+            return
+
         self._create_schemas(schemas_path)
 
     def get_ada_embedding(self, text):
-        text = text.replace("\n", " ")
-        return (
-            self.openai_client.embeddings.create(
-                input=[text], model="text-embedding-ada-002"
-            )
-            .data[0]
-            .embedding
-        )
+        return EmbeddingService().get_embedding(text)
 
     def _create_schemas(self, schemas_path: str):
         """Create the schemas in the Weaviate instance
@@ -180,24 +217,72 @@ class WeaviateDB:
         certainty=0.7,
     ) -> WeaviateResult:
         try:
-            filters = wvc.query.Filter.by_ref("user").by_id().equal(user_id)
-
             query_vector = self.get_ada_embedding(query)
-            info_collection = self.client.collections.get("Info")
-            info = info_collection.query.near_vector(
-                near_vector=query_vector,
-                certainty=certainty,
-                limit=num_relevant,
-                filters=filters,
+            info_objects = self._search_info_objects(
+                query_vector, user_id, num_relevant, certainty
             )
-            datapoints = [
-                info_object.properties["data"] for info_object in info.objects
+            datapoints = [info_object.properties["data"] for info_object in info_objects]
+            return WeaviateResult(data=datapoints)
+        except Exception as err:
+            print(f"Unexpected error {err} when searching info")
+            return WeaviateResult(error=str(err))
+
+    def search_info_batch(
+        self,
+        queries: List[str],
+        user_id: str,
+        num_relevant=2,
+        certainty=0.7,
+    ) -> WeaviateResult:
+        """Search several queries embedding them in a single request and running the vector searches concurrently.
+
+        The result maps each query to its datapoints, skipping the ones already returned for a previous query.
+        """
+        try:
+            queries = list(dict.fromkeys(queries))
+            query_vectors = EmbeddingService().get_embeddings(queries)
+            futures = [
+                self.search_executor.submit(
+                    self._search_info_objects,
+                    query_vector,
+                    user_id,
+                    num_relevant,
+                    certainty,
+                )
+                for query_vector in query_vectors
             ]
+
+            seen_uuids = set()
+            datapoints: Dict[str, List[str]] = {}
+            for query, future in zip(queries, futures):
+                datapoints[query] = []
+                for info_object in future.result():
+                    if info_object.uuid in seen_uuids:
+                        continue
+                    seen_uuids.add(info_object.uuid)
+                    datapoints[query].append(info_object.properties["data"])
             return WeaviateResult(data=datapoints)
         except Exception as err:
             print(f"Unexpected error {err} when searching info")
             return WeaviateResult(error=str(err))
 
+    def _search_info_objects(
+        self,
+        query_vector: List[float],
+        user_id: str,
+        num_relevant: int,
+        certainty: float,
+    ) -> List[Any]:
+        filters = wvc.query.Filter.by_ref("user").by_id().equal(user_id)
+        info_collection = self.client.collections.get("Info")
+        info = info_collection.query.near_vector(
+            near_vector=query_vector,
+            certainty=certainty,
+            limit=num_relevant,
+            filters=filters,
+        )
+        return info.objects
+
     def store_info(
         self, user_id: str, data: str, potential_query: str
     ) -> WeaviateResult:
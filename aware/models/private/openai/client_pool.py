@@ -0,0 +1,161 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from typing import AsyncIterator, List
+
+import httpx
+from openai import AsyncOpenAI
+
+from aware.config.config import Config, Singleton
+
+
+class _PooledClient:
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class OpenAIClientPool(metaclass=Singleton):
+    """Bounded LRU pool of AsyncOpenAI clients keyed by API key, so the calls of the same user reuse their connections.
+
+    Clients are only closed when they are idle: evicted by LRU when the pool is full or after idle_timeout_sec.
+    """
+
+    def __init__(self):
+        config = Config()
+        self.max_clients = config.openai_client_pool_size
+        self.idle_timeout_sec = config.openai_client_idle_timeout_sec
+        self.limits = httpx.Limits(
+            max_connections=config.openai_max_connections,
+            max_keepalive_connections=config.openai_max_keepalive_connections,
+            keepalive_expiry=config.openai_keepalive_expiry_sec,
+        )
+        self.http2 = config.openai_http2
+        self.clients: "OrderedDict[str, _PooledClient]" = OrderedDict()
+
+    @asynccontextmanager
+    async def acquire(self, api_key: str) -> AsyncIterator[AsyncOpenAI]:
+        pooled_client = self.clients.get(api_key)
+        if pooled_client is None:
+            pooled_client = _PooledClient(self._create_client(api_key))
+            self.clients[api_key] = pooled_client
+        self.clients.move_to_end(api_key)
+        pooled_client.in_use += 1
+        try:
+            await self._evict()
+            yield pooled_client.client
+        finally:
+            pooled_client.in_use -= 1
+            pooled_client.last_used = time.monotonic()
+
+    def _create_client(self, api_key: str) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=httpx.Timeout(Config().openai_timeout_sec, connect=5.0),
+        )
+        # Retries are done by _OpenAIRetryHandler, so they go through its budget and backoff.
+        return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+    async def _evict(self):
+        """Close the idle clients that expired and the least recently used ones over the pool size."""
+        now = time.monotonic()
+        idle_clients = [
+            api_key
+            for api_key, pooled_client in self.clients.items()
+            if pooled_client.in_use == 0
+        ]
+        num_overflow = len(self.clients) - self.max_clients
+        evicted: List[str] = []
+        # Ordered from least to most recently used.
+        for api_key in idle_clients:
+            if num_overflow > 0:
+                num_overflow -= 1
+            elif now - self.clients[api_key].last_used < self.idle_timeout_sec:
+                continue
+            evicted.append(api_key)
+
+        for api_key in evicted:
+            pooled_client = self.clients.pop(api_key)
+            await pooled_client.client.close()
+
+    async def close(self):
+        for pooled_client in self.clients.values():
+            await pooled_client.client.close()
+        self.clients.clear()
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written apart, don't delay the body on kept alive connections.
+    disable_nagle_algorithm = True
+    response = json.dumps(
+        {
+            "id": "benchmark",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "benchmark",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Hi"},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+    ).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.response)))
+        self.end_headers()
+        self.wfile.write(self.response)
+
+    def log_message(self, *args):
+        pass
+
+
+def benchmark(num_calls: int = 200):
+    """Compare the per-call time of a new client per call and of the pooled client against a local mock OpenAI server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # The clients read the server from the environment, as the pool doesn't take a base url.
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    api_key = "benchmark"
+    request = {"model": "benchmark", "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def call_previous():
+        async with AsyncOpenAI(api_key=api_key, max_retries=0) as client:
+            await client.chat.completions.create(**request)
+
+    async def call_pooled():
+        async with OpenAIClientPool().acquire(api_key) as client:
+            await client.chat.completions.create(**request)
+
+    async def run():
+        for name, call in {"previous": call_previous, "pooled": call_pooled}.items():
+            # Warm up, the first pooled call also opens its connection.
+            await call()
+            start = time.perf_counter()
+            for _ in range(num_calls):
+                await call()
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed / num_calls * 1e3:.2f} ms/call")
+        await OpenAIClientPool().close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    benchmark()
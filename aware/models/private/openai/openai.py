@@ -1,34 +1,62 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import base64
 from openai import AsyncOpenAI
+from openai._exceptions import APIConnectionError, APIStatusError
 from openai._types import NOT_GIVEN
 from openai.types.chat import (
     ChatCompletionMessageToolCall,
     ChatCompletionToolParam,
     ChatCompletionMessage,
 )
+from openai.types.chat.chat_completion_chunk import ChoiceDelta
 from dotenv import load_dotenv
 
 from aware.config.config import Config
 from aware.models.model import Model
-from aware.models.private.openai.retry_handler import _OpenAIRetryHandler
+from aware.models.private.openai.retry_handler import (
+    StreamInterruptedError,
+    _OpenAIRetryHandler,
+)
 from aware.utils.logger.file_logger import FileLogger
 
 load_dotenv()
 
 
 class OpenAIModel(Model):
-    def __init__(self, api_key: str, logger: FileLogger):
+    def __init__(
+        self,
+        api_key: str,
+        logger: FileLogger,
+        on_rate_limit: Optional[Callable[[], None]] = None,
+        client: Optional[AsyncOpenAI] = None,
+    ):
         self.model_name = Config().openai_model  # TODO: Enable other models.
         self.logger = logger
         self.logger.info(f"OpenAI model: {self.model_name}, api_key: {api_key}")
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Reuse a pooled client when provided to keep the connections alive between calls.
+        self.client = (
+            client
+            if client is not None
+            else AsyncOpenAI(api_key=api_key, max_retries=0)
+        )
 
+        config = Config()
         _retry_handler = _OpenAIRetryHandler(
-            logger=self.logger, num_retries=Config().openai_num_retries
+            logger=self.logger,
+            api_key=api_key,
+            num_retries=config.openai_num_retries,
+            max_backoff_sec=config.openai_max_backoff_sec,
+            budget_ratio=config.openai_retry_budget_ratio,
+            budget_max=config.openai_retry_budget_max,
+            failure_threshold=config.openai_circuit_failure_threshold,
+            cooldown_sec=config.openai_circuit_cooldown_sec,
+            on_rate_limit=on_rate_limit,
         )
 
         self._get_response_with_retries = _retry_handler(self._get_response)
+        self._get_streamed_response_with_retries = _retry_handler(
+            self._get_streamed_response
+        )
         super().__init__()
 
     def get_name(self) -> str:
@@ -39,8 +67,18 @@ class OpenAIModel(Model):
         messages: Dict[str, Any],
         tools_openai: List[ChatCompletionToolParam] = NOT_GIVEN,
         temperature: float = 0.7,
+        on_delta: Optional[Callable[[ChoiceDelta], Awaitable[None]]] = None,
     ) -> ChatCompletionMessage:
+        """Get the response of the model, streaming it through on_delta when provided."""
         try:
+            if on_delta is not None:
+                return await self._get_streamed_response_with_retries(
+                    messages=messages,
+                    tools_openai=tools_openai,
+                    response_format="text",
+                    temperature=temperature,
+                    on_delta=on_delta,
+                )
             return await self._get_response_with_retries(
                 messages=messages,
                 tools_openai=tools_openai,
@@ -70,10 +108,73 @@ class OpenAIModel(Model):
             response_format={"type": response_format},
             temperature=temperature,
             tools=tools_openai,
-            # stream=False,  # TODO: Address SET TO TRUE for specific cases - USER.
         )
         return response.choices[0].message
 
+    async def _get_streamed_response(
+        self,
+        messages: Dict[str, Any],
+        on_delta: Callable[[ChoiceDelta], Awaitable[None]],
+        tools_openai: List[ChatCompletionToolParam] = NOT_GIVEN,
+        response_format: str = "text",  # or json_object.
+        temperature: float = 0.7,
+    ) -> ChatCompletionMessage:
+        """Stream the response, forwarding each delta while the content and tool calls are assembled."""
+        stream = await self.client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            response_format={"type": response_format},
+            temperature=temperature,
+            tools=tools_openai,
+            stream=True,
+        )
+        content_parts: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        delivered = False
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                for tool_call_delta in delta.tool_calls or []:
+                    tool_call = tool_calls.setdefault(
+                        tool_call_delta.index,
+                        {
+                            "id": "",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        },
+                    )
+                    if tool_call_delta.id:
+                        tool_call["id"] = tool_call_delta.id
+                    if tool_call_delta.function is not None:
+                        function = tool_call_delta.function
+                        if function.name:
+                            tool_call["function"]["name"] += function.name
+                        if function.arguments:
+                            tool_call["function"]["arguments"] += function.arguments
+                delivered = True
+                await on_delta(delta)
+        except (APIStatusError, APIConnectionError) as e:
+            # A retry would stream the response again from the start, duplicating what was delivered.
+            if delivered:
+                raise StreamInterruptedError(
+                    f"Stream interrupted after delivering deltas: {e}"
+                ) from e
+            raise
+
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(content_parts) if content_parts else None,
+            tool_calls=[
+                ChatCompletionMessageToolCall.model_validate(tool_calls[index])
+                for index in sorted(tool_calls)
+            ]
+            or None,
+        )
+
     def get_multi_modal_message(
         prompt: str,
         urls: Optional[List[str]] = [],
@@ -1,7 +1,12 @@
+import asyncio
+from email.utils import parsedate_to_datetime
 import functools
-from time import sleep
-from typing import Callable, TypeVar, ParamSpec
-from openai._exceptions import APIStatusError, RateLimitError
+import hashlib
+import random
+import re
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar, ParamSpec
+from openai._exceptions import APIConnectionError, APIStatusError, RateLimitError
 
 
 from aware.utils.logger.file_logger import FileLogger
@@ -9,14 +14,145 @@ from aware.utils.logger.file_logger import FileLogger
 _T = TypeVar("_T")
 _P = ParamSpec("_P")
 
+_RETRYABLE_STATUS_CODES = {408, 409, 429}
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS_SEC = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit of an API key is open."""
+
+    def __init__(self, retry_in_sec: float):
+        self.retry_in_sec = retry_in_sec
+        super().__init__(
+            f"Circuit open after consecutive failures, retry in {retry_in_sec:.1f} seconds."
+        )
+
+
+class StreamInterruptedError(Exception):
+    """Raised when a streamed response fails after its first delta was delivered, it can't be retried from the start."""
+
+
+class _KeyRetryState:
+    """Retry budget and circuit breaker shared by all the calls that use the same API key.
+
+    The budget is a token bucket: each call deposits budget_ratio tokens and each retry spends one, so retries can't
+    exceed that ratio of the traffic when the key is being throttled.
+    """
+
+    def __init__(
+        self,
+        budget_ratio: float,
+        budget_max: float,
+        failure_threshold: int,
+        cooldown_sec: float,
+    ):
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+
+        self.budget = budget_max
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_trial = False
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limit_errors = 0
+        self.backoff_sec = 0.0
+        self.budget_exhausted = 0
+        self.circuit_opens = 0
+        self.rejected_calls = 0
+
+    def deposit(self):
+        self.calls += 1
+        self.budget = min(self.budget_max, self.budget + self.budget_ratio)
+
+    def before_attempt(self):
+        if self.opened_at is None:
+            return
+        retry_in_sec = self.opened_at + self.cooldown_sec - time.monotonic()
+        # After the cooldown a single trial call decides whether to close the circuit again.
+        if retry_in_sec > 0 or self.half_open_trial:
+            self.rejected_calls += 1
+            raise CircuitOpenError(max(retry_in_sec, 0))
+        self.half_open_trial = True
+
+    def on_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.half_open_trial = False
+
+    def release_trial(self):
+        """Let the next call be the trial when this one failed for a reason unrelated to the API health."""
+        self.half_open_trial = False
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        if self.half_open_trial or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.half_open_trial:
+                self.circuit_opens += 1
+            self.opened_at = time.monotonic()
+            self.half_open_trial = False
+
+    def withdraw_retry(self) -> bool:
+        if self.budget < 1:
+            self.budget_exhausted += 1
+            return False
+        self.budget -= 1
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limit_errors": self.rate_limit_errors,
+            "backoff_sec": round(self.backoff_sec, 3),
+            "budget": round(self.budget, 2),
+            "budget_exhausted": self.budget_exhausted,
+            "circuit_open": self.opened_at is not None,
+            "circuit_opens": self.circuit_opens,
+            "rejected_calls": self.rejected_calls,
+        }
+
+
+_key_retry_states: Dict[str, _KeyRetryState] = {}
+
+
+def _get_key_id(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()[:8]
+
+
+def get_retry_metrics() -> Dict[str, Dict[str, Any]]:
+    """Get the retry metrics of each API key, identified by a short hash to don't expose them."""
+    return {
+        key_id: retry_state.get_metrics()
+        for key_id, retry_state in _key_retry_states.items()
+    }
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Check if the API error can succeed on a later attempt."""
+    if isinstance(error, APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
 
 class _OpenAIRetryHandler:
     """Retry Handler for OpenAI API call.
 
     Args:
+        api_key str: API key of the calls, used to share the retry budget and circuit breaker between them.
         num_retries int: Number of retries. Defaults to 10.
         backoff_base float: Base for exponential backoff. Defaults to 2.
+        max_backoff_sec float: Maximum seconds to wait between attempts. Defaults to 60.
+        budget_ratio float: Retries allowed per call of the same key. Defaults to 0.2.
+        budget_max float: Maximum retries that can be accumulated by the budget. Defaults to 10.
+        failure_threshold int: Consecutive failures that open the circuit. Defaults to 5.
+        cooldown_sec float: Seconds that the circuit stays open. Defaults to 30.
         warn_user bool: Whether to warn the user. Defaults to True.
+        on_rate_limit Callable: Called on every rate limit error, used to adapt the concurrency. Defaults to None.
     """
 
     _retry_limit_msg = "Error: Reached rate limit, passing..."
@@ -24,19 +160,39 @@ class _OpenAIRetryHandler:
         "Please double check that you have setup a PAID OpenAI API Account. You can "
         "read more here: https://docs.agpt.co/setup/#getting-an-openai-api-key"
     )
-    _backoff_msg = "Error: API Bad gateway. Waiting {backoff} seconds..."
+    _backoff_msg = "Error: API Bad gateway. Waiting {backoff:.2f} seconds..."
 
     def __init__(
         self,
         logger: FileLogger,
+        api_key: str,
         num_retries: int = 10,
         backoff_base: float = 2.0,
+        max_backoff_sec: float = 60.0,
+        budget_ratio: float = 0.2,
+        budget_max: float = 10.0,
+        failure_threshold: int = 5,
+        cooldown_sec: float = 30.0,
         warn_user: bool = True,
+        on_rate_limit: Optional[Callable[[], None]] = None,
     ):
         self._logger = logger
-        self._num_retries = num_retries
+        self._num_retries = int(num_retries)
         self._backoff_base = backoff_base
+        self._max_backoff_sec = max_backoff_sec
         self._warn_user = warn_user
+        self._on_rate_limit = on_rate_limit
+
+        key_id = _get_key_id(api_key)
+        self._retry_state = _key_retry_states.get(key_id)
+        if self._retry_state is None:
+            self._retry_state = _KeyRetryState(
+                budget_ratio=budget_ratio,
+                budget_max=budget_max,
+                failure_threshold=failure_threshold,
+                cooldown_sec=cooldown_sec,
+            )
+            _key_retry_states[key_id] = self._retry_state
 
     def _log_rate_limit_error(self) -> None:
         self._logger.debug(self._retry_limit_msg)
@@ -44,31 +200,96 @@ class _OpenAIRetryHandler:
             self._logger.warning(self._api_key_error_msg)
             self._warn_user = False
 
-    def _backoff(self, attempt: int) -> None:
-        backoff = self._backoff_base ** (attempt + 2)
+    def _is_retryable(self, error: Exception) -> bool:
+        return is_retryable_error(error)
+
+    def _get_server_delay(self, error: Exception) -> Optional[float]:
+        """Get the delay requested by the server on Retry-After or, when a limit is exhausted, x-ratelimit-reset-*."""
+        if not isinstance(error, APIStatusError):
+            return None
+        headers = error.response.headers
+
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    pass
+
+        reset_delays = [
+            self._parse_duration(headers.get(f"x-ratelimit-reset-{limit}"))
+            for limit in ("requests", "tokens")
+            if headers.get(f"x-ratelimit-remaining-{limit}") == "0"
+        ]
+        reset_delays = [delay for delay in reset_delays if delay is not None]
+        return max(reset_delays) if reset_delays else None
+
+    def _parse_duration(self, duration: Optional[str]) -> Optional[float]:
+        """Parse the durations used by OpenAI headers, e.g. 20ms, 1s or 6m0s."""
+        if not duration:
+            return None
+        parts = _DURATION_PATTERN.findall(duration)
+        if not parts:
+            return None
+        return sum(float(value) * _DURATION_UNITS_SEC[unit] for value, unit in parts)
+
+    async def _backoff(self, attempt: int, error: Exception) -> None:
+        server_delay = self._get_server_delay(error)
+        if server_delay is not None and server_delay > 0:
+            # Small jitter so the calls waiting for the same reset don't retry at once.
+            backoff = min(self._max_backoff_sec, server_delay) * random.uniform(1, 1.1)
+        else:
+            # Full jitter: uniform between zero and the exponential ceiling.
+            ceiling = min(self._max_backoff_sec, self._backoff_base ** (attempt + 2))
+            backoff = random.uniform(0, ceiling)
         self._logger.debug(self._backoff_msg.format(backoff=backoff))
-        sleep(backoff)
+        self._retry_state.retries += 1
+        self._retry_state.backoff_sec += backoff
+        await asyncio.sleep(backoff)
 
     def __call__(self, func: Callable[_P, _T]) -> Callable[_P, _T]:
         @functools.wraps(func)
         async def _wrapped(*args: _P.args, **kwargs: _P.kwargs) -> _T:
             num_attempts = self._num_retries + 1  # +1 for the first attempt
+            self._retry_state.deposit()
             for attempt in range(1, num_attempts + 1):
+                self._retry_state.before_attempt()
                 try:
-                    return await func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
+                    self._retry_state.on_success()
+                    return result
 
-                except RateLimitError:
-                    if attempt == num_attempts:
+                except (APIStatusError, APIConnectionError) as e:
+                    if not self._is_retryable(e):
+                        self._retry_state.release_trial()
                         raise
-                    self._log_rate_limit_error()
-
-                except APIStatusError as e:
-                    if attempt == num_attempts:
+                    self._retry_state.on_failure()
+                    if isinstance(e, RateLimitError):
+                        self._retry_state.rate_limit_errors += 1
+                        if self._on_rate_limit is not None:
+                            self._on_rate_limit()
+                        self._log_rate_limit_error()
+                    else:
+                        self._logger.error(
+                            f"{type(e).__name__}: {e}. Retries left: {num_attempts - attempt}"
+                        )
+                    if attempt == num_attempts or not self._retry_state.withdraw_retry():
                         raise
-                    self._logger.error(
-                        f"APIStatusError: {e}. Code: {e.status_code}. Retries left: {num_attempts - attempt}"
-                    )
 
-                self._backoff(attempt)
+                    await self._backoff(attempt, e)
+
+                except BaseException:
+                    self._retry_state.release_trial()
+                    raise
 
         return _wrapped
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import unittest
+from unittest.mock import patch
+
+import httpx
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+from aware.models.private.openai import retry_handler
+from aware.models.private.openai.client_pool import OpenAIClientPool
+from aware.models.private.openai.retry_handler import (
+    CircuitOpenError,
+    _OpenAIRetryHandler,
+)
+
+
+def create_error(
+    error_class, status_code: int, headers: Optional[Dict[str, str]] = None
+):
+    response = httpx.Response(
+        status_code,
+        headers=headers,
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"),
+    )
+    return error_class("Error.", response=response, body=None)
+
+
+def call_with_retries(api_key: str, errors: List[Exception], **kwargs) -> str:
+    """Call a function that raises the errors in order and then succeeds."""
+    errors = list(errors)
+
+    async def get_response() -> str:
+        if errors:
+            raise errors.pop(0)
+        return "response"
+
+    handler = _OpenAIRetryHandler(
+        logger=logging.getLogger("test_retry_handler"), api_key=api_key, **kwargs
+    )
+    return asyncio.run(handler(get_response)())
+
+
+class TestOpenAIRetryHandler(unittest.TestCase):
+    def setUp(self):
+        # Record the backoffs instead of waiting for them.
+        self.sleeps: List[float] = []
+        patcher = patch.object(retry_handler.asyncio, "sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def sleep(self, delay: float):
+        self.sleeps.append(delay)
+
+    def test_retry_after_header_sets_the_backoff(self):
+        errors = [
+            create_error(RateLimitError, 429, {"retry-after": "2"}),
+            create_error(RateLimitError, 429, {"retry-after-ms": "500"}),
+            create_error(
+                RateLimitError,
+                429,
+                {
+                    "x-ratelimit-remaining-tokens": "0",
+                    "x-ratelimit-reset-tokens": "1m30s",
+                },
+            ),
+        ]
+        self.assertEqual(call_with_retries("retry-after-key", errors), "response")
+        # Each delay gets up to 10% of jitter.
+        self.assertTrue(2 <= self.sleeps[0] <= 2.2)
+        self.assertTrue(0.5 <= self.sleeps[1] <= 0.55)
+        self.assertTrue(60 <= self.sleeps[2] <= 66)
+
+    def test_backoff_without_server_delay_is_jittered_below_the_ceiling(self):
+        errors = [create_error(InternalServerError, 500) for _ in range(3)]
+        call_with_retries("jitter-key", errors, backoff_base=2.0, max_backoff_sec=10.0)
+        self.assertEqual(len(self.sleeps), 3)
+        for delay, ceiling in zip(self.sleeps, [8, 10, 10]):
+            self.assertTrue(0 <= delay <= ceiling)
+
+    def test_non_retryable_errors_are_raised_at_once(self):
+        with self.assertRaises(BadRequestError):
+            call_with_retries("bad-request-key", [create_error(BadRequestError, 400)])
+        self.assertEqual(self.sleeps, [])
+
+    def test_retries_stop_when_the_budget_is_exhausted(self):
+        errors = [create_error(InternalServerError, 500) for _ in range(5)]
+        with self.assertRaises(InternalServerError):
+            call_with_retries("budget-key", errors, budget_max=2, failure_threshold=10)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        errors = [create_error(InternalServerError, 500) for _ in range(2)]
+        with self.assertRaises(InternalServerError):
+            call_with_retries("circuit-key", errors, num_retries=1, failure_threshold=2)
+        # The next call is rejected without calling the API while the circuit is open.
+        with self.assertRaises(CircuitOpenError):
+            call_with_retries("circuit-key", [])
+
+    def test_rate_limits_are_reported(self):
+        rate_limits = []
+        errors = [create_error(RateLimitError, 429)]
+        call_with_retries(
+            "report-key", errors, on_rate_limit=lambda: rate_limits.append(True)
+        )
+        self.assertEqual(rate_limits, [True])
+
+
+class TestOpenAIClientPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await OpenAIClientPool().close()
+
+    async def test_pooled_clients_dont_retry_on_their_own(self):
+        async with OpenAIClientPool().acquire("pool-key") as client:
+            self.assertEqual(client.max_retries, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -133,6 +133,13 @@ class ProcessDatabaseHandler:
 
         return process_ids
 
+    def get_process_version(self, process_ids: ProcessIds) -> str:
+        """Get a stamp that changes whenever the process data, states, protocols or agent data change."""
+        process_version, agent_version = self.redis_handler.get_process_versions(
+            process_id=process_ids.process_id, agent_id=process_ids.agent_id
+        )
+        return f"{int(process_version or 0)}:{int(agent_version or 0)}"
+
     def get_process_states(self, process_id: str) -> List[ProcessState]:
         process_states = self.redis_handler.get_process_states(process_id)
 
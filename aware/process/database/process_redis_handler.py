@@ -1,5 +1,5 @@
 from redis import Redis
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from aware.process.process_data import ProcessData
 from aware.process.process_ids import ProcessIds
@@ -10,11 +10,16 @@ class ProcessRedisHandler:
     def __init__(self, client: Redis):
         self.client = client
 
+    def bump_process_version(self, process_id: str):
+        """Invalidate the processes cached by the workers."""
+        self.client.incr(f"process:{process_id}:version")
+
     def create_process_state(self, process_id: str, process_state: ProcessState):
         self.client.sadd(
             f"process:{process_id}:states",
             process_state.to_json(),
         )
+        self.bump_process_version(process_id)
 
     def get_current_process_state(self, process_id: str) -> Optional[ProcessState]:
         data = self.client.get(f"process:{process_id}:current_state")
@@ -34,6 +39,15 @@ class ProcessRedisHandler:
             return ProcessIds.from_json(data)
         return None
 
+    def get_process_versions(
+        self, process_id: str, agent_id: str
+    ) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """Get the versions of the process and its agent in a single round-trip."""
+        process_version, agent_version = self.client.mget(
+            f"process:{process_id}:version", f"agent:{agent_id}:version"
+        )
+        return process_version, agent_version
+
     def get_process_states(self, process_id: str) -> List[ProcessState]:
         process_states = self.client.smembers(f"process:{process_id}:states")
         return [
@@ -45,12 +59,14 @@ class ProcessRedisHandler:
             f"process:{process_id}:current_state",
             process_state.to_json(),
         )
+        self.bump_process_version(process_id)
 
     def set_process_data(self, process_id: str, process_data: ProcessData):
         self.client.set(
             f"process_data:{process_id}",
             process_data.to_json(),
         )
+        self.bump_process_version(process_id)
 
     def set_process_ids(self, process_ids: ProcessIds):
         self.client.set(
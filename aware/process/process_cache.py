@@ -0,0 +1,56 @@
+from collections import OrderedDict
+import threading
+from typing import Callable, Optional, Tuple
+
+from aware.config.config import Config, Singleton
+from aware.process.database.process_database_handler import ProcessDatabaseHandler
+from aware.process.process_ids import ProcessIds
+from aware.process.process_interface import ProcessInterface
+
+
+class ProcessCache(metaclass=Singleton):
+    """Per worker LRU cache of the built processes, validated against the version stamp stored in Redis."""
+
+    def __init__(self):
+        self.max_size = Config().process_cache_size
+        self.processes: "OrderedDict[str, Tuple[str, ProcessInterface]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_process(
+        self,
+        process_ids: ProcessIds,
+        build_process: Callable[[ProcessIds], ProcessInterface],
+    ) -> ProcessInterface:
+        process_id = process_ids.process_id
+        version = ProcessDatabaseHandler().get_process_version(process_ids)
+
+        process = self._get_cached_process(process_id, version)
+        if process is not None:
+            process.refresh()
+            return process
+
+        process = build_process(process_ids)
+        with self.lock:
+            self.processes[process_id] = (version, process)
+            self.processes.move_to_end(process_id)
+            while len(self.processes) > self.max_size:
+                self.processes.popitem(last=False)
+        return process
+
+    def _get_cached_process(
+        self, process_id: str, version: str
+    ) -> Optional[ProcessInterface]:
+        with self.lock:
+            cached_process = self.processes.get(process_id)
+            if cached_process is None:
+                return None
+            cached_version, process = cached_process
+            if cached_version != version:
+                del self.processes[process_id]
+                return None
+            self.processes.move_to_end(process_id)
+            return process
+
+    def invalidate(self, process_id: str):
+        with self.lock:
+            self.processes.pop(process_id, None)
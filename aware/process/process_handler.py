@@ -86,10 +86,6 @@ class ProcessHandler:
             process_name="main",
         )
 
-        assistant_conversation_buffer = ConversationBuffer(
-            process_id=main_ids.process_id, process_logger=self.process_logger
-        )
-
         # TODO: modify by communication database handler and verify with internal topics...
         # TODO: we need to get publisher to publish agent_interactions. Determine if this should be a topic or directly AgentInfo.
         # agent_info.publish(
@@ -98,7 +94,11 @@ class ProcessHandler:
         #     content=assistant_conversation_buffer.to_string(),
         # )
 
-        if assistant_conversation_buffer.should_trigger_warning():
+        # The tokens of the buffer are counted on each message, the buffer is cleared by the caller that reaches the warning.
+        if self.chat_database_handler.trigger_buffer_warning(
+            process_id=main_ids.process_id,
+            warning_tokens=ConversationBuffer.get_warning_tokens(),
+        ):
             self.logger.info(
                 "Conversation buffer warning triggered, starting data storage manager."
             )
@@ -109,9 +109,6 @@ class ProcessHandler:
             )
             self.preprocess(data_storage_manager_ids)
 
-            # CARE !!! Reset conversation buffer !!! - THIS CAN LEAD TO A RACE WITH THE TRIGGERS, WE NEED TO REMOVE AFTER THAT!! I think is okay as we are sharing the info with agent_interactions.
-            assistant_conversation_buffer.reset()
-
     def preprocess(self):
         self.logger.info(f"Preprocessing process: {self.process_ids.process_id}")
         app.send_task("server.preprocess", kwargs={"process_ids_str": self.process_ids.to_json()})
@@ -1,6 +1,6 @@
 from abc import abstractmethod
 from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from aware.chat.chat import Chat
 from aware.chat.conversation_schemas import (
@@ -63,6 +63,14 @@ class ProcessInterface:
         """The tools property that can be implemented by derived classes."""
         return []
 
+    def refresh(self):
+        """Reload the data that can change between steps when the process is reused from the cache."""
+        self.capability.streamed_texts = []
+
+    def has_local_changes(self) -> bool:
+        """Check if the process changed in a way that prevents reusing it on next steps."""
+        return self.process_state_machine.has_local_changes()
+
     def execute_tool(
         self, tool_call: ChatCompletionMessageToolCall
     ) -> ToolResponseMessage:
@@ -86,13 +94,13 @@ class ProcessInterface:
     def _get_capability(self, process_info: ProcessInfo) -> Capability:
         self.capability_registry = CapabilityRegistry(
             process_ids=self.process_ids,
-            process_loger=self.process_logger,
+            process_logger=self.process_logger,
             capabilities_folders=[get_capabilities_folder_path()],
         )
 
         capability_class = process_info.process_data.capability_class
         capability_class_type = self.capability_registry.get_capability(
-            name=capability_class
+            capability_name=capability_class
         )
 
         if capability_class_type is None:
@@ -116,10 +124,19 @@ class ProcessInterface:
             prompt_kwargs=self._get_prompt_kwargs(),
             logger=self.logger,
         )
-        chat.request_response(tools_openai=self.tool_manager.get_openai_tools())
+        chat.request_response(
+            tools_openai=self.tool_manager.get_openai_tools(),
+            stream=self.capability.stream_content,
+            stream_tool_argument=self.capability.stream_tool_argument,
+        )
 
-    def postprocess(self, response_str: str) -> List[ToolResponseMessage]:
+    def postprocess(
+        self, response_str: str, streamed_texts: Optional[List[str]] = None
+    ) -> List[ToolResponseMessage]:
         try:
+            # Let the capability know which texts already reached the user while streaming.
+            self.capability.streamed_texts = streamed_texts or []
+
             # 1. Reconstruct response.
             openai_response = ChatCompletionMessage.model_validate_json(response_str)
             tool_calls = openai_response.tool_calls
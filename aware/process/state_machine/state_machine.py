@@ -19,6 +19,7 @@ class ProcessStateMachine:
 
         self.process_database_handler = ProcessDatabaseHandler()
         self.current_state = self.process_database_handler.get_current_process_state(process_id=process_id)
+        self.stored_state_name = self.current_state.name
         self.states = self.process_database_handler.get_process_states(process_id=process_id)
 
         # TODO: get process status from database.
@@ -29,6 +30,10 @@ class ProcessStateMachine:
     def get_current_state(self) -> ProcessState:
         return self.current_state
 
+    def has_local_changes(self) -> bool:
+        """Check if a transition happened in memory that is not reflected on the database."""
+        return self.status != ProcessStatus.RUNNING or self.current_state.name != self.stored_state_name
+
     def get_instructions(self) -> str:
         return self.current_state.instructions
 
@@ -60,4 +65,5 @@ class ProcessStateMachine:
 
     def update_current_state(self, state: ProcessState):
         self.current_state = state
+        self.stored_state_name = state.name
         self.process_database_handler.update_current_process_state(process_id=self.process_id, process_state=state)
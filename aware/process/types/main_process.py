@@ -6,6 +6,7 @@ from aware.communication.protocols.database.protocols_database_handler import (
 from aware.process.process_interface import ProcessInterface
 from aware.process.process_ids import ProcessIds
 from aware.tool.tool import Tool
+from aware.tool.tool_manager import ToolManager
 
 
 class MainProcess(ProcessInterface):
@@ -17,6 +18,15 @@ class MainProcess(ProcessInterface):
             process_id=process_ids.process_id
         )
 
+    def refresh(self):
+        """Reload the communication, as new inputs and requests don't change the process version. It is read from its snapshot while unchanged."""
+        super().refresh()
+        self.agent_communication = ProtocolsDatabaseHandler().get_agent_communication(
+            process_id=self.process_ids.process_id
+        )
+        self.tool_manager = ToolManager(process_logger=self.process_logger)
+        self._initialize_tools()
+
     @property
     def name(self) -> str:
         """Set the name of the main process to the agent name."""
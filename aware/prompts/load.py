@@ -1,24 +1,108 @@
-from jinja2 import Environment, FileSystemLoader, Template, meta
+from collections import OrderedDict
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+    meta,
+)
 from pathlib import Path
-from typing import Dict, Optional
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
 
-from aware.utils.logger.file_logger import FileLogger
+from aware.config.config import Config, Singleton
+
+TEMPLATES_PATH = Path(__file__).parent / "template"
+# Marks the dynamic slots on the static render, can't appear on the prompts.
+SLOT_MARKER = "\x00"
+SLOT_PATTERN = re.compile(f"{SLOT_MARKER}(\\w+){SLOT_MARKER}")
 
 
 def get_path(template_name: str, module_name: Optional[str] = None) -> Path:
-    prompts_path = Path(__file__).parent / "template"
+    prompts_path = TEMPLATES_PATH
     if module_name is not None:
         prompts_path = prompts_path / module_name
     return prompts_path / f"{template_name}.j2"
 
 
+class TemplateRegistry(metaclass=Singleton):
+    """Templates compiled once per process, the bytecode is cached on disk and only reloaded from source in dev mode.
+
+    The static parts of a prompt are rendered once, each call only fills the dynamic slots.
+    """
+
+    def __init__(self):
+        config = Config()
+        self.environment = Environment(
+            loader=FileSystemLoader(TEMPLATES_PATH),
+            bytecode_cache=FileSystemBytecodeCache(config.prompts_bytecode_cache_dir),
+            auto_reload=config.dev_mode,
+            cache_size=-1,
+        )
+        self.max_static_prompts = config.prompts_static_cache_size
+        self.static_prompts: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def warm_up(self):
+        """Compile all the templates so the first calls don't pay for it."""
+        for template_path in TEMPLATES_PATH.rglob("*.j2"):
+            self.environment.get_template(
+                template_path.relative_to(TEMPLATES_PATH).as_posix()
+            )
+
+    def get_template(
+        self, template_name: str, module_name: Optional[str] = None
+    ) -> Template:
+        template_path = get_path(template_name, module_name)
+        return self.environment.get_template(
+            template_path.relative_to(TEMPLATES_PATH).as_posix()
+        )
+
+    def render(
+        self,
+        template_name: str,
+        args: Dict[str, str],
+        dynamic_args: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Render the template, dynamic_args should only be used as plain substitutions (no conditions or filters)."""
+        if not dynamic_args:
+            return self.get_template(template_name).render(**args)
+
+        parts = self._get_static_prompt(
+            template_name, args, tuple(sorted(dynamic_args))
+        )
+        # Parts alternate static text and the name of a dynamic slot.
+        return "".join(
+            dynamic_args[part] if index % 2 else part
+            for index, part in enumerate(parts)
+        )
+
+    def _get_static_prompt(
+        self,
+        template_name: str,
+        args: Dict[str, str],
+        dynamic_names: Tuple[str, ...],
+    ) -> List[str]:
+        key = (template_name, tuple(sorted(args.items())), dynamic_names)
+        with self.lock:
+            parts = self.static_prompts.get(key)
+            if parts is not None:
+                self.static_prompts.move_to_end(key)
+                return parts
+
+        slots = {name: f"{SLOT_MARKER}{name}{SLOT_MARKER}" for name in dynamic_names}
+        static_prompt = self.get_template(template_name).render(**{**args, **slots})
+        parts = SLOT_PATTERN.split(static_prompt)
+        with self.lock:
+            self.static_prompts[key] = parts
+            while len(self.static_prompts) > self.max_static_prompts:
+                self.static_prompts.popitem(last=False)
+        return parts
+
+
 def get_template(template_name: str, module_name: Optional[str] = None) -> Template:
-    log = FileLogger("migration_tests")
-    template_path = get_path(template_name, module_name)
-    log.info(f"Loading template from {template_path.parent}")
-    log.info(f"Template name: {template_name}")
-    prompts_env = Environment(loader=FileSystemLoader(template_path.parent))
-    return prompts_env.get_template(template_path.name)
+    return TemplateRegistry().get_template(template_name, module_name)
 
 
 def get_variables(template_name: str, module_name: Optional[str] = None) -> list[str]:
@@ -32,27 +116,33 @@ def get_variables(template_name: str, module_name: Optional[str] = None) -> list
         list[str]: The variables in the template.
     """
     template_path = get_path(template_name, module_name)
-    environment = Environment(loader=FileSystemLoader(template_path.parent))
-    template_source = environment.loader.get_source(environment, template_path.name)[0]
+    environment = TemplateRegistry().environment
+    template_source = environment.loader.get_source(
+        environment, template_path.relative_to(TEMPLATES_PATH).as_posix()
+    )[0]
     parsed_content = environment.parse(template_source)
     variables = meta.find_undeclared_variables(parsed_content)
     return list(variables)
 
 
-def load_prompt_from_args(template_name: str, args: Dict[str, str]) -> str:
+def load_prompt_from_args(
+    template_name: str,
+    args: Dict[str, str],
+    dynamic_args: Optional[Dict[str, str]] = None,
+) -> str:
     """
     Load and populate the specified template.
 
     Args:
         template (str): The name of the template to load.
         args: The arguments to populate the template with.
+        dynamic_args: The arguments that change on every call, filled on the cached static render.
 
     Returns:
         str: The populated template.
     """
     try:
-        template = get_template(template_name)
-        return template.render(**args)
+        return TemplateRegistry().render(template_name, args, dynamic_args)
     except Exception as e:
         raise Exception(f"Error loading or rendering template: {e}")
 
@@ -1,4 +1,9 @@
 from celery import Celery
+from celery.signals import worker_process_init
+
+from aware.config.config import Config
+from aware.prompts.load import TemplateRegistry
+from aware.utils.helpers import preload_encodings
 
 app = Celery("aware", broker="pyamqp://guest@localhost//")
 
@@ -10,3 +15,10 @@ app.conf.update(
 )
 app.autodiscover_tasks(["aware.server"])
 app.autodiscover_tasks(["aware.communication"])
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    """Load the resources shared by all the tasks once per worker process."""
+    preload_encodings([Config().openai_model])
+    TemplateRegistry().warm_up()
@@ -0,0 +1,157 @@
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+class KeyConcurrencyLimiter:
+    """AIMD limit of the in-flight calls that share the same API key.
+
+    The limit grows additively (+1 each time a full window of calls succeeds within the target latency) and it is
+    cut multiplicatively on rate limit errors or slow calls, at most once per average call latency: the calls
+    that fail together were sent with the same limit.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency_sec: float,
+        decrease_factor: float,
+        ewma_alpha: float = 0.2,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_sec = target_latency_sec
+        self.decrease_factor = decrease_factor
+        self.ewma_alpha = ewma_alpha
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.rate_limit_errors = 0
+        self.avg_latency_sec = 0.0
+        self.avg_queue_wait_sec = 0.0
+        self.decreased_at: Optional[float] = None
+        self._condition = asyncio.Condition()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> float:
+        """Wait until there is spare capacity and return the time spent waiting."""
+        queued_at = time.monotonic()
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(self._has_capacity)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        queue_wait_sec = time.monotonic() - queued_at
+        self.avg_queue_wait_sec = self._ewma(self.avg_queue_wait_sec, queue_wait_sec)
+        return queue_wait_sec
+
+    async def release(self, latency_sec: float, rate_limited: bool):
+        async with self._condition:
+            self.in_flight -= 1
+            self.avg_latency_sec = self._ewma(self.avg_latency_sec, latency_sec)
+            # Rate limited calls already decreased the limit when the error happened.
+            if not rate_limited:
+                if latency_sec > self.target_latency_sec:
+                    self._decrease()
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_rate_limit(self):
+        self.rate_limit_errors += 1
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        window_sec = self.avg_latency_sec or self.target_latency_sec
+        if self.decreased_at is not None and now - self.decreased_at < window_sec:
+            return
+        self.decreased_at = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+    def _ewma(self, average: float, value: float) -> float:
+        return self.ewma_alpha * value + (1 - self.ewma_alpha) * average
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rate_limit_errors": self.rate_limit_errors,
+            "avg_latency_sec": round(self.avg_latency_sec, 3),
+            "avg_queue_wait_sec": round(self.avg_queue_wait_sec, 3),
+        }
+
+
+class CallSlot:
+    """An acquired slot for a single call, used to report rate limit errors while the call is running."""
+
+    def __init__(self, limiter: KeyConcurrencyLimiter):
+        self.limiter = limiter
+        self.rate_limited = False
+
+    def on_rate_limit(self):
+        self.rate_limited = True
+        self.limiter.on_rate_limit()
+
+
+class ConcurrencyController:
+    """Keep an independent AIMD limiter per API key, so a throttled key doesn't slow down the rest."""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency_sec: float,
+        decrease_factor: float,
+    ):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_sec = target_latency_sec
+        self.decrease_factor = decrease_factor
+        self.limiters: Dict[str, KeyConcurrencyLimiter] = {}
+
+    @asynccontextmanager
+    async def acquire(self, api_key: str) -> AsyncIterator[CallSlot]:
+        limiter = self._get_limiter(api_key)
+        await limiter.acquire()
+        slot = CallSlot(limiter)
+        started_at = time.monotonic()
+        try:
+            yield slot
+        finally:
+            await limiter.release(
+                latency_sec=time.monotonic() - started_at,
+                rate_limited=slot.rate_limited,
+            )
+
+    def _get_limiter(self, api_key: str) -> KeyConcurrencyLimiter:
+        limiter = self.limiters.get(api_key)
+        if limiter is None:
+            limiter = KeyConcurrencyLimiter(
+                initial_limit=self.initial_limit,
+                min_limit=self.min_limit,
+                max_limit=self.max_limit,
+                target_latency_sec=self.target_latency_sec,
+                decrease_factor=self.decrease_factor,
+            )
+            self.limiters[api_key] = limiter
+        return limiter
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the metrics of each limiter, identifying the keys by a short hash to don't expose them."""
+        return {
+            hashlib.sha256(api_key.encode()).hexdigest()[:8]: limiter.get_metrics()
+            for api_key, limiter in self.limiters.items()
+        }
@@ -0,0 +1,171 @@
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+
+from aware.chat.database.chat_redis_handler import ChatRedisHandler
+from aware.chat.database.chat_supabase_handler import ChatSupabaseHandler
+from aware.config.config import Config
+from aware.database.client_handlers import ClientHandlers
+from aware.utils.logger.file_logger import FileLogger
+
+# (entry_id, type, data)
+OutboxEntry = Tuple[str, str, Dict[str, Any]]
+# SQLSTATE classes of the errors that can succeed on retry: transaction rollback, connection exception,
+# insufficient resources and operator intervention.
+TRANSIENT_SQLSTATE_CLASSES = {"40", "08", "53", "57"}
+
+
+class MessageFlusher:
+    """Persist the chat outbox to Supabase in order, inserting the consecutive messages in a single batch.
+
+    Inserts are idempotent on the message id, so an entry delivered twice after a crash is only stored once.
+    Transient errors are retried until Supabase is back, only the entries it rejects are dead-lettered.
+    """
+
+    def __init__(self, consumer_name: str):
+        config = Config()
+        self.group_name = config.chat_outbox_group
+        self.consumer_name = consumer_name
+        self.batch_size = config.chat_outbox_batch_size
+        self.block_ms = config.chat_outbox_block_ms
+        self.reclaim_idle_ms = config.chat_outbox_reclaim_idle_ms
+        self.reclaim_interval_sec = config.chat_outbox_reclaim_interval_sec
+        self.max_backoff_sec = config.chat_outbox_max_backoff_sec
+
+        self.logger = FileLogger("message_flusher")
+        self.redis_handler = ChatRedisHandler(
+            client=ClientHandlers().get_redis_client()
+        )
+        self.supabase_handler = ChatSupabaseHandler(
+            client=ClientHandlers().get_supabase_client(), logger=self.logger
+        )
+
+    def run(self):
+        self.redis_handler.create_outbox_group(self.group_name)
+        # The entries delivered to this consumer before a restart go first, to keep the order.
+        while True:
+            entries = self.redis_handler.get_outbox_entries(
+                self.group_name, self.consumer_name, self.batch_size, pending=True
+            )
+            if not entries:
+                break
+            self.flush(entries)
+
+        reclaimed_at = 0.0
+        while True:
+            if time.monotonic() - reclaimed_at > self.reclaim_interval_sec:
+                reclaimed_at = time.monotonic()
+                self.flush(
+                    self.redis_handler.reclaim_outbox_entries(
+                        self.group_name,
+                        self.consumer_name,
+                        min_idle_ms=self.reclaim_idle_ms,
+                        count=self.batch_size,
+                    )
+                )
+            self.flush(
+                self.redis_handler.get_outbox_entries(
+                    self.group_name,
+                    self.consumer_name,
+                    self.batch_size,
+                    block_ms=self.block_ms,
+                )
+            )
+
+    def flush(self, entries: List[OutboxEntry]):
+        for entries_group in self._group_entries(entries):
+            self._flush_group(entries_group)
+
+    def _group_entries(self, entries: List[OutboxEntry]) -> List[List[OutboxEntry]]:
+        # Consecutive messages are inserted together, the other writes one by one.
+        entries_groups: List[List[OutboxEntry]] = []
+        for entry in entries:
+            _, entry_type, _ = entry
+            if (
+                entry_type == "add_message"
+                and entries_groups
+                and entries_groups[-1][-1][1] == "add_message"
+            ):
+                entries_groups[-1].append(entry)
+            else:
+                entries_groups.append([entry])
+        return entries_groups
+
+    def _flush_group(self, entries: List[OutboxEntry]):
+        """Persist the entries, they are only acknowledged once stored or dead-lettered."""
+        entry_type = entries[0][1]
+        entries_data = [data for _, _, data in entries]
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._persist(entry_type, entries_data)
+                break
+            except Exception as e:
+                self.logger.error(
+                    f"Error persisting {len(entries)} {entry_type} entries"
+                    f" (attempt {attempt}): {e}"
+                )
+                if self._is_transient(e):
+                    # Blocks the outbox until Supabase is back, to keep the order of the writes.
+                    self.redis_handler.touch_outbox_entries(
+                        self.group_name,
+                        self.consumer_name,
+                        [entry_id for entry_id, _, _ in entries],
+                    )
+                    time.sleep(min(self.max_backoff_sec, 2 ** min(attempt, 10)))
+                    continue
+                if len(entries) > 1:
+                    # Isolate the entries that are rejected, so the rest of the batch is stored.
+                    for entry in entries:
+                        self._flush_group([entry])
+                    return
+                self.redis_handler.add_to_outbox_dead_letters(
+                    entry_type, entries_data[0], str(e)
+                )
+                break
+        self.redis_handler.ack_outbox_entries(
+            self.group_name, [entry_id for entry_id, _, _ in entries]
+        )
+
+    def _is_transient(self, error: Exception) -> bool:
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, APIError):
+            code = str(error.code or "")
+            # The HTTP status when the response was not a PostgREST error, the SQLSTATE otherwise.
+            if len(code) == 3 and code.isdigit():
+                return code in ("408", "429") or code.startswith("5")
+            return code[:2] in TRANSIENT_SQLSTATE_CLASSES
+        return False
+
+    def _persist(self, entry_type: str, entries_data: List[Dict[str, Any]]):
+        if entry_type == "add_message":
+            self.supabase_handler.add_messages(entries_data)
+        elif entry_type == "delete_message":
+            for data in entries_data:
+                self.supabase_handler.delete_message(data["message_id"])
+        elif entry_type == "clear_conversation_buffer":
+            for data in entries_data:
+                self.supabase_handler.clear_conversation_buffer(data["process_id"])
+        else:
+            raise ValueError(f"Unknown outbox entry type: {entry_type}")
+
+
+def main():
+    """Run the flusher, or move the dead letters back to the outbox with --replay-dead-letters."""
+    if "--replay-dead-letters" in sys.argv:
+        redis_handler = ChatRedisHandler(client=ClientHandlers().get_redis_client())
+        num_replayed = redis_handler.replay_outbox_dead_letters()
+        print(f"Replayed {num_replayed} dead letters.")
+        return
+    # Stable per host, so the entries pending of a previous run are read again on restart.
+    MessageFlusher(consumer_name=socket.gethostname()).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,261 @@
 import asyncio
+import os
+import socket
+from typing import Callable, List, Optional, Set, Tuple
 
+from openai._exceptions import APIConnectionError, APIStatusError
+from redis.exceptions import RedisError
+
+from aware.chat.call_info import CallInfo
+from aware.chat.database.chat_async_redis_handler import ChatAsyncRedisHandler
 from aware.chat.database.chat_database_handler import ChatDatabaseHandler
+from aware.chat.response_streamer import ResponseStreamer
+from aware.config.config import Config
+from aware.models.private.openai.client_pool import OpenAIClientPool
 from aware.models.private.openai.openai import OpenAIModel
+from aware.models.private.openai.retry_handler import (
+    CircuitOpenError,
+    get_retry_metrics,
+    is_retryable_error,
+)
 from aware.server.celery_app import app
+from aware.server.concurrency_controller import ConcurrencyController
 from aware.utils.logger.file_logger import FileLogger
 
 
-async def process_openai_call(call_id):
-    redis_handlers = ChatDatabaseHandler.get_async_redis_handler()
-    call_info = await redis_handlers.get_call_info(call_id)
+async def process_openai_call(
+    redis_handlers: ChatAsyncRedisHandler,
+    call_info: CallInfo,
+    on_rate_limit: Optional[Callable[[], None]] = None,
+):
     logger = FileLogger(name=call_info.name)
     logger.info("Getting response...")
+    response_streamer = (
+        ResponseStreamer(call_info=call_info, redis_handler=redis_handlers)
+        if call_info.stream
+        else None
+    )
+    # Kept until the response is received, so a cancelled call also closes the stream as failed.
+    error: Optional[str] = "Call interrupted."
     try:
-        openai_model = OpenAIModel(api_key=call_info.get_api_key(), logger=logger)
-        result = await openai_model.get_response(
-            messages=call_info.get_conversation_messages(),
-            tools_openai=call_info.tools_openai,
-        )
+        api_key = call_info.get_api_key()
+        async with OpenAIClientPool().acquire(api_key) as client:
+            openai_model = OpenAIModel(
+                api_key=api_key,
+                logger=logger,
+                on_rate_limit=on_rate_limit,
+                client=client,
+            )
+            result = await openai_model.get_response(
+                messages=call_info.get_conversation_messages(),
+                tools_openai=call_info.tools_openai,
+                on_delta=response_streamer.on_delta if response_streamer else None,
+            )
+        error = None
         logger.info(f"Result: {result}")
     except Exception as e:
+        error = str(e)
         logger.error(f"Error getting response from OpenAI: {e}")
         raise e
+    finally:
+        # Readers wait for the end entry of the stream, it is added even if the call failed.
+        if response_streamer:
+            await response_streamer.close(error=error)
     # Store the result back in the database TODO: MOVE TO PROCESS_REQUEST TO DO THIS PROPERLY.
-    await redis_handlers.store_response(call_id, result.model_dump_json())
+    await redis_handlers.store_response(call_info.call_id, result.model_dump_json())
     # Post process the response
     app.send_task(
         "server.postprocess",
         kwargs={
             "response_str": result.model_dump_json(),
             "call_info_str": call_info.to_json(),
+            "streamed_texts": (
+                response_streamer.get_streamed_texts() if response_streamer else []
+            ),
         },
     )
 
 
-async def get_pending_call_id():
-    while True:
-        redis_handlers = ChatDatabaseHandler.get_async_redis_handler()
-        message = await redis_handlers.get_pending_call()
+def _is_transient_error(error: Exception) -> bool:
+    """Errors after which the call can succeed later, it is left unacknowledged to be reclaimed."""
+    if isinstance(error, (APIStatusError, APIConnectionError)):
+        return is_retryable_error(error)
+    return isinstance(
+        error, (CircuitOpenError, RedisError, ConnectionError, asyncio.TimeoutError)
+    )
+
 
-        if message is not None:
-            _, call_id = message
-            return call_id
+async def _backoff(num_errors: int):
+    await asyncio.sleep(min(Config().dispatcher_max_error_backoff_sec, 2**num_errors))
 
 
 async def main():
-    task_queue = asyncio.Queue()
-    workers = []
+    config = Config()
+    logger = FileLogger("call_dispatcher")
+    redis_handlers = ChatDatabaseHandler.get_async_redis_handler()
+    await redis_handlers.create_pending_calls_group(config.pending_calls_group)
+    # Each dispatcher is a different consumer of the group, so several of them can run side by side.
+    consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+
+    concurrency_controller = ConcurrencyController(
+        initial_limit=config.dispatcher_initial_concurrency,
+        min_limit=config.dispatcher_min_concurrency,
+        max_limit=config.dispatcher_max_concurrency,
+        target_latency_sec=config.dispatcher_target_latency_sec,
+        decrease_factor=config.dispatcher_decrease_factor,
+    )
+    # Calls claimed but not yet waiting for their API key, bounded to leave the rest to other replicas.
+    claimed_calls = asyncio.Semaphore(config.pending_calls_prefetch)
+    dispatched_calls: Set[asyncio.Task] = set()
+    # Entries held by this dispatcher until they are acknowledged.
+    in_flight_entries: Set[str] = set()
+
+    async def dispatch_call(entry_id: str, call_id: str):
+        in_flight_entries.add(entry_id)
+        try:
+            # The calls that failed transiently stay unacknowledged, to be reclaimed once idle.
+            if await process_call(call_id):
+                await redis_handlers.ack_pending_call(
+                    config.pending_calls_group, entry_id
+                )
+        except Exception as e:
+            logger.error(f"Error acknowledging call {call_id}: {e}")
+        finally:
+            in_flight_entries.discard(entry_id)
+
+    async def process_call(call_id: str) -> bool:
+        """Process the call, returns False if it failed but can succeed on a later attempt."""
+        prefetched = True
+        try:
+            # Reclaimed after its response was stored, sending it again would duplicate it.
+            if await redis_handlers.has_response(call_id):
+                logger.info(f"Skipping call {call_id}, its response is already stored.")
+                return True
+            call_info = await redis_handlers.get_call_info(call_id)
+            # The prefetch slot is given back before waiting for the key, so a throttled key doesn't hold the
+            # slots needed by the calls of other keys.
+            claimed_calls.release()
+            prefetched = False
+            # Waits only while the API key of this call is at its current limit.
+            api_key = call_info.get_api_key()
+            async with concurrency_controller.acquire(api_key) as slot:
+                await process_openai_call(
+                    redis_handlers, call_info, on_rate_limit=slot.on_rate_limit
+                )
+            return True
+        except Exception as e:
+            if _is_transient_error(e):
+                logger.error(f"Error processing call {call_id}, left to retry: {e}")
+                return False
+            logger.error(f"Error processing call {call_id}, dropped: {e}")
+            return True
+        finally:
+            if prefetched:
+                claimed_calls.release()
+
+    async def claim_slots() -> int:
+        """Wait for at least one free slot and take as many as available up to the batch size."""
+        await claimed_calls.acquire()
+        slots = 1
+        while slots < config.pending_calls_batch_size and not claimed_calls.locked():
+            await claimed_calls.acquire()
+            slots += 1
+        return slots
+
+    def start_calls(slots: int, pending_calls: List[Tuple[str, str]]):
+        for _ in range(slots - len(pending_calls)):
+            claimed_calls.release()
+        for entry_id, call_id in pending_calls:
+            task = asyncio.create_task(dispatch_call(entry_id, call_id))
+            dispatched_calls.add(task)
+            task.add_done_callback(dispatched_calls.discard)
 
-    async def worker():
+    async def enqueue_pending_calls():
+        num_errors = 0
         while True:
-            call_id = await task_queue.get()
+            slots = await claim_slots()
+            pending_calls = []
             try:
-                logger = FileLogger(name="migration_tests")
-                logger.info("Processing openai call...")
-                await process_openai_call(call_id)
+                pending_calls = await redis_handlers.get_pending_calls(
+                    group_name=config.pending_calls_group,
+                    consumer_name=consumer_name,
+                    count=slots,
+                    block_ms=config.pending_calls_block_ms,
+                )
+                num_errors = 0
             except Exception as e:
-                # handle exceptions
-                print(f"Error processing call {call_id}: {e}")
+                num_errors += 1
+                logger.error(f"Error reading pending calls: {e}")
             finally:
-                task_queue.task_done()
+                # Give back the slots that were not used, even if the read failed.
+                start_calls(slots, pending_calls)
+            if num_errors:
+                await _backoff(num_errors)
 
-    async def manage_workers():
+    async def reclaim_pending_calls():
+        num_errors = 0
         while True:
-            # Adjust these numbers based on your system's capabilities and task characteristics
-            max_workers = 100
-            target_queue_size_per_worker = 10
-
-            # Scale workers based on queue size
-            desired_workers = min(
-                max_workers, max(1, task_queue.qsize() // target_queue_size_per_worker)
-            )
-            current_workers = len(workers)
-
-            if current_workers < desired_workers:
-                for _ in range(desired_workers - current_workers):
-                    new_worker = asyncio.create_task(worker())
-                    workers.append(new_worker)
-            elif current_workers > desired_workers:
-                for _ in range(current_workers - desired_workers):
-                    worker_to_cancel = workers.pop()
-                    worker_to_cancel.cancel()
+            slots = await claim_slots()
+            pending_calls = []
+            try:
+                pending_calls = await redis_handlers.reclaim_pending_calls(
+                    group_name=config.pending_calls_group,
+                    consumer_name=consumer_name,
+                    min_idle_ms=config.pending_calls_reclaim_idle_ms,
+                    count=slots,
+                )
+                num_errors = 0
+            except Exception as e:
+                num_errors += 1
+                logger.error(f"Error reclaiming pending calls: {e}")
+            finally:
+                # Give back the slots that were not used, even if the read failed.
+                start_calls(slots, pending_calls)
+            if num_errors:
+                await _backoff(num_errors)
+            else:
+                await asyncio.sleep(config.pending_calls_reclaim_interval_sec)
 
-            await asyncio.sleep(5)  # Check periodically
+    async def touch_in_flight_calls():
+        while True:
+            await asyncio.sleep(config.pending_calls_touch_interval_sec)
+            if not in_flight_entries:
+                continue
+            try:
+                await redis_handlers.touch_pending_calls(
+                    group_name=config.pending_calls_group,
+                    consumer_name=consumer_name,
+                    entry_ids=list(in_flight_entries),
+                )
+            except Exception as e:
+                logger.error(f"Error touching in-flight calls: {e}")
 
-    async def enqueue_pending_calls():
+    async def export_metrics():
         while True:
-            call_id = await get_pending_call_id()
-            await task_queue.put(call_id)
-            await asyncio.sleep(0.1)  # Prevent tight loop, adjust as needed
+            await asyncio.sleep(config.dispatcher_metrics_interval_sec)
+            metrics = {
+                "claimed_calls": len(dispatched_calls),
+                "api_keys": concurrency_controller.get_metrics(),
+                "retries": get_retry_metrics(),
+            }
+            try:
+                await redis_handlers.set_dispatcher_metrics(
+                    consumer_name,
+                    metrics,
+                    expire_sec=config.dispatcher_metrics_interval_sec * 3,
+                )
+            except Exception as e:
+                logger.error(f"Error exporting metrics: {e}")
 
-    worker_manager = asyncio.create_task(manage_workers())
     enqueuer = asyncio.create_task(enqueue_pending_calls())
+    reclaimer = asyncio.create_task(reclaim_pending_calls())
+    toucher = asyncio.create_task(touch_in_flight_calls())
+    metrics_exporter = asyncio.create_task(export_metrics())
 
-    await asyncio.gather(worker_manager, enqueuer)
+    try:
+        await asyncio.gather(enqueuer, reclaimer, toucher, metrics_exporter)
+    finally:
+        await OpenAIClientPool().close()
 
 
 if __name__ == "__main__":
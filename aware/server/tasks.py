@@ -1,6 +1,9 @@
+from typing import List, Optional
+
 from aware.chat.call_info import CallInfo
 from aware.process.types.internal_process import InternalProcess
 from aware.process.types.main_process import MainProcess
+from aware.process.process_cache import ProcessCache
 from aware.process.process_ids import ProcessIds
 from aware.process.process_data import ProcessType
 from aware.process.process_interface import ProcessInterface
@@ -10,6 +13,11 @@ from aware.utils.logger.file_logger import FileLogger
 
 
 def get_process(process_ids: ProcessIds) -> ProcessInterface:
+    """Get the process from the worker cache, building it only when it is missing or outdated."""
+    return ProcessCache().get_process(process_ids, build_process=build_process)
+
+
+def build_process(process_ids: ProcessIds) -> ProcessInterface:
     """Small factory to build the process depending on type."""
     process_data = ProcessDatabaseHandler().get_process_data(
         process_id=process_ids.process_id
@@ -35,7 +43,9 @@ def preprocess(process_ids_str: str):
 
 
 @app.task(name="server.postprocess")
-def postprocess(response_str: str, call_info_str: str):
+def postprocess(
+    response_str: str, call_info_str: str, streamed_texts: Optional[List[str]] = None
+):
     # we need to check if have tool_calls at the processes
     logger = FileLogger("server_tasks")
     logger.info(f"Task postprocess started with message: {response_str}")
@@ -43,7 +53,10 @@ def postprocess(response_str: str, call_info_str: str):
     try:
         call_info = CallInfo.from_json(call_info_str)
         process = get_process(process_ids=call_info.process_ids)
-        process.postprocess(response_str=response_str)
+        process.postprocess(response_str=response_str, streamed_texts=streamed_texts)
+        # Transitions are only applied in memory, the next step has to start from the stored state.
+        if process.has_local_changes():
+            ProcessCache().invalidate(call_info.process_ids.process_id)
     except Exception as e:
         logger.error(f"Error in process_response: {e}")
 
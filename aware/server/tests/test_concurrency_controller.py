@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+
+from aware.server.concurrency_controller import (
+    ConcurrencyController,
+    KeyConcurrencyLimiter,
+)
+
+
+def create_limiter(initial_limit: int = 8) -> KeyConcurrencyLimiter:
+    return KeyConcurrencyLimiter(
+        initial_limit=initial_limit,
+        min_limit=1,
+        max_limit=16,
+        target_latency_sec=10.0,
+        decrease_factor=0.5,
+    )
+
+
+class TestKeyConcurrencyLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_limit_grows_after_a_window_of_fast_calls(self):
+        limiter = create_limiter(initial_limit=4)
+        # Each call adds 1 / limit, so a window is slightly more than limit calls.
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(latency_sec=0.1, rate_limited=False)
+        self.assertEqual(int(limiter.limit), 5)
+
+    def test_rate_limits_decrease_once_per_latency_window(self):
+        limiter = create_limiter()
+        for _ in range(5):
+            limiter.on_rate_limit()
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.rate_limit_errors, 5)
+
+        # Once the window passed, the next error decreases the limit again.
+        limiter.decreased_at -= limiter.target_latency_sec
+        limiter.on_rate_limit()
+        self.assertEqual(limiter.limit, 2)
+
+    def test_limit_never_goes_below_min_limit(self):
+        limiter = create_limiter(initial_limit=1)
+        limiter.on_rate_limit()
+        self.assertEqual(limiter.limit, 1)
+
+    async def test_acquire_waits_for_capacity(self):
+        limiter = create_limiter(initial_limit=1)
+        await limiter.acquire()
+        waiting_call = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiting_call.done())
+        self.assertEqual(limiter.waiting, 1)
+
+        await limiter.release(latency_sec=0.1, rate_limited=False)
+        await asyncio.wait_for(waiting_call, timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+
+
+class TestConcurrencyController(unittest.IsolatedAsyncioTestCase):
+    async def test_keys_are_limited_independently(self):
+        controller = ConcurrencyController(
+            initial_limit=1,
+            min_limit=1,
+            max_limit=4,
+            target_latency_sec=10.0,
+            decrease_factor=0.5,
+        )
+
+        async def use_keys():
+            async with controller.acquire("throttled-key") as slot:
+                slot.on_rate_limit()
+                # The other key still has capacity while the first one is in use.
+                async with controller.acquire("other-key"):
+                    pass
+
+        await asyncio.wait_for(use_keys(), timeout=1)
+        metrics = list(controller.get_metrics().values())
+        self.assertEqual([metric["rate_limit_errors"] for metric in metrics], [1, 0])
+        self.assertTrue(all(metric["in_flight"] == 0 for metric in metrics))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from redis.exceptions import RedisError
+
+from aware.chat.database.chat_async_redis_handler import ChatAsyncRedisHandler
+from aware.config.config import Config
+from aware.server import process_requests
+
+GROUP_NAME = "test_dispatchers"
+
+
+class FakeClientPool:
+    async def close(self):
+        pass
+
+
+class TestCallDispatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis_handler = ChatAsyncRedisHandler(
+            fakeredis.aioredis.FakeRedis(decode_responses=True)
+        )
+        self.redis_handler.get_call_info = self.get_call_info
+        self.get_pending_calls = self.redis_handler.get_pending_calls
+        self.redis_handler.get_pending_calls = self.get_pending_calls_without_blocking
+        self.started_calls: List[str] = []
+        self.on_call: Callable[[str], Awaitable[None]] = self.succeed
+
+        self.patch(
+            patch.object(
+                process_requests.ChatDatabaseHandler,
+                "get_async_redis_handler",
+                return_value=self.redis_handler,
+            )
+        )
+        self.patch(patch.object(process_requests, "FileLogger", logging.getLogger))
+        self.patch(patch.object(process_requests, "OpenAIClientPool", FakeClientPool))
+        self.patch(
+            patch.object(
+                process_requests, "process_openai_call", self.process_openai_call
+            )
+        )
+        self.set_config(
+            pending_calls_group=GROUP_NAME,
+            pending_calls_batch_size=10,
+            pending_calls_prefetch=10,
+            pending_calls_block_ms=10,
+            pending_calls_reclaim_idle_ms=60000,
+            pending_calls_reclaim_interval_sec=0.01,
+            dispatcher_initial_concurrency=10,
+            dispatcher_max_error_backoff_sec=0,
+        )
+
+    def patch(self, patcher):
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def set_config(self, **values):
+        self.patch(patch.multiple(Config(), **values))
+
+    async def get_call_info(self, call_id: str):
+        # The API key is the prefix of the call id, e.g. key_a:1.
+        return SimpleNamespace(call_id=call_id, get_api_key=lambda: call_id[:5])
+
+    async def get_pending_calls_without_blocking(self, block_ms: int, **kwargs):
+        # Blocking reads of fakeredis block the event loop, wait outside of it instead.
+        pending_calls = await self.get_pending_calls(block_ms=None, **kwargs)
+        if not pending_calls:
+            await asyncio.sleep(block_ms / 1000)
+        return pending_calls
+
+    async def process_openai_call(self, redis_handlers, call_info, on_rate_limit=None):
+        self.started_calls.append(call_info.call_id)
+        await self.on_call(call_info.call_id)
+
+    async def succeed(self, call_id: str):
+        pass
+
+    async def run_dispatcher(
+        self, call_ids: List[str], done: Callable[[], Awaitable[bool]]
+    ):
+        dispatcher = asyncio.create_task(process_requests.main())
+        await asyncio.sleep(0.05)
+        for call_id in call_ids:
+            await self.redis_handler.client.xadd("pending_calls", {"call_id": call_id})
+        try:
+            for _ in range(200):
+                if await done():
+                    return
+                await asyncio.sleep(0.01)
+            self.fail("The dispatcher didn't process the calls.")
+        finally:
+            dispatcher.cancel()
+            await asyncio.gather(dispatcher, return_exceptions=True)
+
+    async def get_pending_call_ids(self) -> List[str]:
+        client = self.redis_handler.client
+        pending_entries = await client.xpending_range(
+            "pending_calls", GROUP_NAME, min="-", max="+", count=100
+        )
+        entries = await client.xrange("pending_calls")
+        call_ids = {entry_id: fields["call_id"] for entry_id, fields in entries}
+        return sorted(call_ids[entry["message_id"]] for entry in pending_entries)
+
+    async def test_calls_are_acked_on_success_and_terminal_errors(self):
+        async def on_call(call_id: str):
+            if call_id.endswith("terminal"):
+                raise ValueError("Invalid call.")
+            if call_id.endswith("transient"):
+                raise RedisError("Connection lost.")
+
+        self.on_call = on_call
+
+        async def done():
+            # Only the call that can succeed later stays pending once all of them ran.
+            pending_call_ids = await self.get_pending_call_ids()
+            return len(self.started_calls) == 3 and pending_call_ids == [
+                "key_a:transient"
+            ]
+
+        await self.run_dispatcher(
+            ["key_a:ok", "key_a:terminal", "key_a:transient"], done
+        )
+
+    async def test_transient_errors_are_retried_once_reclaimed(self):
+        self.set_config(pending_calls_reclaim_idle_ms=0)
+        attempts: Dict[str, int] = {}
+
+        async def on_call(call_id: str):
+            attempts[call_id] = attempts.get(call_id, 0) + 1
+            if attempts[call_id] == 1:
+                raise RedisError("Connection lost.")
+
+        self.on_call = on_call
+
+        async def done():
+            return (
+                attempts.get("key_a:1") == 2 and not await self.get_pending_call_ids()
+            )
+
+        await self.run_dispatcher(["key_a:1"], done)
+
+    async def test_dispatcher_survives_redis_errors(self):
+        get_pending_calls = self.redis_handler.get_pending_calls
+        num_reads = 0
+
+        async def failing_get_pending_calls(**kwargs):
+            nonlocal num_reads
+            num_reads += 1
+            if num_reads <= 2:
+                raise RedisError("Connection lost.")
+            return await get_pending_calls(**kwargs)
+
+        self.redis_handler.get_pending_calls = failing_get_pending_calls
+
+        async def done():
+            return self.started_calls == ["key_a:1"]
+
+        await self.run_dispatcher(["key_a:1"], done)
+        self.assertGreater(num_reads, 2)
+
+    async def test_throttled_key_does_not_hold_the_prefetch_slots(self):
+        self.set_config(
+            pending_calls_batch_size=1,
+            pending_calls_prefetch=1,
+            dispatcher_initial_concurrency=1,
+        )
+        release_key_a = asyncio.Event()
+
+        async def on_call(call_id: str):
+            if call_id == "key_a:1":
+                await release_key_a.wait()
+
+        self.on_call = on_call
+
+        async def done():
+            # key_a:2 waits for key_a:1, while the call of the other key still runs.
+            return self.started_calls == ["key_a:1", "key_b:1"]
+
+        try:
+            await self.run_dispatcher(["key_a:1", "key_a:2", "key_b:1"], done)
+        finally:
+            release_key_a.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import json
-from typing import Callable, List, Optional
+from typing import Callable, List, Optional, Tuple
 from openai.types.chat.chat_completion_message_tool_call import (
     ChatCompletionMessageToolCall,
     Function,
@@ -20,6 +20,11 @@ from aware.tool.tool import Tool
 
 
 class Capability(ABC):
+    # Set to True on capabilities whose content is addressed to the user, so it is streamed while generated.
+    stream_content: bool = False
+    # (tool name, argument) of the string argument addressed to the user, streamed while the tool call is generated.
+    stream_tool_argument: Optional[Tuple[str, str]] = None
+
     def __init__(
         self,
         process_info: ProcessInfo,
@@ -42,6 +47,8 @@ class Capability(ABC):
         # TODO: vars = self.get_capability_vars() # Use it to hold internal state of each capability.
         # TODO: selt.iterations = vars[iterations]
         self.iterations = 0
+        # Texts of the response already delivered to the user while they were streamed.
+        self.streamed_texts: List[str] = []
 
     def _construct_arguments_dict(self, func: Callable, content: str):
         signature = inspect.signature(func)
@@ -0,0 +1,247 @@
+import ast
+from dataclasses import asdict, dataclass, replace
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+from typing import Dict, List, Optional, Set
+
+MANIFEST_FILE_NAME = "capability_manifest.json"
+MANIFEST_VERSION = 2
+
+
+@dataclass
+class CapabilityEntry:
+    class_name: str
+    name: str
+    description: Optional[str]
+    module: str
+    tools: Dict[str, str]
+    content_hash: str
+    bases: List[str]
+
+
+@dataclass
+class ModuleEntry:
+    path: str
+    file_hash: str
+    # Every class of the module, the capabilities are resolved from their bases across modules.
+    classes: List[CapabilityEntry]
+
+
+class CapabilityManifest:
+    """Capabilities found on a folder, extracted from the source without importing the modules.
+
+    The manifest is stored next to the capabilities and only the files whose hash changed are parsed again.
+    """
+
+    def __init__(self, capabilities_folder: Path, modules: Dict[str, ModuleEntry]):
+        self.capabilities_folder = Path(capabilities_folder)
+        self.modules = modules
+
+    @classmethod
+    def load(cls, capabilities_folder: Path) -> "CapabilityManifest":
+        """Load the manifest of the folder, updating it when the capabilities changed since it was built."""
+        capabilities_folder = Path(capabilities_folder)
+        manifest = cls(capabilities_folder, cls._read_modules(capabilities_folder))
+        if manifest.update():
+            try:
+                manifest.save()
+            except OSError:
+                # Read-only installation, the updated manifest is still used in memory.
+                pass
+        return manifest
+
+    @classmethod
+    def build(cls, capabilities_folder: Path) -> "CapabilityManifest":
+        manifest = cls(Path(capabilities_folder), {})
+        manifest.update()
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def _read_modules(cls, capabilities_folder: Path) -> Dict[str, ModuleEntry]:
+        manifest_path = capabilities_folder / MANIFEST_FILE_NAME
+        try:
+            with open(manifest_path, "r") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return {
+            path: ModuleEntry(
+                path=path,
+                file_hash=module["file_hash"],
+                classes=[CapabilityEntry(**entry) for entry in module["classes"]],
+            )
+            for path, module in data["modules"].items()
+        }
+
+    def update(self) -> bool:
+        """Parse the new or modified files and drop the removed ones, returns True if anything changed."""
+        changed = False
+        current_paths = set()
+        for file_path in sorted(self.capabilities_folder.rglob("*.py")):
+            if "__init__" in file_path.name:
+                continue
+            path = file_path.relative_to(self.capabilities_folder).as_posix()
+            current_paths.add(path)
+            source = file_path.read_bytes()
+            file_hash = hashlib.sha256(source).hexdigest()
+
+            module_entry = self.modules.get(path)
+            if module_entry is not None and module_entry.file_hash == file_hash:
+                continue
+            self.modules[path] = ModuleEntry(
+                path=path,
+                file_hash=file_hash,
+                classes=self._parse_classes(path, source.decode()),
+            )
+            changed = True
+
+        for path in set(self.modules) - current_paths:
+            del self.modules[path]
+            changed = True
+        return changed
+
+    def save(self):
+        manifest_path = self.capabilities_folder / MANIFEST_FILE_NAME
+        data = {
+            "version": MANIFEST_VERSION,
+            "modules": {
+                path: {
+                    "file_hash": module.file_hash,
+                    "classes": [asdict(entry) for entry in module.classes],
+                }
+                for path, module in self.modules.items()
+            },
+        }
+        # Write and rename so workers never read a partial manifest.
+        tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(data, manifest_file, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def get_capabilities(self) -> Dict[str, CapabilityEntry]:
+        """Get the classes that inherit from Capability, directly or through other classes of the folder."""
+        classes = {
+            entry.class_name: entry
+            for module in self.modules.values()
+            for entry in module.classes
+        }
+        return {
+            class_name: replace(
+                entry,
+                tools=self._get_tools(entry, classes, set()),
+                content_hash=self._get_content_hash(entry, classes, set()),
+            )
+            for class_name, entry in classes.items()
+            if self._is_capability(entry, classes, set())
+        }
+
+    def _parse_classes(self, path: str, source: str) -> List[CapabilityEntry]:
+        module_name = ".".join(
+            [self.capabilities_folder.name] + path[: -len(".py")].split("/")
+        )
+        classes = []
+        for node in ast.parse(source).body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            class_source = ast.get_source_segment(source, node) or ""
+            classes.append(
+                CapabilityEntry(
+                    class_name=node.name,
+                    name=re.sub(r"(?<!^)(?=[A-Z])", "_", node.name).lower(),
+                    # Raw docstring, same as Capability.get_description.
+                    description=ast.get_docstring(node, clean=False),
+                    module=module_name,
+                    tools=self._parse_tools(node),
+                    content_hash=hashlib.sha256(class_source.encode()).hexdigest(),
+                    bases=[self._get_name(base) or "" for base in node.bases],
+                )
+            )
+        return classes
+
+    def _is_capability(
+        self,
+        entry: CapabilityEntry,
+        classes: Dict[str, CapabilityEntry],
+        visited: Set[str],
+    ) -> bool:
+        visited.add(entry.class_name)
+        for base in entry.bases:
+            if base == "Capability":
+                return True
+            base_entry = classes.get(base)
+            if base_entry is not None and base not in visited:
+                if self._is_capability(base_entry, classes, visited):
+                    return True
+        return False
+
+    def _get_tools(
+        self,
+        entry: CapabilityEntry,
+        classes: Dict[str, CapabilityEntry],
+        visited: Set[str],
+    ) -> Dict[str, str]:
+        """Tools of the class including the inherited ones, the class overrides its bases."""
+        visited.add(entry.class_name)
+        tools: Dict[str, str] = {}
+        for base in reversed(entry.bases):
+            base_entry = classes.get(base)
+            if base_entry is not None and base not in visited:
+                tools.update(self._get_tools(base_entry, classes, visited))
+        tools.update(entry.tools)
+        return tools
+
+    def _get_content_hash(
+        self,
+        entry: CapabilityEntry,
+        classes: Dict[str, CapabilityEntry],
+        visited: Set[str],
+    ) -> str:
+        """Hash of the class source and the sources of its bases, so it changes when any of them changes."""
+        visited.add(entry.class_name)
+        content_hash = hashlib.sha256(entry.content_hash.encode())
+        for base in entry.bases:
+            base_entry = classes.get(base)
+            if base_entry is not None and base not in visited:
+                content_hash.update(
+                    self._get_content_hash(base_entry, classes, visited).encode()
+                )
+        return content_hash.hexdigest()
+
+    def _parse_tools(self, node: ast.ClassDef) -> Dict[str, str]:
+        """Get the signature of the methods decorated as tools."""
+        tools = {}
+        for method in node.body:
+            if not isinstance(method, ast.FunctionDef):
+                continue
+            decorators = [
+                self._get_name(decorator) for decorator in method.decorator_list
+            ]
+            if "tool" in decorators:
+                tools[method.name] = f"{method.name}({ast.unparse(method.args)})"
+        return tools
+
+    def _get_name(self, node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            return node.attr
+        return None
+
+
+def main():
+    """Build the manifest of the default capabilities folder."""
+    from aware_capabilities import get_capabilities_folder_path
+
+    manifest = CapabilityManifest.build(get_capabilities_folder_path())
+    capabilities = manifest.get_capabilities()
+    print(f"Capability manifest built with: {', '.join(capabilities)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
-import importlib.util
-import inspect
-import os
+import importlib
 from pathlib import Path
-from typing import Dict, List, Optional, Type
+from typing import Dict, List, Optional, Set, Type
 
 from aware.database.weaviate.memory_manager import MemoryManager
 from aware.process.process_ids import ProcessIds
 
 # TODO: split capability - tool with own CapabilityDatabaseHandler?
 from aware.tool.capability.capability import Capability
+from aware.tool.capability.capability_manifest import (
+    CapabilityEntry,
+    CapabilityManifest,
+)
 from aware.tool.database.tool_database_handler import ToolDatabaseHandler
 from aware.utils.logger.file_logger import FileLogger
 from aware.utils.logger.process_logger import ProcessLogger
@@ -18,7 +20,9 @@ from aware.utils.logger.process_logger import ProcessLogger
 class CapabilityRegistry:
     _instance: Optional["CapabilityRegistry"] = None
     process_ids: ProcessIds
+    capability_entries: Dict[str, CapabilityEntry]
     capabilities: Dict[str, Type[Capability]]
+    stored_user_ids: Set[str]
     logger: FileLogger
 
     def __new__(
@@ -30,51 +34,75 @@ class CapabilityRegistry:
     ):
         if cls._instance is None:
             cls._instance = super(CapabilityRegistry, cls).__new__(cls)
+            cls._instance.capability_entries = {}
             cls._instance.capabilities = {}
+            cls._instance.stored_user_ids = set()
             cls._instance.logger = process_logger.get_logger("capability_registry")
             if capabilities_folders is not None:
-                cls._instance.process_ids = process_ids
-                cls._instance.register_capabilites(capabilities_folders, save_on_db)
+                cls._instance.register_capabilites(capabilities_folders)
+        cls._instance.process_ids = process_ids
+        if save_on_db:
+            cls._instance.store_changed_capabilities()
         return cls._instance
 
-    def _store_capability_in_memory(self, capability: Capability):
+    def _store_capability_in_memory(self, capability_entry: CapabilityEntry):
         memory_manager = MemoryManager(
             user_id=self.process_ids.user_id, logger=self.logger
         )
         memory_manager.store_capability(
             user_id=self.process_ids.user_id,
-            name=capability.get_name(),
-            description=capability.get_description(),
+            name=capability_entry.name,
+            description=capability_entry.description,
         )
         ToolDatabaseHandler().create_capability(
-            process_ids=self.process_ids, capability=capability
+            process_ids=self.process_ids,
+            name=capability_entry.name,
+            description=capability_entry.description,
         )
 
+    def store_changed_capabilities(self):
+        """Store only the capabilities of the user that are new or whose content changed since they were embedded."""
+        user_id = self.process_ids.user_id
+        if user_id in self.stored_user_ids:
+            return
+        tool_database_handler = ToolDatabaseHandler()
+        stored_hashes = tool_database_handler.get_capability_hashes(user_id)
+        for capability_entry in self.capability_entries.values():
+            stored_hash = stored_hashes.get(capability_entry.name)
+            if stored_hash == capability_entry.content_hash:
+                continue
+            self.logger.info(f"Storing capability: {capability_entry.class_name}")
+            self._store_capability_in_memory(capability_entry)
+            tool_database_handler.set_capability_hash(
+                user_id, capability_entry.name, capability_entry.content_hash
+            )
+        self.stored_user_ids.add(user_id)
+
     # TODO: instead of parent get the ORGANIZATION path!
-    def register_capabilites(self, capabilities_folders: List[str], save_on_db: bool = True):
+    def register_capabilites(self, capabilities_folders: List[str]):
+        """Register the capabilities from the manifest of each folder, the modules are imported on first use."""
         base_path = Path(__file__).parent
 
         for capabilities_folder in capabilities_folders:
-            full_path = base_path / capabilities_folder
-            python_files = list(
-                full_path.rglob("*.py")
-            )  # Use rglob for recursive search
-            python_files = [
-                str(file) for file in python_files if "__init__" not in file.name
-            ]
-
-            for file_path in python_files:
-                module_name = os.path.splitext(os.path.basename(file_path))[0]
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-
-                for name, obj in inspect.getmembers(module, inspect.isclass):
-                    if issubclass(obj, Capability) and obj is not Capability:
-                        self.logger.info(f"Registering capability: {name}")
-                        self.capabilities[name] = obj
-                        if save_on_db:
-                            self._store_capability_in_memory(capability=obj)
+            manifest = CapabilityManifest.load(base_path / capabilities_folder)
+            for name, capability_entry in manifest.get_capabilities().items():
+                self.logger.info(f"Registering capability: {name}")
+                self.capability_entries[name] = capability_entry
 
     def get_capability(self, capability_name: str) -> Optional[Type[Capability]]:
-        return self.capabilities.get(capability_name)
+        capability = self.capabilities.get(capability_name)
+        if capability is not None:
+            return capability
+
+        capability_entry = self.capability_entries.get(capability_name)
+        if capability_entry is None:
+            return None
+        module = importlib.import_module(capability_entry.module)
+        capability = getattr(module, capability_entry.class_name, None)
+        if capability is None or not issubclass(capability, Capability):
+            self.logger.error(
+                f"Capability {capability_name} not found on {capability_entry.module}, rebuild the manifest."
+            )
+            return None
+        self.capabilities[capability_name] = capability
+        return capability
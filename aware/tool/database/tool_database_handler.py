@@ -1,4 +1,5 @@
-from aware.tool.capability.capability import Capability
+from typing import Dict
+
 from aware.tool.database.tool_redis_handler import (
     ToolRedisHandler,
 )
@@ -21,12 +22,18 @@ class ToolDatabaseHandler:
         )
         self.logger = SystemLogger.get_logger("client_agent_handler")
 
-    def create_capability(self, process_ids: ProcessIds, capability: Capability):
-        self.supabase_handler.create_capability(process_ids, capability)
+    def create_capability(self, process_ids: ProcessIds, name: str, description: str):
+        self.supabase_handler.create_capability(process_ids, name, description)
         self.logger.info(
-            f"Created capability for process_id: {process_ids.process_id} with name: {capability.get_name()}"
+            f"Created capability for process_id: {process_ids.process_id} with name: {name}"
         )
 
+    def get_capability_hashes(self, user_id: str) -> Dict[str, str]:
+        return self.redis_handler.get_capability_hashes(user_id)
+
+    def set_capability_hash(self, user_id: str, name: str, content_hash: str):
+        self.redis_handler.set_capability_hash(user_id, name, content_hash)
+
     def create_capability_variable(
         self, capability_id: str, variable_name: str, variable_content: str
     ):
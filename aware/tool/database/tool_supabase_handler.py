@@ -2,7 +2,6 @@ from supabase import Client
 
 
 from aware.process.process_ids import ProcessIds
-from aware.tool.capability.capability import Capability
 from aware.utils.logger.file_logger import FileLogger
 
 
@@ -12,7 +11,7 @@ class ToolSupabaseHandler:
         self.logger = FileLogger("supabase_agent_handler")
 
     # TODO: we need to enhance capabilities so later team_builder can find the right capability from description and understand the tools!!
-    def create_capability(self, process_ids: ProcessIds, capability: Capability):
+    def create_capability(self, process_ids: ProcessIds, name: str, description: str):
         self.logger.info(f"Creating capability for process: {process_ids.process_id}")
         response = (
             self.client.table("capabilities")
@@ -20,8 +19,8 @@ class ToolSupabaseHandler:
                 {
                     "user_id": process_ids.user_id,
                     "process_id": process_ids.process_id,
-                    "name": capability.get_name(),
-                    "description": capability.get_description(),
+                    "name": name,
+                    "description": description,
                 }
             )
             .execute()
@@ -30,9 +29,7 @@ class ToolSupabaseHandler:
         self.logger.info(
             f"Capability created for process: {process_ids.process_id}. Response: {response}"
         )
-        return Capability(
-            process_ids=process_ids,
-        )
+        return response
 
     # TODO: FILL ME!
     # def create_capability_var():
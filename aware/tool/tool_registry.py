@@ -9,12 +9,15 @@ from aware.tool.tool import Tool
 class ToolRegistry:
     def __init__(self):
         self.tools: Dict[str, Tool] = {}
+        self.openai_tools: Optional[List[ChatCompletionToolParam]] = None
 
     def get_openai_tools(self) -> List[ChatCompletionToolParam]:
-        return [
-            PydanticParser.get_openai_tool(tool.callback)
-            for tool in self.tools.values()
-        ]
+        if self.openai_tools is None:
+            self.openai_tools = [
+                PydanticParser.get_openai_tool(tool.callback)
+                for tool in self.tools.values()
+            ]
+        return list(self.openai_tools)
 
     def get_tool(self, name: str) -> Optional[Tool]:
         return self.tools.get(name, None)
@@ -25,3 +28,4 @@ class ToolRegistry:
     def register_tools(self, tools: List[Tool]):
         for tool in tools:
             self.tools[tool.name] = tool
+        self.openai_tools = None
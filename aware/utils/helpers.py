@@ -1,10 +1,15 @@
-from datetime import datetime
-import re
 import tiktoken
-from typing import Optional
-import tzlocal
+import threading
+from typing import Dict, List, Optional
 import socket
 
+# Kept here for the modules that still import them from helpers.
+from aware.utils.timestamps import (
+    convert_timestamp_to_epoch,
+    get_current_date,
+    get_current_date_iso8601,
+)
+
 
 def colored(st, color: Optional[str], background=False):
     return (
@@ -14,49 +19,6 @@ def colored(st, color: Optional[str], background=False):
     )
 
 
-def convert_timestamp_to_epoch(timestamp_str: str):
-    # Automatically detect the local timezone
-    local_timezone = tzlocal.get_localzone()
-
-    # Normalize the timestamp string to ensure it has exactly six digits for microseconds
-    # This regex handles both truncating and padding the fractional part
-    timestamp_str_normalized = re.sub(
-        r"(\.\d{1,6})\d*", lambda x: x.group(1).ljust(7, "0"), timestamp_str
-    )
-
-    # Parse the timestamp string to a datetime object
-    datetime_obj = datetime.fromisoformat(timestamp_str_normalized)
-
-    # Ensure that the datetime object is in UTC
-    datetime_obj_utc = datetime_obj.astimezone(local_timezone)
-
-    # Convert the datetime object to Unix epoch time (number of seconds since January 1, 1970, UTC)
-    epoch_time = datetime_obj_utc.timestamp()
-    return epoch_time
-
-
-def get_current_date():
-    # Automatically detect the local timezone
-    local_timezone = tzlocal.get_localzone()
-
-    # Current date and time in user's timezone
-    current_time_in_user_tz = datetime.now(local_timezone)
-
-    # Format the datetime in a more readable format, including the timezone name
-    return current_time_in_user_tz.strftime("%Y-%m-%d %H:%M:%S %Z%z")
-
-
-def get_current_date_iso8601():
-    # Automatically detect the local timezone
-    local_timezone = tzlocal.get_localzone()
-
-    # Current date and time in user's timezone
-    current_time_in_user_tz = datetime.now(local_timezone)
-
-    # Format the datetime in ISO 8601 format
-    return current_time_in_user_tz.isoformat()
-
-
 def get_local_ip():
     try:
         # Create a dummy socket to connect to an external server
@@ -84,6 +46,11 @@ def get_free_port():
         return None
 
 
+# Process-wide registry of the tiktoken encodings, keyed by model family.
+_encodings: Dict[str, tiktoken.core.Encoding] = {}
+_encodings_lock = threading.Lock()
+
+
 def count_message_tokens(messages: str, model_name: str = "gpt-3.5-turbo") -> int:
     """
     Returns the number of tokens used by a list of messages.
@@ -95,30 +62,80 @@ def count_message_tokens(messages: str, model_name: str = "gpt-3.5-turbo") -> in
     Returns:
     int: The number of tokens used by the list of messages.
     """
+    return count_messages_tokens([messages], model_name)[0]
+
+
+def count_messages_tokens(
+    messages: List[str], model_name: str = "gpt-3.5-turbo", num_threads: int = 8
+) -> List[int]:
+    """
+    Returns the number of tokens used by each message, encoding all of them in a single batch.
+
+    Args:
+    messages (List[str]): The messages to be encoded.
+    model_name (str): The name of the model used to encode the messages.
+    num_threads (int): The number of threads used by tiktoken to encode the batch.
+
+    Returns:
+    List[int]: The number of tokens used by each message, as count_message_tokens would return.
+    """
+    if not messages:
+        return []
     encoding = get_encoding(model_name)
-    num_tokens = len(encoding.encode(messages))
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
+    if len(messages) == 1:
+        # Don't start the thread pool of the batch for a single message.
+        messages_tokens = [encoding.encode(messages[0])]
+    else:
+        messages_tokens = encoding.encode_batch(messages, num_threads=num_threads)
+    return [
+        len(tokens) + 3  # every reply is primed with <|start|>assistant<|message|>
+        for tokens in messages_tokens
+    ]
 
 
 def get_encoding(
     model_name: str = "gpt-4",
 ) -> tiktoken.core.Encoding:
-    if model_name.startswith("gpt-3.5-turbo"):
-        encoding_model = "gpt-3.5-turbo"
-    elif model_name.startswith("gpt-4"):
-        encoding_model = "gpt-4"
-    else:
+    encoding_model = _get_encoding_model(model_name)
+    if encoding_model is None:
         raise NotImplementedError(
             f"count_message_tokens() is not implemented for model {model_name}.\n"
             " See https://github.com/openai/openai-python/blob/main/chatml.md for"
             " information on how messages are converted to tokens."
         )
-    try:
-        encoding = tiktoken.encoding_for_model(encoding_model)
-    except KeyError:
-        print(f"Model {model_name} not found. Defaulting to cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+    return _load_encoding(encoding_model)
+
+
+def preload_encodings(model_names: List[str]):
+    """Load the encodings of the models, should be called at worker startup to keep them out of the hot path."""
+    for model_name in model_names:
+        get_encoding(model_name)
+
+
+def _get_encoding_model(model_name: str) -> Optional[str]:
+    if model_name.startswith("gpt-3.5-turbo"):
+        return "gpt-3.5-turbo"
+    elif model_name.startswith("gpt-4"):
+        return "gpt-4"
+    return None
+
+
+def _load_encoding(encoding_model: str) -> tiktoken.core.Encoding:
+    encoding = _encodings.get(encoding_model)
+    if encoding is not None:
+        return encoding
+
+    with _encodings_lock:
+        encoding = _encodings.get(encoding_model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(encoding_model)
+            except KeyError:
+                print(
+                    f"Model {encoding_model} not found. Defaulting to cl100k_base encoding."
+                )
+                encoding = tiktoken.get_encoding("cl100k_base")
+            _encodings[encoding_model] = encoding
     return encoding
 
 
@@ -133,6 +150,6 @@ def count_string_tokens(string: str, model_name: str = "gpt-3.5-turbo") -> int:
     Returns:
     int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
+    encoding = _load_encoding(_get_encoding_model(model_name) or model_name)
     num_tokens = len(encoding.encode(string))
     return num_tokens
@@ -3,7 +3,7 @@ import threading
 from typing import Optional
 
 from aware.utils.logger.file_logger import FileLogger
-from aware.utils.helpers import get_current_date
+from aware.utils.timestamps import get_current_date
 
 
 class JSONManager:
@@ -1,6 +1,9 @@
 import logging
 import os
 
+from aware.config.config import Config
+from aware.utils.logger.log_writer import FileQueueHandler, RateLimitFilter
+
 
 class FileLogger(logging.Logger):
     _instances = {}
@@ -21,41 +24,35 @@ class FileLogger(logging.Logger):
         super().__init__(name, level)
         self.should_print = should_print
 
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        file_handler = logging.FileHandler(file_path)
-        file_handler.setLevel(logging.INFO)
-
-        formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        # Written by the LogWriter thread, which also creates the folder on first use.
+        config = Config()
+        file_handler = FileQueueHandler(file_path, write_level=logging.INFO)
+        file_handler.addFilter(
+            RateLimitFilter(config.log_rate_limit_per_sec, config.log_rate_limit_burst)
         )
-        file_handler.setFormatter(formatter)
 
         self.addHandler(file_handler)
 
         self._initialized = True
 
+    def _get_kwargs(self, should_print_local: bool, kwargs):
+        """Printing is also done by the LogWriter thread."""
+        extra = kwargs.get("extra") or {}
+        should_print = self.should_print and should_print_local
+        return {**kwargs, "extra": {**extra, "should_print": should_print}}
+
     # TODO: Remove hack when printing by console, might be more relevant when adding the UI.
     def info(self, msg, should_print_local=True, *args, **kwargs):
-        super().info(msg, *args, **kwargs)  # This logs to the file
-        if self.should_print and should_print_local:
-            print(msg)
+        super().info(msg, *args, **self._get_kwargs(should_print_local, kwargs))
 
     def debug(self, msg, should_print_local=True, *args, **kwargs):
-        super().debug(msg, *args, **kwargs)
-        if self.should_print and should_print_local:
-            print(msg)
+        super().debug(msg, *args, **self._get_kwargs(should_print_local, kwargs))
 
     def warning(self, msg, should_print_local=True, *args, **kwargs):
-        super().warning(msg, *args, **kwargs)
-        if self.should_print and should_print_local:
-            print(msg)
+        super().warning(msg, *args, **self._get_kwargs(should_print_local, kwargs))
 
     def error(self, msg, should_print_local=True, *args, **kwargs):
-        super().error(msg, *args, **kwargs)
-        if self.should_print and should_print_local:
-            print(msg)
+        super().error(msg, *args, **self._get_kwargs(should_print_local, kwargs))
 
     def critical(self, msg, should_print_local=True, *args, **kwargs):
-        super().critical(msg, *args, **kwargs)
-        if self.should_print and should_print_local:
-            print(msg)
+        super().critical(msg, *args, **self._get_kwargs(should_print_local, kwargs))
@@ -0,0 +1,211 @@
+import atexit
+from collections import OrderedDict
+import json
+import logging
+from logging.handlers import QueueHandler
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set, TextIO
+
+from aware.config.config import Config, Singleton
+
+TEXT_FORMATTER = logging.Formatter(
+    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger, the records over the limit are dropped and reported with the next one accepted."""
+
+    def __init__(self, rate_per_sec: float, burst: float):
+        super().__init__()
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate_per_sec <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated_at) * self.rate_per_sec
+            )
+            self.updated_at = now
+            if self.tokens < 1:
+                self.dropped += 1
+                return False
+            self.tokens -= 1
+            record.dropped, self.dropped = self.dropped, 0
+        return True
+
+
+class FileQueueHandler(QueueHandler):
+    """Send the records to the LogWriter thread instead of writing them on the caller thread."""
+
+    def __init__(self, file_path: str, write_level: int = logging.INFO):
+        super().__init__(queue=None)
+        self.file_path = file_path
+        self.write_level = write_level
+
+    def enqueue(self, record: logging.LogRecord):
+        LogWriter().put(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the fields used by the writer, the message is formatted on the caller as args can be mutable.
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{TEXT_FORMATTER.formatException(record.exc_info)}"
+        record = logging.makeLogRecord(
+            {
+                "name": record.name,
+                "levelname": record.levelname,
+                "levelno": record.levelno,
+                "msg": message,
+                "created": record.created,
+                "msecs": record.msecs,
+                "should_print": getattr(record, "should_print", False),
+                "dropped": getattr(record, "dropped", 0),
+            }
+        )
+        record.file_path = self.file_path
+        record.should_write = record.levelno >= self.write_level
+        return record
+
+
+class LogWriter(metaclass=Singleton):
+    """Background thread that writes the log records in batches, keeping the most recently used files open."""
+
+    def __init__(self):
+        config = Config()
+        self.json_format = config.log_format == "json"
+        self.max_open_files = config.log_max_open_files
+        self.batch_size = config.log_batch_size
+
+        self.files: "OrderedDict[str, TextIO]" = OrderedDict()
+        self.created_dirs: Set[str] = set()
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.queue: "queue.SimpleQueue[Optional[logging.LogRecord]]"
+        self.thread: threading.Thread
+        atexit.register(self.close)
+
+    def put(self, record: logging.LogRecord):
+        # The thread doesn't survive a fork, start a new one on each worker process.
+        if self.pid != os.getpid():
+            self._start()
+        self.queue.put(record)
+
+    def close(self):
+        """Write the pending records and close the files."""
+        if self.pid != os.getpid():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        self.pid = None
+
+    def _start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # The files opened by the parent process are kept by it.
+            self.files = OrderedDict()
+            self.queue = queue.SimpleQueue()
+            self.thread = threading.Thread(
+                target=self._run, name="log_writer", daemon=True
+            )
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def _run(self):
+        running = True
+        while running:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in records:
+                running = False
+                records = [record for record in records if record is not None]
+            try:
+                self._write(records)
+            except Exception as e:
+                print(f"Error writing logs: {e}", file=sys.stderr)
+        self._close_files()
+
+    def _write(self, records: List[logging.LogRecord]):
+        lines: Dict[str, List[str]] = {}
+        printed = []
+        for record in records:
+            if record.dropped:
+                lines.setdefault(record.file_path, []).append(
+                    self._format_dropped(record)
+                )
+            if record.should_write:
+                lines.setdefault(record.file_path, []).append(self._format(record))
+            if record.should_print:
+                printed.append(record.msg)
+
+        for file_path, file_lines in lines.items():
+            log_file = self._get_file(file_path)
+            log_file.write("\n".join(file_lines) + "\n")
+            log_file.flush()
+        if printed:
+            print("\n".join(printed), flush=True)
+
+    def _format(self, record: logging.LogRecord) -> str:
+        if self.json_format:
+            return json.dumps(
+                {
+                    "time": record.created,
+                    "logger": record.name,
+                    "level": record.levelname,
+                    "message": record.msg,
+                }
+            )
+        return TEXT_FORMATTER.format(record)
+
+    def _format_dropped(self, record: logging.LogRecord) -> str:
+        message = f"{record.dropped} messages dropped by the rate limit."
+        return self._format(
+            logging.makeLogRecord(
+                {
+                    "name": record.name,
+                    "levelname": "WARNING",
+                    "levelno": logging.WARNING,
+                    "msg": message,
+                    "created": record.created,
+                    "msecs": record.msecs,
+                }
+            )
+        )
+
+    def _get_file(self, file_path: str) -> TextIO:
+        log_file = self.files.get(file_path)
+        if log_file is not None:
+            self.files.move_to_end(file_path)
+            return log_file
+
+        dir_path = os.path.dirname(file_path)
+        if dir_path and dir_path not in self.created_dirs:
+            os.makedirs(dir_path, exist_ok=True)
+            self.created_dirs.add(dir_path)
+        log_file = open(file_path, "a", encoding="utf-8")
+        self.files[file_path] = log_file
+        while len(self.files) > self.max_open_files:
+            _, evicted_file = self.files.popitem(last=False)
+            evicted_file.close()
+        return log_file
+
+    def _close_files(self):
+        for log_file in self.files.values():
+            log_file.close()
+        self.files.clear()
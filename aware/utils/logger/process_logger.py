@@ -10,7 +10,6 @@ class ProcessLogger:
         self.base_path = os.path.join(
             get_permanent_storage_path(), "logs", user_id, agent_name, process_name
         )
-        os.makedirs(self.base_path, exist_ok=True)  # Ensure the base directory exists
 
     def get_logger(self, file_name, should_print=True, level=logging.NOTSET):
         # Create a full path for the new log file within the process_name folder
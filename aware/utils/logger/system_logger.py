@@ -9,6 +9,5 @@ class SystemLogger(FileLogger):
         self.base_path = os.path.join(
             get_permanent_storage_path(), "logs", "system_logs"
         )
-        os.makedirs(self.base_path, exist_ok=True)  # Ensure the base directory exists
         log_path = os.path.join(self.base_path, f"{module_name}.log")
         super().__init__(log_path, True)
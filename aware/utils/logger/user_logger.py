@@ -10,7 +10,6 @@ class UserLogger:
         self.base_path = os.path.join(
             get_permanent_storage_path(), "logs", user_id, "user_logs"
         )
-        os.makedirs(self.base_path, exist_ok=True)  # Ensure the base directory exists
 
     def get_logger(self, file_name, should_print=True, level=logging.NOTSET):
         # Return a new FileLogger instance for the specified log file
@@ -1,5 +1,6 @@
+from functools import lru_cache
 import typing
-from typing import Callable, Dict
+from typing import Callable, Dict, Tuple
 
 from aware.utils.parser.pydantic_parser import PydanticParser
 from aware.tool.tool import Tool
@@ -39,13 +40,21 @@ class DynamicFunctionHolder:
         return function_str
 
 
+@lru_cache(maxsize=1024)
+def _create_callable(
+    name: str, args: Tuple[Tuple[str, str], ...], description: str
+) -> Callable:
+    # Retrieve the dynamically added function using its name
+    dynamic_holder = DynamicFunctionHolder(name, dict(args), description)
+
+    return getattr(dynamic_holder, name)
+
+
 class JsonPydanticParser:
     @staticmethod
     def create_callable(name, args, description) -> Callable:
-        # Retrieve the dynamically added function using its name
-        dynamic_holder = DynamicFunctionHolder(name, args, description)
-
-        return getattr(dynamic_holder, name)
+        """Create the function for the given signature, the generated source is only exec'd once per signature."""
+        return _create_callable(name, tuple(args.items()), description)
 
     @staticmethod
     def get_tool(name: str, args: Dict[str, str], description: str, callback: Callable) -> Tool:
@@ -1,5 +1,6 @@
 import json
 from typing import Any, Callable, cast, Dict, Generic, List, Optional, TypeVar, Type
+from weakref import WeakKeyDictionary
 from openai.types.chat.chat_completion_tool_param import ChatCompletionToolParam
 from openai.types.shared_params.function_definition import FunctionDefinition
 from pydantic import create_model, BaseModel
@@ -18,6 +19,9 @@ from aware.tool.tool import Tool
 
 T = TypeVar("T", bound=LoggableBaseModel)
 
+# Function -> (code, ChatCompletionToolParam). Weak keys so the schemas are dropped with unloaded capabilities.
+_openai_tools_cache: WeakKeyDictionary = WeakKeyDictionary()
+
 # TODO: Create our own logger.
 LOG = getLogger(__name__)
 
@@ -217,8 +221,20 @@ class PydanticParser(Generic[T]):
 
     @classmethod
     def get_openai_tool(cls, fn: Callable) -> ChatCompletionToolParam:
-        """Turn a function signature into a OpenAI ChatCompletionToolParam."""
+        """Turn a function signature into a OpenAI ChatCompletionToolParam, memoized per function."""
+        # Bound methods of different instances share the same function and schema ('self' is skipped).
+        function = getattr(fn, "__func__", fn)
+        cached_tool = _openai_tools_cache.get(function)
+        # The code object changes when the capability class is reloaded or patched.
+        if cached_tool is not None and cached_tool[0] is function.__code__:
+            return cached_tool[1]
+
+        openai_tool = cls._create_openai_tool(fn)
+        _openai_tools_cache[function] = (function.__code__, openai_tool)
+        return openai_tool
 
+    @classmethod
+    def _create_openai_tool(cls, fn: Callable) -> ChatCompletionToolParam:
         params = {
             name: (param.annotation, ...)
             for name, param in inspect.signature(fn).parameters.items()
@@ -0,0 +1,83 @@
+from datetime import datetime, tzinfo
+from functools import lru_cache
+import re
+import timeit
+from typing import List
+import tzlocal
+
+FRACTION_PATTERN = re.compile(r"(\.\d{1,6})\d*")
+
+
+@lru_cache(maxsize=1)
+def get_local_timezone() -> tzinfo:
+    """The local timezone, detected once per process."""
+    return tzlocal.get_localzone()
+
+
+def get_current_date() -> str:
+    # Readable format, including the timezone name.
+    return datetime.now(get_local_timezone()).strftime("%Y-%m-%d %H:%M:%S %Z%z")
+
+
+def get_current_date_iso8601() -> str:
+    return datetime.now(get_local_timezone()).isoformat()
+
+
+def convert_timestamp_to_epoch(timestamp_str: str) -> float:
+    """Convert an ISO 8601 timestamp to Unix epoch, naive timestamps are considered local time.
+
+    Supabase created_at is parsed directly by fromisoformat, the fractional part is only normalized when
+    fromisoformat rejects it (more than six digits or Python < 3.11).
+    """
+    try:
+        datetime_obj = datetime.fromisoformat(timestamp_str)
+    except ValueError:
+        datetime_obj = datetime.fromisoformat(_normalize_fraction(timestamp_str))
+    if datetime_obj.tzinfo is None:
+        datetime_obj = datetime_obj.astimezone(get_local_timezone())
+    return datetime_obj.timestamp()
+
+
+def convert_timestamps_to_epoch(timestamps: List[str]) -> List[float]:
+    """Convert a batch of timestamps, used when loading full conversations."""
+    return list(map(convert_timestamp_to_epoch, timestamps))
+
+
+def _normalize_fraction(timestamp_str: str) -> str:
+    # Exactly six digits for microseconds, truncating or padding the fractional part.
+    return FRACTION_PATTERN.sub(lambda x: x.group(1).ljust(7, "0"), timestamp_str)
+
+
+def benchmark(num_timestamps: int = 10000):
+    """Compare the conversion of Supabase timestamps with the previous helper."""
+
+    def convert_timestamp_to_epoch_previous(timestamp_str: str) -> float:
+        local_timezone = tzlocal.get_localzone()
+        timestamp_str_normalized = re.sub(
+            r"(\.\d{1,6})\d*", lambda x: x.group(1).ljust(7, "0"), timestamp_str
+        )
+        datetime_obj = datetime.fromisoformat(timestamp_str_normalized)
+        return datetime_obj.astimezone(local_timezone).timestamp()
+
+    timestamps = [
+        f"2024-03-{1 + index % 28:02d}T{index % 24:02d}:{index % 60:02d}:07"
+        f".{index % 10**6:06d}+00:00"
+        for index in range(num_timestamps)
+    ]
+    assert [convert_timestamp_to_epoch_previous(t) for t in timestamps] == (
+        convert_timestamps_to_epoch(timestamps)
+    )
+    results = {
+        "previous": lambda: [
+            convert_timestamp_to_epoch_previous(t) for t in timestamps
+        ],
+        "current": lambda: [convert_timestamp_to_epoch(t) for t in timestamps],
+        "bulk": lambda: convert_timestamps_to_epoch(timestamps),
+    }
+    for name, run in results.items():
+        elapsed = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{name}: {elapsed / num_timestamps * 1e6:.2f} us/timestamp")
+
+
+if __name__ == "__main__":
+    benchmark()
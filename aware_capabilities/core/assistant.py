@@ -5,6 +5,9 @@ from aware.tool.capability.capability import Capability
 
 
 class Assistant(Capability):
+    stream_content = True
+    stream_tool_argument = ("talk", "message")
+
     def __init__(
         self,
         process_info: ProcessInfo,
@@ -26,6 +29,10 @@ class Assistant(Capability):
             str
         """
         assistant_message = AssistantMessage(name=self.agent_data.name, content=message)
+        if message.strip() in [text.strip() for text in self.streamed_texts]:
+            # The message was already delivered while the response was being generated.
+            return "Message sent to the user."
+
         self.logger.info(f"Sending message to user: {assistant_message.to_string()}")
         self.chat_database_handler.send_message_to_user(
             user_id=self.process_ids.user_id,